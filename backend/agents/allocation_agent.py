@@ -1,7 +1,10 @@
 import re
 
+import numpy as np
 import pandas as pd
 
+from backend.agents.tools import PortfolioSnapshot
+
 
 class AllocationAgent:
     """Suggest stock-level buy/sell actions to move a portfolio toward target allocations."""
@@ -41,24 +44,75 @@ class AllocationAgent:
         return {asset_class: round(float(value) / total * 100, 2) for asset_class, value in allocations.items()}
 
     def _portfolio_allocations(self, portfolio_df):
+        if isinstance(portfolio_df, PortfolioSnapshot):
+            portfolio_df = portfolio_df.frame
         if portfolio_df is None or portfolio_df.empty:
-            return {}, 0.0, []
+            return {}, 0.0, None
 
-        working = portfolio_df.copy()
+        working = portfolio_df
         if "market_value" not in working.columns:
-            working["market_value"] = working["quantity"] * working["current"]
+            working = working.assign(market_value=working["quantity"] * working["current"])
 
         total_value = float(working["market_value"].sum())
         if total_value <= 0:
-            return {}, 0.0, []
+            return {}, 0.0, None
 
         allocations = (
             working.groupby("asset_class")["market_value"].sum().div(total_value).mul(100).round(2).to_dict()
         )
-        return allocations, total_value, working.to_dict(orient="records")
+        return allocations, total_value, working
+
+    @staticmethod
+    def _ranked_positions(positions_df):
+        """Positions grouped by asset class, largest market value first within each class.
+
+        Returns the start/end offset of each class and the symbols, prices and
+        market values in that order. One stable sort groups the classes; each
+        class is then ordered with the same reversed quicksort argsort that
+        ``sort_values(ascending=False)`` uses, so equal values land where they did.
+        """
+        codes, labels = pd.factorize(positions_df["asset_class"])
+        market_value = (positions_df["quantity"] * positions_df["current"]).to_numpy(dtype=float)
+        grouped = np.argsort(codes, kind="stable")
+        grouped = grouped[codes[grouped] >= 0]
+        bounds = np.searchsorted(codes[grouped], np.arange(len(labels) + 1))
+
+        order = np.empty_like(grouped)
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            rows = grouped[start:end]
+            values = market_value[rows]
+            missing = np.isnan(values)
+            present = rows[~missing][::-1]
+            descending = present[values[~missing][::-1].argsort(kind="quicksort")][::-1]
+            order[start:end] = np.concatenate((descending, rows[missing]))
+
+        return (
+            {label: (int(start), int(end)) for label, start, end in zip(labels.tolist(), bounds[:-1], bounds[1:])},
+            positions_df["symbol"].to_numpy()[order],
+            positions_df["current"].to_numpy(dtype=float)[order],
+            market_value[order],
+        )
+
+    @staticmethod
+    def _fill(values, amount):
+        """Walk ``values`` in order, taking each in full until ``amount`` is used up.
+
+        Returns the index of each position traded and the amount taken from it,
+        with the same float arithmetic as subtracting one position at a time.
+        """
+        positive = np.flatnonzero(values > 0)
+        if not len(positive) or amount <= 0:
+            return positive[:0], values[:0]
+        # Remaining amount before each position: amount, amount - v1, amount - v1 - v2, ...
+        remaining = np.subtract.accumulate(np.concatenate(([amount], values[positive])))[:-1]
+        traded = remaining > 0
+        # Once the amount is used up it stays used up, so only a prefix trades
+        stop = len(traded) if traded.all() else int(np.argmin(traded))
+        taken = np.minimum(values[positive[:stop]], remaining[:stop])
+        return positive[:stop], taken
 
     def run(self, user_query: str, portfolio_df: pd.DataFrame, desired_allocations=None):
-        allocations, total_value, positions = self._portfolio_allocations(portfolio_df)
+        allocations, total_value, positions_df = self._portfolio_allocations(portfolio_df)
         target_allocations = self._parse_desired_allocations(user_query, desired_allocations)
 
         if not target_allocations:
@@ -71,45 +125,29 @@ class AllocationAgent:
                 "portfolio_value": round(total_value, 2),
             }
 
-        trade_plan = []
-        positions_df = pd.DataFrame(positions)
-        if not positions_df.empty:
-            positions_df["market_value"] = positions_df["quantity"] * positions_df["current"]
-            positions_df["weight_in_class"] = positions_df.groupby("asset_class")["market_value"].transform(
-                lambda s: s / s.sum() if s.sum() else 0
-            )
+        classes, symbols, prices, market_values = {}, None, None, None
+        if positions_df is not None:
+            classes, symbols, prices, market_values = self._ranked_positions(positions_df)
 
+        trade_plan = []
         for asset_class, target_pct in target_allocations.items():
             current_pct = allocations.get(asset_class, 0.0)
             gap = round(target_pct - current_pct, 2)
             if gap == 0:
                 continue
 
-            class_positions = positions_df[positions_df["asset_class"] == asset_class] if not positions_df.empty else pd.DataFrame()
+            span = classes.get(asset_class)
             if gap < 0:
-                remaining_value = abs(gap) / 100 * total_value
-                for _, row in class_positions.sort_values("market_value", ascending=False).iterrows():
-                    if remaining_value <= 0:
-                        break
-                    sell_value = min(float(row["market_value"]), remaining_value)
-                    if sell_value <= 0:
-                        continue
-                    shares_to_sell = round(sell_value / float(row["current"]), 4)
-                    trade_plan.append(
-                        {
-                            "action": "Sell",
-                            "ticker": row["symbol"],
-                            "asset_class": asset_class,
-                            "amount_usd": round(sell_value, 2),
-                            "estimated_shares": shares_to_sell,
-                            "current_price": round(float(row["current"]), 2),
-                            "reason": f"Reduce {asset_class} exposure to move toward {target_pct:.2f}% target allocation",
-                        }
-                    )
-                    remaining_value -= sell_value
+                if span is None:
+                    continue
+                action = "Sell"
+                reason = f"Reduce {asset_class} exposure to move toward {target_pct:.2f}% target allocation"
+                # Sell whole positions, largest first, until the excess value is gone
+                capacity = market_values[span[0]:span[1]]
+                rows, amounts = self._fill(capacity, abs(gap) / 100 * total_value)
             else:
                 target_value = (gap / 100) * total_value
-                if class_positions.empty:
+                if span is None:
                     trade_plan.append(
                         {
                             "action": "Buy",
@@ -122,27 +160,25 @@ class AllocationAgent:
                         }
                     )
                     continue
-
-                remaining_value = target_value
-                for _, row in class_positions.sort_values("market_value", ascending=False).iterrows():
-                    if remaining_value <= 0:
-                        break
-                    buy_value = min(remaining_value, float(row["market_value"]) * 0.5)
-                    if buy_value <= 0:
-                        continue
-                    shares_to_buy = round(buy_value / float(row["current"]), 4)
-                    trade_plan.append(
-                        {
-                            "action": "Buy",
-                            "ticker": row["symbol"],
-                            "asset_class": asset_class,
-                            "amount_usd": round(buy_value, 2),
-                            "estimated_shares": shares_to_buy,
-                            "current_price": round(float(row["current"]), 2),
-                            "reason": f"Increase {asset_class} exposure to move toward {target_pct:.2f}% target allocation",
-                        }
-                    )
-                    remaining_value -= buy_value
+                action = "Buy"
+                reason = f"Increase {asset_class} exposure to move toward {target_pct:.2f}% target allocation"
+                # Add at most half of each position's value, largest first
+                capacity = market_values[span[0]:span[1]] * 0.5
+                rows, amounts = self._fill(capacity, target_value)
+
+            rows = rows + span[0]
+            trade_plan.extend(
+                {
+                    "action": action,
+                    "ticker": symbol,
+                    "asset_class": asset_class,
+                    "amount_usd": round(amount, 2),
+                    "estimated_shares": round(amount / price, 4),
+                    "current_price": round(price, 2),
+                    "reason": reason,
+                }
+                for symbol, price, amount in zip(symbols[rows].tolist(), prices[rows].tolist(), amounts.tolist())
+            )
 
         return {
             "agent": self.name,
@@ -1,22 +1,23 @@
 #How should the results be explained?
-import json
 
 import pandas as pd
 
 from backend.agents.research_agent import ResearchAgent
-from backend.agents.tools import summarize_portfolio
+from backend.agents.tools import PortfolioSnapshot
 
 
 class ExplanationAgent:
     """Specialist agent focused on explaining a user query."""
 
-    def __init__(self, client, model):
+    def __init__(self, client, model, research_query_mode="auto"):
         self.client = client
         self.model = model
-        self.research_agent = ResearchAgent(client, model)
+        self.research_agent = ResearchAgent(client, model, query_mode=research_query_mode)
 
-    def run(self, user_query: str, portfolio_df: pd.DataFrame):
-        portfolio_summary = summarize_portfolio(portfolio_df)
+    def run(self, user_query: str, portfolio_df: pd.DataFrame, research_agent=None):
+        research_agent = research_agent or self.research_agent
+        snapshot = PortfolioSnapshot.of(portfolio_df)
+        portfolio_summary = snapshot.summary
         research_context = ""
 
         lowered_query = user_query.lower()
@@ -40,7 +41,7 @@ class ExplanationAgent:
         ]
 
         if any(keyword in lowered_query for keyword in research_keywords):
-            research_result = self.research_agent.run(user_query, portfolio_df)
+            research_result = research_agent.run(user_query, snapshot)
             research_context = research_result.get("answer", "")
 
         messages = [
@@ -65,7 +66,7 @@ class ExplanationAgent:
                 "role": "user",
                 "content": (
                     f"User question:\n{user_query}\n\n"
-                    f"Portfolio summary JSON:\n{json.dumps(portfolio_summary, indent=2)}\n\n"
+                    f"Portfolio summary JSON:\n{snapshot.prompt_context(self.model)}\n\n"
                     f"Research context:\n{research_context if research_context else 'No additional research context provided.'}\n\n"
                     "Please explain the user's question clearly, mention the most relevant portfolio implications, and keep the answer practical and easy to understand."
                 ),
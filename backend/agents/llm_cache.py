@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+
+
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", "llm_cache.db")
+LLM_CACHE_TTL_SECONDS = 60 * 60
+LLM_CACHE_MAX_ENTRIES = 5000
+
+
+def cache_key(model, messages, params):
+    """Content address for a chat completion request."""
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cached_response(content):
+    message = SimpleNamespace(role="assistant", content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")], cached=True)
+
+
+def _cached_chunk(content):
+    delta = SimpleNamespace(role="assistant", content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(index=0, delta=delta, finish_reason="stop")], cached=True)
+
+
+class CachedClient:
+    """Drop-in wrapper for an aisuite client that replays identical chat completions.
+
+    Agents keep calling ``client.chat.completions.create``; requests are answered
+    from a SQLite store when the same model, messages and sampling parameters were
+    seen within the TTL. Streamed answers are stored once the stream is consumed
+    and replayed as a single chunk. The least recently used entries are
+    evicted once the store grows past ``max_entries``.
+    """
+
+    def __init__(self, client, path=LLM_CACHE_DB, ttl=LLM_CACHE_TTL_SECONDS, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed_at ON llm_cache (accessed_at)")
+        self._conn.commit()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def _create(self, model, messages, **kwargs):
+        stream = kwargs.pop("stream", False)
+        key = cache_key(model, messages, kwargs)
+        content = self._lookup(key)
+        if content is not None:
+            return iter([_cached_chunk(content)]) if stream else _cached_response(content)
+
+        if stream:
+            chunks = self.client.chat.completions.create(model=model, messages=messages, stream=True, **kwargs)
+            return self._record_stream(key, chunks)
+
+        response = self.client.chat.completions.create(model=model, messages=messages, **kwargs)
+        content = response.choices[0].message.content
+        if isinstance(content, str):
+            self._store(key, content)
+        return response
+
+    def _record_stream(self, key, chunks):
+        parts = []
+        for chunk in chunks:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+            yield chunk
+        self._store(key, "".join(parts))
+
+    def _lookup(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content FROM llm_cache WHERE key = ? AND created_at > ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._conn:
+                self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def _store(self, key, content):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, content, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, content, now, now),
+            )
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at <= ?", (now - self.ttl,))
+            excess = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?)",
+                    (excess,),
+                )
+
+    def metrics(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": entries,
+            }
@@ -0,0 +1,135 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+
+# Context window sizes by model-name prefix, without the aisuite provider prefix
+MODEL_CONTEXT_TOKENS = {
+    "gemini": 1_048_576,
+    "gpt-4.1": 1_047_576,
+    "gpt-4o": 128_000,
+    "gpt-4": 8_192,
+    "gpt-3.5": 16_385,
+}
+DEFAULT_CONTEXT_TOKENS = 32_000
+
+# Share of the context window the portfolio may take, and a hard ceiling so
+# large-context models still get short, fast prompts
+PORTFOLIO_PROMPT_SHARE = 0.1
+PORTFOLIO_PROMPT_MAX_TOKENS = 4_000
+
+CHARS_PER_TOKEN = 4
+
+POSITION_COLUMNS = ["symbol", "quantity", "avg_cost", "current", "market_value", "portfolio_weight", "sector", "asset_class"]
+GROUP_COLUMNS = ["sector", "asset_class", "positions", "market_value", "portfolio_weight"]
+
+
+def estimate_tokens(text):
+    """Rough token count for English and JSON text, about four characters per token."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def context_tokens(model):
+    name = (model or "").split(":", 1)[-1].lower()
+    matches = [prefix for prefix in MODEL_CONTEXT_TOKENS if name.startswith(prefix)]
+    return MODEL_CONTEXT_TOKENS[max(matches, key=len)] if matches else DEFAULT_CONTEXT_TOKENS
+
+
+def portfolio_token_budget(model):
+    """Tokens a portfolio may use in one prompt for ``model``."""
+    return min(PORTFOLIO_PROMPT_MAX_TOKENS, int(context_tokens(model) * PORTFOLIO_PROMPT_SHARE))
+
+
+def _compact(value):
+    return json.dumps(value, separators=(",", ":"))
+
+
+def _grouped(frame, keys, total_value):
+    grouped = frame.groupby(keys, dropna=False, sort=True)["market_value"].agg(["size", "sum"])
+    grouped = grouped.sort_values("sum", ascending=False, kind="stable")
+    weights = grouped["sum"] / total_value * 100 if total_value else grouped["sum"] * 0
+    rows = []
+    for key, positions, value, weight in zip(grouped.index, grouped["size"], grouped["sum"], weights):
+        key = key if isinstance(key, tuple) else ("*", key)
+        rows.append([*key, int(positions), round(float(value), 2), round(float(weight), 2)])
+    return rows
+
+
+def build_prompt_context(snapshot, budget_tokens):
+    """Encode a portfolio snapshot as compact JSON that fits in ``budget_tokens``.
+
+    Positions are listed as rows under one shared column header, largest first,
+    for as many as fit. The rest are aggregated by sector and asset class, or by
+    asset class alone if even that is too long. The totals and allocations are
+    always included, even when they alone exceed a very small budget.
+    """
+    if snapshot.empty:
+        return _compact({"total_current_value": 0, "position_count": 0, "asset_allocation": {}, "sector_allocation": {}})
+
+    header = {
+        "total_current_value": round(snapshot.total_value, 2),
+        "position_count": int(len(snapshot.frame)),
+        "asset_allocation": snapshot.asset_allocation,
+        "sector_allocation": snapshot.sector_allocation,
+    }
+
+    frame = snapshot.frame
+    market_values = snapshot.market_values
+    order = np.argsort(-np.nan_to_num(market_values, nan=-np.inf), kind="stable")
+    weights = np.asarray(snapshot.weights, dtype=float) * 100
+
+    rows = [
+        _compact(row)
+        for row in zip(
+            frame["symbol"].to_numpy()[order].tolist(),
+            frame["quantity"].to_numpy()[order].tolist(),
+            np.round(frame["avg_cost"].to_numpy(dtype=float)[order], 2).tolist(),
+            np.round(frame["current"].to_numpy(dtype=float)[order], 2).tolist(),
+            np.round(market_values[order], 2).tolist(),
+            np.round(weights[order], 2).tolist(),
+            frame["sector"].to_numpy()[order].tolist(),
+            frame["asset_class"].to_numpy()[order].tolist(),
+        )
+    ]
+    # Characters used by the first n rows, including separating commas
+    row_chars = np.concatenate(([0], np.cumsum([len(row) + 1 for row in rows])))
+
+    budget_chars = budget_tokens * CHARS_PER_TOKEN
+    tail_frame = pd.DataFrame(
+        {
+            "sector": frame["sector"].to_numpy()[order],
+            "asset_class": frame["asset_class"].to_numpy()[order],
+            "market_value": market_values[order],
+        }
+    )
+
+    def encode(shown, group_keys):
+        context = dict(header)
+        context["positions"] = {"columns": POSITION_COLUMNS, "rows": []}
+        text = _compact(context)
+        if shown < len(rows):
+            tail = _grouped(tail_frame.iloc[shown:], group_keys, snapshot.total_value)
+            context["other_positions"] = {"columns": GROUP_COLUMNS, "rows": tail}
+            text = _compact(context)
+        # Splice the pre-encoded rows in rather than serializing them again
+        marker = '"rows":[]'
+        return text.replace(marker, '"rows":[' + ",".join(rows[:shown]) + "]", 1)
+
+    text = encode(len(rows), None)
+    if estimate_tokens(text) <= budget_tokens:
+        return text
+
+    for group_keys in (["sector", "asset_class"], ["asset_class"]):
+        base = len(encode(0, group_keys))
+        shown = int(np.searchsorted(row_chars, budget_chars - base, side="right")) - 1
+        shown = max(0, min(shown, len(rows)))
+        text = encode(shown, group_keys)
+        # The tail shrinks as rows are added, so the estimate is conservative;
+        # step back only if rounding pushed the text over
+        while shown > 0 and estimate_tokens(text) > budget_tokens:
+            shown -= 1
+            text = encode(shown, group_keys)
+        if estimate_tokens(text) <= budget_tokens:
+            return text
+    return text
@@ -0,0 +1,45 @@
+import threading
+
+import httpx
+
+from backend.agents.supervisor import DEFAULT_MODEL, SupervisorAgent
+
+
+# One keep-alive pool for every supervisor in the process, so repeated questions
+# reuse warm TLS connections to the model endpoint.
+HTTP_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=120)
+HTTP_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+
+_http_client = None
+_supervisors = {}
+_lock = threading.Lock()
+
+
+def get_http_client():
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            _http_client = httpx.Client(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+        return _http_client
+
+
+def get_supervisor(model=DEFAULT_MODEL):
+    """Return the process-wide SupervisorAgent for ``model``, building it on first use."""
+    http_client = get_http_client()
+    with _lock:
+        supervisor = _supervisors.get(model)
+        if supervisor is None:
+            supervisor = _supervisors[model] = SupervisorAgent(model=model, http_client=http_client)
+        return supervisor
+
+
+def set_supervisor(model, supervisor):
+    """Register ``supervisor`` for ``model``, e.g. one built on a fake client; returns the previous one.
+
+    Passing None removes the entry, so the next ``get_supervisor`` builds a new one.
+    """
+    with _lock:
+        previous = _supervisors.pop(model, None)
+        if supervisor is not None:
+            _supervisors[model] = supervisor
+        return previous
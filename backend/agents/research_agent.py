@@ -1,22 +1,106 @@
 #What is happening in the market?
 
-import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
 
 import pandas as pd
 
-from backend.agents.tools import search_web, summarize_portfolio
+from backend.agents.tools import PortfolioSnapshot, normalize_query, search_web
+
+
+QUERY_MODES = ("auto", "local", "llm")
+
+_QUERY_WORD = re.compile(r"[A-Za-z][A-Za-z0-9.&-]*")
+_STOPWORDS = frozenset(
+    """
+    a about above after again against all am an and any are as at be because been before being below between both
+    but by can could did do does doing down during each few for from further had has have having how i if in into
+    is it its just me might more most my no nor not now of off on once only or other our out over own same should
+    so some such than that the their them then there these they this those through to too under until up very was
+    we were what when where which while who whom why will with would you your
+    affect affects happen happening impact think tell explain please mean means hold holdings holding own owned
+    portfolio stocks stock investments invest lately currently right going
+    """.split()
+)
+# Words that ask about the user's own exposure, answered with their largest sectors
+_PORTFOLIO_WORDS = frozenset({"my", "portfolio", "holdings", "sector", "sectors", "exposure", "positions"})
+_OUTLOOK_WORDS = frozenset({"news", "outlook", "forecast", "trend", "trends", "latest", "today", "week", "month", "year"})
+
+# Planner outputs by (model, normalized question), shared by every ResearchAgent
+_PLANNED_LIMIT = 256
+_planned = OrderedDict()
+_planned_lock = threading.Lock()
+
+
+def build_search_query(user_query: str, snapshot: PortfolioSnapshot):
+    """Turn a question into a web-search query without a model call.
+
+    Keeps the question's content words, tickers it names that the portfolio
+    holds, and the portfolio's largest sectors when the question is about the
+    user's own holdings. Returns the query and how many content words it kept.
+    """
+    words = _QUERY_WORD.findall(user_query or "")
+    held = snapshot.held_symbols
+
+    keywords, tickers = [], []
+    for word in words:
+        lowered = word.lower().rstrip(".")
+        if word.isupper() and word.rstrip(".") in held:
+            tickers.append(word.rstrip("."))
+        elif lowered not in _STOPWORDS and len(lowered) > 1 and lowered not in keywords:
+            keywords.append(lowered)
+
+    sectors = []
+    if not tickers and _PORTFOLIO_WORDS.intersection(word.lower() for word in words):
+        allocation = snapshot.sector_allocation if not snapshot.empty else {}
+        sectors = [sector for sector, _ in sorted(allocation.items(), key=lambda item: -item[1])[:2]]
+
+    terms = list(dict.fromkeys(keywords[:6] + tickers[:3] + [str(sector).lower() for sector in sectors]))
+    if terms and not _OUTLOOK_WORDS.intersection(terms):
+        terms.append("outlook")
+    return " ".join(terms), len(keywords)
 
 
 class ResearchAgent:
-    """Specialist agent focused on researching what happens in the market and how it may affect the portfolio."""
+    """Specialist agent focused on researching what happens in the market and how it may affect the portfolio.
+
+    ``query_mode`` picks how the web-search query is planned: ``"local"`` builds
+    it from the question and portfolio without a model call, ``"llm"`` asks the
+    model, and ``"auto"`` builds it locally unless the question has too few
+    content words to search on.
+    """
 
-    def __init__(self, client, model):
+    def __init__(self, client, model, query_mode="auto"):
+        if query_mode not in QUERY_MODES:
+            raise ValueError(f"query_mode must be one of {', '.join(QUERY_MODES)}")
         self.client = client
         self.model = model
+        self.query_mode = query_mode
 
-    def run(self, user_query: str, portfolio_df: pd.DataFrame):
-        portfolio_summary = summarize_portfolio(portfolio_df)
+    def _plan_query(self, user_query, snapshot):
+        """Return ``(search query, source)``, where source is local, cache or llm."""
+        if self.query_mode != "llm":
+            search_query, keyword_count = build_search_query(user_query, snapshot)
+            if self.query_mode == "local" or keyword_count >= 2:
+                return search_query, "local"
 
+        key = (self.model, normalize_query(user_query))
+        with _planned_lock:
+            if key in _planned:
+                _planned.move_to_end(key)
+                return _planned[key], "cache"
+
+        search_query = self._plan_query_with_llm(user_query)
+        with _planned_lock:
+            _planned[key] = search_query
+            while len(_planned) > _PLANNED_LIMIT:
+                _planned.popitem(last=False)
+        return search_query, "llm"
+
+    def _plan_query_with_llm(self, user_query):
         planning_messages = [
             {
                 "role": "system",
@@ -36,7 +120,15 @@ class ResearchAgent:
             messages=planning_messages,
             temperature=0.2,
         )
-        search_query = search_query_response.choices[0].message.content.strip()
+        return search_query_response.choices[0].message.content.strip()
+
+    def run(self, user_query: str, portfolio_df: pd.DataFrame):
+        snapshot = PortfolioSnapshot.of(portfolio_df)
+        portfolio_summary = snapshot.summary
+
+        started = time.perf_counter()
+        search_query, query_source = self._plan_query(user_query, snapshot)
+        planning_seconds = time.perf_counter() - started
 
         web_context = search_web(search_query, max_results=3)
         web_context_text = ""
@@ -65,7 +157,7 @@ class ResearchAgent:
                 "role": "user",
                 "content": (
                     f"User question:\n{user_query}\n\n"
-                    f"Portfolio summary JSON:\n{json.dumps(portfolio_summary, indent=2)}\n\n"
+                    f"Portfolio summary JSON:\n{snapshot.prompt_context(self.model)}\n\n"
                     f"Search query used:\n{search_query}\n\n"
                     f"Web context:\n{web_context_text if web_context_text else 'No web context available.'}"
                 ),
@@ -82,5 +174,34 @@ class ResearchAgent:
             "agent": "Research Agent",
             "portfolio_summary": portfolio_summary,
             "search_query": search_query,
+            "query_source": query_source,
+            "planning_seconds": round(planning_seconds, 4),
             "answer": answer_response.choices[0].message.content,
         }
+
+
+class ResearchMemo:
+    """Share research results between the agents of one supervisor run.
+
+    The first caller for a question runs the research pipeline; anyone asking the
+    same question meanwhile waits for that result instead of starting another.
+    """
+
+    def __init__(self, research_agent):
+        self.research_agent = research_agent
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def run(self, user_query: str, portfolio_df: pd.DataFrame):
+        with self._lock:
+            result = self._results.get(user_query)
+            owner = result is None
+            if owner:
+                result = self._results[user_query] = Future()
+
+        if owner:
+            try:
+                result.set_result(self.research_agent.run(user_query, portfolio_df))
+            except Exception as exc:
+                result.set_exception(exc)
+        return result.result()
@@ -1,10 +1,14 @@
 #What risks currently exist in the portfolio?
 
 import json
+import logging
 
 import pandas as pd
 
-from backend.agents.tools import summarize_portfolio
+from backend.agents.tools import PortfolioSnapshot
+from backend.services.risk import portfolio_risk
+
+logger = logging.getLogger(__name__)
 
 
 class RiskAgent:
@@ -14,8 +18,20 @@ class RiskAgent:
         self.client = client
         self.model = model
 
+    def _risk_metrics(self, snapshot):
+        """Volatility, VaR, drawdown and correlation metrics from price history, or None without it."""
+        if snapshot.empty:
+            return None
+        try:
+            return portfolio_risk(snapshot.frame)
+        except Exception:
+            logger.exception("Risk metrics failed; answering without them")
+            return None
+
     def run(self, user_query: str, portfolio_df: pd.DataFrame):
-        portfolio_summary = summarize_portfolio(portfolio_df)
+        snapshot = PortfolioSnapshot.of(portfolio_df)
+        portfolio_summary = snapshot.summary
+        risk_metrics = self._risk_metrics(snapshot)
 
         messages = [
             {
@@ -30,6 +46,7 @@ class RiskAgent:
                     "If a formula or value would otherwise run together, add a line break or separate sentence to keep it readable. "
                     "If you want to show a literal dollar sign, escape it correctly for markdown/LaTeX so it is not mistaken for math delimiters. "
                     "Use inline math rather than heavy display formatting unless necessary, and avoid unescaped math adjacent to plain text. "
+                    "When risk metrics are provided, use them for volatility, beta, VaR, drawdown and correlation statements; they are computed from the last year of daily prices, and returns, VaR and weights there are fractions. "
                     "Note that although the tickers are valid, the sector and asset class they correspond to is inputted by the user and may be incorrect. Assume that the user inputted data is correct."
                 ),
             },
@@ -37,7 +54,8 @@ class RiskAgent:
                 "role": "user",
                 "content": (
                     f"User question:\n{user_query}\n\n"
-                    f"Portfolio summary JSON:\n{json.dumps(portfolio_summary, indent=2)}"
+                    f"Portfolio summary JSON:\n{snapshot.prompt_context(self.model)}\n\n"
+                    f"Risk metrics JSON:\n{json.dumps(risk_metrics) if risk_metrics else 'No price history was available for risk metrics.'}"
                 ),
             },
         ]
@@ -51,5 +69,6 @@ class RiskAgent:
         return {
             "agent": "Risk Agent",
             "portfolio_summary": portfolio_summary,
+            "risk_metrics": risk_metrics,
             "answer": response.choices[0].message.content,
         }
@@ -1,27 +1,51 @@
 #What could happen under different future or historical scenarios?
 
 import json
+import logging
 
 import pandas as pd
 
 from backend.agents.research_agent import ResearchAgent
-from backend.agents.tools import summarize_portfolio
+from backend.agents.tools import PortfolioSnapshot
+from backend.services.simulation import DEFAULT_PATHS, horizon_from_query, simulate_portfolio
+
+logger = logging.getLogger(__name__)
 
 
 class SimulationAgent:
     """Specialist agent focused on simulating/predicting user inputted scenarios."""
 
-    def __init__(self, client, model):
+    def __init__(self, client, model, simulation_paths=DEFAULT_PATHS, simulation_processes=1, research_query_mode="auto"):
         self.client = client
         self.model = model
-        self.research_agent = ResearchAgent(client, model)
+        self.research_agent = ResearchAgent(client, model, query_mode=research_query_mode)
+        self.simulation_paths = simulation_paths
+        self.simulation_processes = simulation_processes
+
+    def _simulate(self, user_query, snapshot):
+        """Monte Carlo statistics over the horizon named in the question, or None without price history."""
+        if snapshot.empty:
+            return None
+        try:
+            return simulate_portfolio(
+                snapshot.frame,
+                horizon=horizon_from_query(user_query),
+                paths=self.simulation_paths,
+                processes=self.simulation_processes,
+            )
+        except Exception:
+            logger.exception("Monte Carlo simulation failed; answering without it")
+            return None
 
-    def run(self, user_query: str, portfolio_df: pd.DataFrame):
-        portfolio_summary = summarize_portfolio(portfolio_df)
+    def run(self, user_query: str, portfolio_df: pd.DataFrame, research_agent=None):
+        research_agent = research_agent or self.research_agent
+        snapshot = PortfolioSnapshot.of(portfolio_df)
+        portfolio_summary = snapshot.summary
         research_context = ""
+        simulation = self._simulate(user_query, snapshot)
 
         if any(keyword in user_query.lower() for keyword in ["market", "news", "economic", "recession", "inflation", "rate", "fed", "policy", "trend", "geopolitical"]):
-            research_result = self.research_agent.run(user_query, portfolio_df)
+            research_result = research_agent.run(user_query, snapshot)
             research_context = research_result.get("answer", "")
 
         messages = [
@@ -36,6 +60,8 @@ class SimulationAgent:
                     "If a formula or value would otherwise run together, add a line break or separate sentence to keep it readable. "
                     "If you want to show a literal dollar sign, escape it correctly for markdown/LaTeX so it is not mistaken for math delimiters. "
                     "Use inline math rather than heavy display formatting unless necessary, and avoid unescaped math adjacent to plain text. "
+                    "When Monte Carlo results are provided, base any numbers on them and say they come from resampled historical returns at today's weights, not a forecast. "
+                    "Returns and drawdowns there are fractions of the starting value. "
                     "Note that although the user portfolio tickers are valid, the sector and asset class they correspond to is inputted by the user and may be incorrect. Assume that the user inputted data is correct."
                 ),
             },
@@ -43,7 +69,8 @@ class SimulationAgent:
                 "role": "user",
                 "content": (
                     f"User question:\n{user_query}\n\n"
-                    f"Portfolio summary JSON:\n{json.dumps(portfolio_summary, indent=2)}\n\n"
+                    f"Portfolio summary JSON:\n{snapshot.prompt_context(self.model)}\n\n"
+                    f"Monte Carlo simulation JSON:\n{json.dumps(simulation) if simulation else 'No price history was available to simulate.'}\n\n"
                     f"Research context:\n{research_context if research_context else 'No additional research context provided.'}"
                 ),
             },
@@ -59,5 +86,6 @@ class SimulationAgent:
             "agent": "Simulation Agent",
             "portfolio_summary": portfolio_summary,
             "research_context": research_context,
+            "simulation": simulation,
             "answer": response.choices[0].message.content,
         }
\ No newline at end of file
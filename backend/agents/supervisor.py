@@ -1,4 +1,6 @@
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
 import aisuite as ai
 import pandas as pd
@@ -6,17 +8,22 @@ from dotenv import load_dotenv
 
 from backend.agents.allocation_agent import AllocationAgent
 from backend.agents.explanation_agent import ExplanationAgent
-from backend.agents.research_agent import ResearchAgent
+from backend.agents.llm_cache import CachedClient
+from backend.agents.research_agent import ResearchAgent, ResearchMemo
 from backend.agents.risk_agent import RiskAgent
 from backend.agents.simulation_agent import SimulationAgent
-from backend.agents.tools import sanitize_streamlit_math
+from backend.agents.tools import PortfolioSnapshot, StreamingMathSanitizer, sanitize_streamlit_math
 
 
 DEFAULT_MODEL = "openai:gemini-3.5-flash-lite"
-GEMINI_OPENAI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai/"
+AGENT_TIMEOUT_SECONDS = 90
+MAX_PARALLEL_AGENTS = 5
 
 load_dotenv()
 
+# Any OpenAI-compatible endpoint works, e.g. a local server for offline runs
+GEMINI_OPENAI_BASE_URL = os.getenv("LLM_BASE_URL", "").strip() or "https://generativelanguage.googleapis.com/v1beta/openai/"
+
 
 def resolve_gemini_api_key():
     return os.getenv("GEMINI_API_KEY", "").strip() or os.getenv("GOOGLE_API_KEY", "").strip()
@@ -25,30 +32,60 @@ def resolve_gemini_api_key():
 class SupervisorAgent:
     """Routes a user question to specialist agents and prepares a final answer."""
 
-    def __init__(self, model=DEFAULT_MODEL):
+    def __init__(
+        self,
+        model=DEFAULT_MODEL,
+        agent_timeout=AGENT_TIMEOUT_SECONDS,
+        max_parallel_agents=MAX_PARALLEL_AGENTS,
+        cache_responses=True,
+        http_client=None,
+        api_key=None,
+        research_query_mode="auto",
+    ):
         self.model = model
-        api_key = resolve_gemini_api_key()
+        self.agent_timeout = agent_timeout
+        self.max_parallel_agents = max_parallel_agents
+        api_key = api_key or resolve_gemini_api_key()
         if not api_key:
             raise RuntimeError(
                 "Gemini API key is missing. Add GEMINI_API_KEY to the project root .env file."
             )
 
-        self.client = ai.Client(
-            provider_configs={
-                "openai": {
-                    "api_key": api_key,
-                    "base_url": GEMINI_OPENAI_BASE_URL,
-                }
-            }
-        )
+        provider_config = {
+            "api_key": api_key,
+            "base_url": GEMINI_OPENAI_BASE_URL,
+        }
+        if http_client is not None:
+            provider_config["http_client"] = http_client
+
+        self.client = ai.Client(provider_configs={"openai": provider_config})
+        if cache_responses:
+            # Specialists receive the wrapped client, so they share the cache too
+            self.client = CachedClient(self.client)
         self.risk_agent = RiskAgent(self.client, self.model)
         self.allocation_agent = AllocationAgent()
-        self.research_agent = ResearchAgent(self.client, self.model)
-        self.simulation_agent = SimulationAgent(self.client, self.model)
-        self.explanation_agent = ExplanationAgent(self.client, self.model)
+        self.research_agent = ResearchAgent(self.client, self.model, query_mode=research_query_mode)
+        self.simulation_agent = SimulationAgent(self.client, self.model, research_query_mode=research_query_mode)
+        self.explanation_agent = ExplanationAgent(self.client, self.model, research_query_mode=research_query_mode)
+
+    def _run_specialist(self, agent, user_query, portfolio_df, research):
+        """Run one specialist, routing every research request through the run's shared memo."""
+        if agent is self.research_agent:
+            return research.run(user_query, portfolio_df)
+        if agent is self.simulation_agent or agent is self.explanation_agent:
+            return agent.run(user_query, portfolio_df, research_agent=research)
+        return agent.run(user_query, portfolio_df)
+
+    @staticmethod
+    def _failed_result(agent_name, answer, exc=None):
+        return {
+            "agent": agent_name,
+            "answer": answer,
+            "portfolio_summary": {},
+            "error": str(exc) if exc is not None else answer,
+        }
 
-    def run(self, user_query: str, portfolio_df: pd.DataFrame):
-        specialist_results = []
+    def _select_agents(self, user_query):
         query = (user_query or "").lower()
 
         routing_rules = [
@@ -66,25 +103,61 @@ class SupervisorAgent:
 
         if not selected_agents:
             selected_agents = [self.research_agent]
-
-        for agent in selected_agents:
-            agent_name = getattr(agent, "name", agent.__class__.__name__)
+        return selected_agents
+
+    def _specialist_results(self, user_query, portfolio_df):
+        """Yield ``(routing index, result)`` pairs as the selected specialists finish.
+
+        Specialists only read the portfolio, so they wait on the LLM side by side,
+        share one snapshot of its summary, and one failure or timeout never sinks the rest.
+        """
+        selected_agents = self._select_agents(user_query)
+        snapshot = PortfolioSnapshot.of(portfolio_df)
+        executor = ThreadPoolExecutor(max_workers=min(len(selected_agents), self.max_parallel_agents))
+        research = ResearchMemo(self.research_agent)
+        futures = {
+            executor.submit(self._run_specialist, agent, user_query, snapshot, research): (index, agent)
+            for index, agent in enumerate(selected_agents)
+        }
+        pending = set(futures)
+        try:
             try:
-                specialist_result = agent.run(user_query, portfolio_df)
-                if isinstance(specialist_result, dict) and isinstance(specialist_result.get("answer"), str):
-                    specialist_result["answer"] = sanitize_streamlit_math(specialist_result["answer"])
-                specialist_results.append(specialist_result)
-            except Exception as exc:
-                specialist_results.append(
-                    {
-                        "agent": agent_name,
-                        "answer": f"Unable to run {agent_name}: {exc}",
-                        "portfolio_summary": {},
-                        "error": str(exc),
-                    }
-                )
-
-        messages = [
+                for future in as_completed(futures, timeout=self.agent_timeout):
+                    pending.discard(future)
+                    index, agent = futures[future]
+                    yield index, self._collect(agent, future)
+            except FutureTimeoutError:
+                for future in pending:
+                    index, agent = futures[future]
+                    if future.done():
+                        yield index, self._collect(agent, future)
+                        continue
+                    future.cancel()
+                    agent_name = getattr(agent, "name", agent.__class__.__name__)
+                    yield index, self._failed_result(agent_name, f"{agent_name} timed out after {self.agent_timeout} seconds")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _collect(self, agent, future):
+        agent_name = getattr(agent, "name", agent.__class__.__name__)
+        try:
+            specialist_result = future.result()
+        except Exception as exc:
+            return self._failed_result(agent_name, f"Unable to run {agent_name}: {exc}", exc)
+
+        if isinstance(specialist_result, dict) and isinstance(specialist_result.get("answer"), str):
+            # Research results are shared with other agents, so sanitize a copy
+            specialist_result = dict(specialist_result)
+            specialist_result["answer"] = sanitize_streamlit_math(specialist_result["answer"])
+        return specialist_result
+
+    def _final_messages(self, user_query, snapshot, specialist_results):
+        # Specialists each echo the full portfolio summary; the budgeted context is sent once instead
+        findings = [
+            {key: value for key, value in result.items() if key != "portfolio_summary"} if isinstance(result, dict) else result
+            for result in specialist_results
+        ]
+        return [
             {
                 "role": "system",
                 "content": (
@@ -104,22 +177,31 @@ class SupervisorAgent:
                 "role": "user",
                 "content": (
                     f"User question:\n{user_query}\n\n"
-                    f"Specialist results:\n{specialist_results}"
+                    f"Portfolio summary JSON:\n{snapshot.prompt_context(self.model)}\n\n"
+                    f"Specialist results:\n{findings}"
                 ),
             },
         ]
 
+    def _complete(self, messages, **kwargs):
         try:
-            response = self.client.chat.completions.create(
+            return self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 temperature=0.2,
+                **kwargs,
             )
         except Exception as exc:
             raise RuntimeError(
                 f"Gemini request failed. Check GEMINI_API_KEY and Gemini model access. Details: {exc}"
             ) from exc
 
+    def run(self, user_query: str, portfolio_df: pd.DataFrame):
+        snapshot = PortfolioSnapshot.of(portfolio_df)
+        ordered = sorted(self._specialist_results(user_query, snapshot), key=lambda item: item[0])
+        specialist_results = [result for _, result in ordered]
+
+        response = self._complete(self._final_messages(user_query, snapshot, specialist_results))
         final_answer = sanitize_streamlit_math(response.choices[0].message.content)
 
         return {
@@ -128,3 +210,45 @@ class SupervisorAgent:
             "specialist_results": specialist_results,
             "final_answer": final_answer,
         }
+
+    def stream(self, user_query: str, portfolio_df: pd.DataFrame):
+        """Yield progress events for a question instead of one final result.
+
+        Emits a ``specialist`` event as each specialist finishes, ``token`` events
+        with sanitized pieces of the final answer as the model streams it, and a
+        closing ``done`` event shaped like the result of ``run``.
+        """
+        snapshot = PortfolioSnapshot.of(portfolio_df)
+        ordered = []
+        for index, specialist_result in self._specialist_results(user_query, snapshot):
+            ordered.append((index, specialist_result))
+            yield {"type": "specialist", "result": specialist_result}
+        specialist_results = [result for _, result in sorted(ordered, key=lambda item: item[0])]
+
+        sanitizer = StreamingMathSanitizer()
+        pieces = []
+        try:
+            for chunk in self._complete(self._final_messages(user_query, snapshot, specialist_results), stream=True):
+                if not chunk.choices:
+                    continue
+                text = sanitizer.feed(chunk.choices[0].delta.content or "")
+                if text:
+                    pieces.append(text)
+                    yield {"type": "token", "text": text}
+        except RuntimeError:
+            raise
+        except Exception as exc:
+            raise RuntimeError(f"Gemini stream failed. Details: {exc}") from exc
+
+        text = sanitizer.flush()
+        if text:
+            pieces.append(text)
+            yield {"type": "token", "text": text}
+
+        yield {
+            "type": "done",
+            "supervisor": "Supervisor Agent",
+            "model": self.model,
+            "specialist_results": specialist_results,
+            "final_answer": "".join(pieces),
+        }
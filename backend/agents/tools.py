@@ -1,81 +1,188 @@
+import json
+import os
 import re
+import threading
+import time
+from collections import OrderedDict
 
+import numpy as np
 import pandas as pd
 import requests
 
+from backend.agents.prompt_context import build_prompt_context, portfolio_token_budget
 from backend.services.validation import valid_percent
 
 
+_MATH_NUMERIC = re.compile(r"[\d,\.\s%]+")
+_MATH_SYMBOL = re.compile(r"[=+\-*/^_\\()\[\]{}]")
+_PLAIN_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_LETTER = re.compile(r"[A-Za-z]")
+
+# Recent outputs of sanitize_streamlit_math. Sanitizing is idempotent, so text
+# that comes back for another pass (supervisor, then the page) is returned as is.
+_SANITIZED_LIMIT = 256
+_sanitized = OrderedDict()
+_sanitized_lock = threading.Lock()
+
+
 def sanitize_streamlit_math(text: str) -> str:
     """Clean final AI responses for Streamlit markdown/LaTeX rendering.
 
     This keeps useful inline math like $P = 0.4V$ while preventing the common
     rendering bugs caused by stray dollar signs, adjacent math delimiters, or
-    plain numeric values accidentally being treated as math.
+    plain numeric values accidentally being treated as math. Dollar signs before
+    numbers are treated as currency rather than opening math delimiters.
     """
-    if not isinstance(text, str):
+    if not isinstance(text, str) or "$" not in text:
         return text
 
-    def is_math_like(inner: str) -> bool:
-        value = inner.strip()
-        if not value:
-            return False
+    with _sanitized_lock:
+        if text in _sanitized:
+            _sanitized.move_to_end(text)
+            return text
 
-        if re.fullmatch(r"[\d,\.\s%]+", value):
-            return False
+    sanitizer = StreamingMathSanitizer()
+    result = sanitizer.feed(text) + sanitizer.flush()
 
-        if re.search(r"[=+\-*/^_\\()\[\]{}]", value):
-            return True
+    with _sanitized_lock:
+        _sanitized[result] = None
+        while len(_sanitized) > _SANITIZED_LIMIT:
+            _sanitized.popitem(last=False)
+    return result
 
-        if re.search(r"\\[A-Za-z]+", value):
-            return True
 
-        if re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", value):
-            return False
+def _is_math_like(inner: str) -> bool:
+    value = inner.strip()
+    if not value:
+        return False
 
-        return bool(re.search(r"[A-Za-z]", value))
+    if _MATH_NUMERIC.fullmatch(value):
+        return False
 
-    if "$" not in text:
-        return text
+    # Operators, brackets and backslash commands such as \frac all mark math
+    if _MATH_SYMBOL.search(value):
+        return True
+
+    if _PLAIN_IDENTIFIER.fullmatch(value):
+        return False
+
+    return bool(_LETTER.search(value))
+
+
+_PLAIN_TEXT = re.compile(r"[^$\\]+")
+_CURRENCY_FOLLOWER = re.compile(r"\s*\d")
+_WHITESPACE_ONLY = re.compile(r"\s*")
+
+
+class StreamingMathSanitizer:
+    """Single-pass scanner behind sanitize_streamlit_math, usable on streamed text.
+
+    ``feed`` returns the sanitized text that can no longer change. Anything that
+    depends on text not seen yet, such as an open ``$...$`` span or a dollar sign
+    that may turn out to be currency, is held back until it is decided or until
+    ``flush`` ends the stream. The concatenated output equals
+    ``sanitize_streamlit_math`` on the full text.
+    """
 
-    # Dollar signs before numbers are currency, including multiple values in
-    # one sentence, rather than opening math delimiters.
-    text = re.sub(r"(?<!\\)\$(?=\s*\d)", r"\\$", text)
-
-    result = []
-    i = 0
-    while i < len(text):
-        if text[i] == "\\" and i + 1 < len(text) and text[i + 1] == "$":
-            result.extend(("\\", "$"))
-            i += 2
-            continue
-
-        if text[i] != "$":
-            result.append(text[i])
-            i += 1
-            continue
-
-        if i + 1 < len(text) and text[i + 1] == "$":
-            result.append("$$")
-            i += 2
-            continue
-
-        end = text.find("$", i + 1)
-        if end == -1:
-            result.append(r"\$")
-            i += 1
-            continue
-
-        inner = text[i + 1 : end]
-        if is_math_like(inner):
-            result.append(text[i : end + 1])
-        else:
-            result.append(r"\$")
-            result.append(inner)
-            result.append(r"\$")
-        i = end + 1
-
-    return "".join(result)
+    def __init__(self):
+        self._buffer = ""
+        self._previous = ""
+        self._search_from = 0
+
+    def feed(self, chunk: str) -> str:
+        self._buffer += chunk
+        return self._drain(final=False)
+
+    def flush(self) -> str:
+        output = self._drain(final=True)
+        self._buffer = ""
+        self._previous = ""
+        self._search_from = 0
+        return output
+
+    def _is_currency(self, text, index, final):
+        """Whether the ``$`` at ``index`` is a currency sign, or None if undecided yet."""
+        before = text[index - 1] if index else self._previous
+        if before == "\\":
+            return False
+        if _CURRENCY_FOLLOWER.match(text, index + 1):
+            return True
+        if not final and _WHITESPACE_ONLY.match(text, index + 1).end() == len(text):
+            return None
+        return False
+
+    def _drain(self, final):
+        text = self._buffer
+        size = len(text)
+        output = []
+        i = 0
+        while i < size:
+            plain = _PLAIN_TEXT.match(text, i)
+            if plain:
+                output.append(plain.group())
+                i = plain.end()
+                continue
+
+            if text[i] == "\\":
+                if i + 1 == size and not final:
+                    break
+                if i + 1 < size and text[i + 1] == "$":
+                    output.append("\\$")
+                    i += 2
+                else:
+                    output.append("\\")
+                    i += 1
+                continue
+
+            currency = self._is_currency(text, i, final)
+            if currency is None:
+                break
+            if currency:
+                output.append("\\$")
+                i += 1
+                continue
+
+            if i + 1 == size and not final:
+                break
+            if i + 1 < size and text[i + 1] == "$":
+                next_currency = self._is_currency(text, i + 1, final)
+                if next_currency is None:
+                    break
+                if not next_currency:
+                    output.append("$$")
+                    i += 2
+                    continue
+
+            end = text.find("$", max(i + 1, self._search_from))
+            if end == -1:
+                if not final:
+                    self._search_from = size
+                    break
+                output.append("\\$")
+                i += 1
+                self._search_from = 0
+                continue
+
+            closing_currency = self._is_currency(text, end, final)
+            if closing_currency is None:
+                self._search_from = end
+                break
+
+            # A currency sign that closes a span was escaped by the currency
+            # pre-pass, so its backslash belongs to the span's content.
+            inner = text[i + 1 : end] + ("\\" if closing_currency else "")
+            if _is_math_like(inner):
+                output.append("$" + inner + "$")
+            else:
+                output.append("\\$" + inner + "\\$")
+            i = end + 1
+            self._search_from = 0
+
+        if i:
+            self._previous = text[i - 1]
+            self._buffer = text[i:]
+            self._search_from = max(0, self._search_from - i)
+        return "".join(output)
 
 
 def portfolio_to_records(portfolio_df: pd.DataFrame):
@@ -85,66 +192,161 @@ def portfolio_to_records(portfolio_df: pd.DataFrame):
     return portfolio_df.to_dict(orient="records")
 
 
-def summarize_portfolio(portfolio_df: pd.DataFrame):
-    """Create compact portfolio details for agent prompts without target allocations."""
-    if portfolio_df is None or portfolio_df.empty:
+EMPTY_SUMMARY = {
+    "total_current_value": 0,
+    "position_count": 0,
+    "tickers": [],
+    "stocks_purchased": [],
+    "asset_allocation": {},
+    "sector_allocation": {},
+    "largest_positions": [],
+}
+
+
+class PortfolioSnapshot:
+    """A portfolio plus the summary views agents need, each computed at most once.
+
+    Market values, weights and allocations are built with NumPy the first time an
+    agent asks for them and then shared, including the serialized summary JSON,
+    by every agent that receives the same snapshot.
+    """
+
+    def __init__(self, portfolio_df: pd.DataFrame):
+        self.frame = portfolio_df if portfolio_df is not None else pd.DataFrame()
+        self._views = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def of(cls, portfolio):
+        """Wrap a DataFrame, or return an existing snapshot unchanged."""
+        return portfolio if isinstance(portfolio, cls) else cls(portfolio)
+
+    @property
+    def empty(self):
+        return self.frame.empty
+
+    def _view(self, name, build):
+        with self._lock:
+            if name not in self._views:
+                self._views[name] = build()
+            return self._views[name]
+
+    @property
+    def market_values(self):
+        return self._view(
+            "market_values",
+            lambda: self.frame["quantity"].to_numpy(dtype=float) * self.frame["current"].to_numpy(dtype=float),
+        )
+
+    @property
+    def total_value(self):
+        return self._view("total_value", lambda: float(np.nansum(self.market_values)))
+
+    @property
+    def weights(self):
+        def build():
+            if self.total_value == 0:
+                return np.zeros(len(self.frame), dtype=int)
+            return self.market_values / self.total_value
+
+        return self._view("weights", build)
+
+    def _allocation(self, column):
+        if not self.total_value:
+            return {}
+        codes, labels = pd.factorize(self.frame[column], sort=True)
+        present = codes >= 0
+        sums = np.bincount(codes[present], weights=np.nan_to_num(self.market_values[present]), minlength=len(labels))
+        percents = np.round(sums / self.total_value * 100, 2)
+        return dict(zip(labels.tolist(), percents.tolist()))
+
+    @property
+    def held_symbols(self):
+        """Upper-cased tickers in the portfolio."""
+        return self._view(
+            "held_symbols",
+            lambda: frozenset() if self.empty else frozenset(self.frame["symbol"].astype(str).str.upper()),
+        )
+
+    @property
+    def asset_allocation(self):
+        return self._view("asset_allocation", lambda: self._allocation("asset_class"))
+
+    @property
+    def sector_allocation(self):
+        return self._view("sector_allocation", lambda: self._allocation("sector"))
+
+    @property
+    def summary(self):
+        """Compact portfolio details for agent prompts, without target allocations."""
+        return self._view("summary", self._build_summary)
+
+    def prompt_context(self, model=None, budget_tokens=None):
+        """Compact portfolio JSON for prompts, kept within the model's token budget."""
+        if budget_tokens is None:
+            budget_tokens = portfolio_token_budget(model)
+        return self._view(("prompt_context", budget_tokens), lambda: build_prompt_context(self, budget_tokens))
+
+    def _build_summary(self):
+        if self.empty:
+            return {key: (value.copy() if hasattr(value, "copy") else value) for key, value in EMPTY_SUMMARY.items()}
+
+        frame = self.frame
+        weights = self.weights
+        symbols = frame["symbol"].tolist()
+        asset_classes = frame["asset_class"].tolist()
+        sectors = frame["sector"].tolist()
+        # Rounded through pandas so integer columns stay integers in the prompt JSON
+        market_value_column = frame["quantity"] * frame["current"]
+        market_values = market_value_column.tolist()
+
+        largest = np.argsort(-weights, kind="stable")[:5]
+        largest_positions = [
+            {
+                "symbol": symbols[i],
+                "asset_class": asset_classes[i],
+                "sector": sectors[i],
+                "market_value": market_values[i],
+                "portfolio_weight": np.round(weights[i] * 100, 2).item(),
+            }
+            for i in largest
+        ]
+
+        stocks_purchased = [
+            {
+                "symbol": symbol,
+                "quantity": quantity,
+                "avg_cost": avg_cost,
+                "current": current,
+                "market_value": market_value,
+                "sector": sector,
+                "asset_class": asset_class,
+            }
+            for symbol, quantity, avg_cost, current, market_value, sector, asset_class in zip(
+                symbols,
+                frame["quantity"].tolist(),
+                frame["avg_cost"].round(2).tolist(),
+                frame["current"].round(2).tolist(),
+                market_value_column.round(2).tolist(),
+                sectors,
+                asset_classes,
+            )
+        ]
+
         return {
-            "total_current_value": 0,
-            "position_count": 0,
-            "tickers": [],
-            "stocks_purchased": [],
-            "asset_allocation": {},
-            "sector_allocation": {},
-            "largest_positions": [],
+            "total_current_value": round(self.total_value, 2),
+            "position_count": int(len(frame)),
+            "tickers": frame["symbol"].astype(str).tolist(),
+            "stocks_purchased": stocks_purchased,
+            "asset_allocation": self.asset_allocation,
+            "sector_allocation": self.sector_allocation,
+            "largest_positions": largest_positions,
         }
 
-    working = portfolio_df.copy()
-    working["market_value"] = working["quantity"] * working["current"]
-    total_value = working["market_value"].sum()
-
-    if total_value == 0:
-        working["portfolio_weight"] = 0
-    else:
-        working["portfolio_weight"] = working["market_value"] / total_value
-
-    asset_allocation = (
-        working.groupby("asset_class")["market_value"].sum().div(total_value).mul(100).round(2).to_dict()
-        if total_value
-        else {}
-    )
-    sector_allocation = (
-        working.groupby("sector")["market_value"].sum().div(total_value).mul(100).round(2).to_dict()
-        if total_value
-        else {}
-    )
-
-    largest_positions = (
-        working.sort_values("portfolio_weight", ascending=False)
-        .head(5)[["symbol", "asset_class", "sector", "market_value", "portfolio_weight"]]
-        .assign(portfolio_weight=lambda df: (df["portfolio_weight"] * 100).round(2))
-        .to_dict(orient="records")
-    )
-
-    stocks_purchased = (
-        working[["symbol", "quantity", "avg_cost", "current", "market_value", "sector", "asset_class"]]
-        .copy()
-        .assign(
-            avg_cost=lambda df: df["avg_cost"].round(2),
-            current=lambda df: df["current"].round(2),
-            market_value=lambda df: df["market_value"].round(2),
-        )
-        .to_dict(orient="records")
-    )
 
-    return {
-        "total_current_value": round(float(total_value), 2),
-        "position_count": int(len(working)),
-        "tickers": working["symbol"].astype(str).tolist(),
-        "stocks_purchased": stocks_purchased,
-        "asset_allocation": asset_allocation,
-        "sector_allocation": sector_allocation,
-        "largest_positions": largest_positions,
-    }
+def summarize_portfolio(portfolio_df):
+    """Create compact portfolio details for agent prompts without target allocations."""
+    return PortfolioSnapshot.of(portfolio_df).summary
 
 
 def summarize_portfolio_with_desired_allocations(portfolio_df: pd.DataFrame, desired_allocations=None):
@@ -152,34 +354,135 @@ def summarize_portfolio_with_desired_allocations(portfolio_df: pd.DataFrame, des
     return summarize_portfolio(portfolio_df)
 
 
-def search_web(query: str, max_results: int = 5):
-    """Fetch a few search results from DuckDuckGo and return a lightweight summary."""
-    try:
-        response = requests.get(
-            "https://html.duckduckgo.com/html/",
-            params={"q": query},
-            timeout=10,
-        )
-        response.raise_for_status()
-    except Exception:
-        return []
+SEARCH_TTL_SECONDS = 30 * 60
+SEARCH_CACHE_SIZE = 512
+
+_RESULT_LINK = re.compile(r'<a rel="nofollow" class="result__a" href="(.*?)".*?>(.*?)</a>', re.S)
+_RESULT_SNIPPET = re.compile(r'<a class="result__snippet">(.*?)</a>', re.S)
+_HTML_TAG = re.compile(r"<.*?>")
+_SPACES = re.compile(r"\s+")
+_QUERY_NOISE = re.compile(r"[^\w\s$%.&-]+")
+
+
+def _clean_html(text):
+    return _SPACES.sub(" ", _HTML_TAG.sub("", text)).strip()
+
+
+def normalize_query(query: str):
+    """Lowercase a search query and drop punctuation and extra spaces, so rewordings share a cache entry."""
+    return _SPACES.sub(" ", _QUERY_NOISE.sub(" ", str(query).lower())).strip()
+
+
+class DuckDuckGoSearch:
+    """Search backend that scrapes DuckDuckGo's HTML results page over a shared keep-alive session."""
+
+    def __init__(self, timeout=(5, 10)):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=10)
+        self.session.mount("https://", adapter)
+
+    def search(self, query: str, max_results: int = 5):
+        try:
+            response = self.session.get(
+                "https://html.duckduckgo.com/html/",
+                params={"q": query},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+        except Exception:
+            return []
+
+        html = response.text
+        matches = _RESULT_LINK.findall(html)[:max_results]
+        snippets = [match.group(1) for _, match in zip(matches, _RESULT_SNIPPET.finditer(html))]
+
+        results = []
+        for index, (url, title) in enumerate(matches):
+            snippet = snippets[index] if index < len(snippets) else ""
+            results.append({"title": _clean_html(title), "url": url, "snippet": _clean_html(snippet)})
+
+        return results
+
 
-    html = response.text
-    pattern = re.compile(r'<a rel="nofollow" class="result__a" href="(.*?)".*?>(.*?)</a>', re.S)
-    snippet_pattern = re.compile(r'<a class="result__snippet">(.*?)</a>', re.S)
+class FileSearchBackend:
+    """Serve search results from a JSON file for offline use.
+
+    The file maps queries to lists of ``{"title", "url", "snippet"}`` results;
+    queries are matched after normalization, and a ``"*"`` entry answers the rest.
+    """
+
+    def __init__(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            self.results = {
+                query if query == "*" else normalize_query(query): results for query, results in json.load(f).items()
+            }
+
+    def search(self, query: str, max_results: int = 5):
+        results = self.results.get(normalize_query(query), self.results.get("*", []))
+        return [dict(result) for result in results[:max_results]]
+
+
+class SearchCache:
+    """TTL-bounded LRU of search results keyed by normalized query."""
+
+    def __init__(self, ttl=SEARCH_TTL_SECONDS, max_entries=SEARCH_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[1] >= self.ttl:
+                return None
+            self._entries.move_to_end(key)
+            return [dict(result) for result in entry[0]]
+
+    def put(self, key, results):
+        with self._lock:
+            self._entries[key] = ([dict(result) for result in results], time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
 
-    matches = pattern.findall(html)
-    snippets = [m.group(1).strip() for m in snippet_pattern.finditer(html)]
 
-    results = []
-    for index, (url, title) in enumerate(matches[:max_results]):
-        title = re.sub(r"<.*?>", "", title)
-        title = re.sub(r"\s+", " ", title).strip()
-        snippet = snippets[index] if index < len(snippets) else ""
-        snippet = re.sub(r"<.*?>", "", snippet)
-        snippet = re.sub(r"\s+", " ", snippet).strip()
-        results.append({"title": title, "url": url, "snippet": snippet})
+_search_backend = None
+_search_cache = SearchCache()
+_search_lock = threading.Lock()
 
+
+def set_search_backend(backend):
+    """Swap where ``search_web`` gets results, e.g. for offline runs. Returns the previous backend."""
+    global _search_backend, _search_cache
+    with _search_lock:
+        previous, _search_backend = _search_backend, backend
+        _search_cache = SearchCache()
+    return previous
+
+
+def _search_service():
+    global _search_backend
+    with _search_lock:
+        if _search_backend is None:
+            fixture = os.getenv("SEARCH_FIXTURE_FILE", "").strip()
+            _search_backend = FileSearchBackend(fixture) if fixture else DuckDuckGoSearch()
+        return _search_backend, _search_cache
+
+
+def search_web(query: str, max_results: int = 5):
+    """Fetch a few search results from the configured backend and return a lightweight summary.
+
+    Results are cached by normalized query; empty results (usually failures) are not.
+    """
+    backend, cache = _search_service()
+    key = (normalize_query(query), max_results)
+    results = cache.get(key)
+    if results is None:
+        results = backend.search(query, max_results)
+        if results:
+            cache.put(key, results)
     return results
 
 
@@ -1,11 +1,41 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, field_validator
 from typing import Dict, List, Optional
-import sqlite3
+import asyncio
+import json
+
+import pandas as pd
 
 from backend.agents.allocation_agent import AllocationAgent
+from backend.agents.registry import get_supervisor
+from backend.services.db import pool
+from backend.services.executors import run_db, shutdown_cpu_executor, shutdown_db_executor
+from backend.services.migrations import migrate
+from backend.services.risk import CONFIDENCE, MAX_WINDOW_DAYS, WINDOW_DAYS, portfolio_risk
+from backend.services.rebalancing import (
+    DEFAULT_TOLERANCE,
+    OBJECTIVES,
+    PORTFOLIO_COLUMNS,
+    STRATEGY_NAMES,
+    ai_strategy,
+    load_portfolio,
+    run_strategies,
+    run_strategy,
+)
+
 
-app = FastAPI(title="Portfolio Backend (SQLite3)")
+@asynccontextmanager
+async def lifespan(app):
+    await run_db(migrate)
+    yield
+    shutdown_cpu_executor()
+    shutdown_db_executor()
+    pool.close()
+
+
+app = FastAPI(title="Portfolio Backend (SQLite3)", lifespan=lifespan)
 
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -19,27 +49,42 @@ app.add_middleware(
 
 allocation_agent = AllocationAgent()
 
-DATABASE = "portfolio.db"
-
 # Pydantic model for validation
-class PortfolioItem(BaseModel):
+class PortfolioPosition(BaseModel):
     symbol: str
     quantity: float
     avg_cost: float
     sector: str
     asset_class: str
     current: Optional[float] = 0.0
+
+class PortfolioItem(PortfolioPosition):
     user_id: int
 
+class StrategyRequest(BaseModel):
+    changes: Dict[str, float]
+    strategies: Optional[List[str]] = None
+
+    @field_validator("strategies")
+    @classmethod
+    def unique_strategies(cls, names):
+        # Each plan is computed and saved once, whatever the request repeats
+        return list(dict.fromkeys(names)) if names is not None else None
+
+class AdviceRequest(BaseModel):
+    query: str
+    user_id: Optional[int] = None
+    positions: Optional[List[PortfolioPosition]] = None
+
 # --- API Endpoints ---
 
-@app.get("/portfolio/", response_model=List[PortfolioItem])
-def get_portfolio():
-    conn = sqlite3.connect(DATABASE)
+# Handlers are async: SQLite calls run on the database executor through run_db
+# and strategy maths in worker processes, so slow requests don't hold up others.
+
+def _all_positions(conn):
     cursor = conn.cursor()
     cursor.execute("SELECT symbol, quantity, avg_cost, sector, asset_class, current, user_id FROM portfolio")
     rows = cursor.fetchall()
-    conn.close()
 
     return [PortfolioItem(
         symbol=row[0],
@@ -51,33 +96,62 @@ def get_portfolio():
         user_id = row[6]
     ) for row in rows]
 
-@app.post("/portfolio/", response_model=PortfolioItem)
-def add_portfolio_item(item: PortfolioItem):
-    conn = sqlite3.connect(DATABASE)
+@app.get("/portfolio/", response_model=List[PortfolioItem])
+async def get_portfolio():
+    return await run_db(_all_positions)
+
+def _add_position(conn, item):
     cursor = conn.cursor()
     cursor.execute("""
         INSERT INTO portfolio (symbol, quantity, avg_cost, sector, asset_class, current, user_id)
         VALUES (?, ?, ?, ?, ?, ?, ?)
     """, (item.symbol, item.quantity, item.avg_cost, item.sector, item.asset_class, item.current, item.user_id))
     conn.commit()
-    conn.close()
 
+@app.post("/portfolio/", response_model=PortfolioItem)
+async def add_portfolio_item(item: PortfolioItem):
+    await run_db(_add_position, item)
     return item
 
-# Temporary for prototype only
-@app.delete("/portfolio/")
-def clear_portfolio(user_id: int):
-    conn = sqlite3.connect(DATABASE)
+def _replace_positions(conn, user_id, items):
+    # Swap the user's whole portfolio in one transaction so readers never see a partial save
+    with conn:
+        conn.execute("DELETE FROM portfolio WHERE user_id = ?", (user_id,))
+        conn.executemany("""
+            INSERT INTO portfolio (symbol, quantity, avg_cost, sector, asset_class, current, user_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(item.symbol, item.quantity, item.avg_cost, item.sector, item.asset_class, item.current, user_id) for item in items])
+
+@app.put("/portfolio/{user_id}")
+async def replace_portfolio(user_id: int, items: List[PortfolioPosition]):
+    await run_db(_replace_positions, user_id, items)
+    return {"message": "Portfolio replaced", "count": len(items)}
+
+def _append_positions(conn, user_id, items):
+    with conn:
+        conn.executemany("""
+            INSERT INTO portfolio (symbol, quantity, avg_cost, sector, asset_class, current, user_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(item.symbol, item.quantity, item.avg_cost, item.sector, item.asset_class, item.current, user_id) for item in items])
+
+@app.post("/portfolio/{user_id}/positions")
+async def append_positions(user_id: int, items: List[PortfolioPosition]):
+    # Bulk append for chunked CSV imports: one transaction per request
+    await run_db(_append_positions, user_id, items)
+    return {"message": "Positions added", "count": len(items)}
+
+def _clear_positions(conn, user_id):
     cursor = conn.cursor()
     cursor.execute("DELETE FROM portfolio WHERE user_id = ?", (user_id,))  # remove all rows
     conn.commit()
-    conn.close()
+
+# Temporary for prototype only
+@app.delete("/portfolio/")
+async def clear_portfolio(user_id: int):
+    await run_db(_clear_positions, user_id)
     return {"message": "Portfolio cleared"}
 
-@app.get("/portfolio/summary/")
-def get_portfolio_summary(user_id):
-    # print(user_id)
-    conn = sqlite3.connect(DATABASE)
+def _summary(conn, user_id):
     cursor = conn.cursor()
 
     # Calculate total cost per asset_class
@@ -94,238 +168,95 @@ def get_portfolio_summary(user_id):
     """, (user_id, user_id, user_id))
     
     rows = cursor.fetchall()
-    conn.close()
 
     # Return as a list of dicts
     return [{"asset_class": row[0], "pre_total_cost": row[1] ,"pre_asset_allocation": row[2],"cur_total_cost": row[3], "cur_asset_allocation": row[4]} for row in rows]
 
-@app.post("/portfolio/strat1/")
-def receive_changes1(changes: Dict[str, float]):
-    user_id = changes['user_id']
-    # You now have the dict from frontend
-    # Example: {"Equities": 1234.56, "Bonds": 789.01}
-    # print(changes)
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-
-    if user_id == 0:
-        cursor.execute("DELETE FROM strategy WHERE user_id = 0 AND strategy = 1")
-    cursor.execute("SELECT MAX(version) FROM strategy WHERE user_id = ? AND strategy = 1", (user_id,))
-    version = cursor.fetchone()
-    version = version[0]+1 if version and version[0] is not None else 0
-
-    for asset_class, change in changes.items():
-        if asset_class == 'user_id':
-            continue
-        cursor.execute("""SELECT symbol, quantity, avg_cost, sector, asset_class, current FROM portfolio 
-                       WHERE user_id = ? 
-                       AND asset_class = ?
-                       ORDER BY current/avg_cost DESC""", (user_id, asset_class))
-        rows = cursor.fetchall()
-        if change > 0:
-            cursor.execute("""
-                INSERT INTO strategy (user_id, ticker, quantity, action, asset_class, current, strategy, version)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                            """, (user_id, rows[-1][0], change/rows[-1][5], 'Buy', asset_class, rows[-1][5],1,version))
-        elif change < 0:
-            for row in rows:
-                if change+row[1]*row[5] > 0:
-                    cursor.execute("""
-                        INSERT INTO strategy (user_id, ticker, quantity, action, asset_class, current, strategy, version)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                                    """, (user_id, row[0], (-change)/row[5], 'Sell', asset_class, row[5],1,version))
-                    break
-                change+=row[1]*row[5]
-                cursor.execute("""
-                        INSERT INTO strategy (user_id, ticker, quantity, action, asset_class, current, strategy, version)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                                    """, (user_id, row[0], row[1], 'Sell', asset_class, row[5],1,version))
-    
-    
+@app.get("/portfolio/summary/")
+async def get_portfolio_summary(user_id):
+    return await run_db(_summary, user_id)
 
-    cursor.execute("SELECT ticker, quantity, action, asset_class, current FROM strategy WHERE user_id = ? AND strategy = 1 AND version = ?", (user_id,version))
-    cols = [col[0] for col in cursor.description]
-    strategy_rows = cursor.fetchall()
-    conn.commit()
-    conn.close()
-    return [dict(zip(cols, row)) for row in strategy_rows]
+@app.post("/portfolio/strat1/")
+async def receive_changes1(changes: Dict[str, float]):
+    # Example: {"Equities": 1234.56, "Bonds": -789.01, "user_id": 1}
+    return await run_strategy(1, changes)
 
 @app.post("/portfolio/strat2/")
-def receive_changes2(changes: Dict[str, float]):
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    user_id = changes['user_id']
-    
-    if user_id == 0:
-        cursor.execute("DELETE FROM strategy WHERE user_id = ? AND strategy = 2", (user_id,))
-    cursor.execute("SELECT MAX(version) FROM strategy WHERE user_id = ? AND strategy = 2", (user_id,))
-    version = cursor.fetchone()
-    version = version[0]+1 if version and version[0] is not None else 0
-    for asset_class, change in changes.items():
-        if asset_class == 'user_id':
-            continue
-        if change == 0:
-            continue
-        cursor.execute("SELECT SUM(quantity * current) FROM portfolio WHERE user_id = ? AND asset_class = ?", (user_id, asset_class))
-        total_cost = cursor.fetchone()[0]
-        print(asset_class, total_cost)
-        adjustment_percent = abs(change / total_cost)
-        cursor.execute("""SELECT symbol, quantity, current FROM portfolio 
-                       WHERE user_id = ? 
-                       AND asset_class = ?""", (user_id, asset_class))
-        rows = cursor.fetchall()
-        action = "Buy" if change > 0 else "Sell"
-        for row in rows:
-            cursor.execute("""
-                INSERT INTO strategy (user_id, ticker, quantity, action, asset_class, current, strategy, version)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                            """,(user_id, row[0], row[1] * adjustment_percent, action, asset_class, row[2], 2, version))
-
-    cursor.execute("SELECT ticker, quantity, action, asset_class, current FROM strategy WHERE user_id = ? AND version = ? AND strategy = 2", (user_id,version))
-    cols = [col[0] for col in cursor.description]
-    strategy_rows = cursor.fetchall()
-    conn.commit()
-    conn.close()
-    return [dict(zip(cols, row)) for row in strategy_rows]
+async def receive_changes2(changes: Dict[str, float]):
+    return await run_strategy(2, changes)
 
 @app.post("/portfolio/strat3/")
-def receive_changes3(changes: Dict[str, float]):
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-
-    user_id = changes['user_id']
-    
-    if user_id == 0:
-        cursor.execute("DELETE FROM strategy WHERE user_id = ? AND strategy = 3", (user_id,))
-    cursor.execute("SELECT MAX(version) FROM strategy WHERE user_id = ? AND strategy = 3", (user_id,))
-    version = cursor.fetchone()
-    version = version[0]+1 if version and version[0] is not None else 0
-
-    for asset_class, change in changes.items():
-        if asset_class == 'user_id':
-            continue
-        the_plan_in_strategy_3 = {}
-        cursor.execute("""SELECT symbol, quantity, current FROM portfolio 
-                       WHERE user_id = ? 
-                       AND asset_class = ?
-                       ORDER BY current/avg_cost DESC""", (user_id, asset_class))
-        rows = cursor.fetchall()
-        if change < 0:
-            for row in rows:
-                if change+row[1]*row[2]/2 > 0:
-                    the_plan_in_strategy_3[row[0]] = [-change/row[2], 'Sell', row[2]]
-                    change=0
-                    break
-                change+=row[1]*row[2]/2
-                the_plan_in_strategy_3[row[0]] = [row[1]/2, 'Sell', row[2]]
-
-        cursor.execute("SELECT SUM(quantity * current) FROM portfolio WHERE user_id = ? AND asset_class = ?", (user_id, asset_class))
-        if change != 0:
-            total_cost = cursor.fetchone()[0]
-            adjustment_percent = abs(change / total_cost)
-            print(asset_class, change, adjustment_percent)
-            for row in rows:
-                
-                if row[0] in the_plan_in_strategy_3:
-                    the_plan_in_strategy_3[row[0]][0] += (row[1]-the_plan_in_strategy_3[row[0]][0]) * adjustment_percent
-                    print(row[1]-the_plan_in_strategy_3[row[0]][0], '-')
-                else:
-                    the_plan_in_strategy_3[row[0]] = [row[1] * adjustment_percent, "Buy" if change > 0 else "Sell", row[2]]
-                    print(row[1])
-        
-        for key, value in the_plan_in_strategy_3.items():
-            cursor.execute("""INSERT INTO strategy (user_id, ticker, quantity, action, asset_class, current, strategy, version)
-                           VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                           """, (user_id, key, value[0], value[1], asset_class, value[2], 3, version))
-
-    cursor.execute("SELECT ticker, quantity, action, asset_class, current FROM strategy WHERE user_id = ? AND strategy = 3 AND version = ?", (user_id,version))
-    cols = [col[0] for col in cursor.description]
-    strategy_rows = cursor.fetchall()
-    conn.commit()
-    conn.close()
-    return [dict(zip(cols, row)) for row in strategy_rows]
-
-@app.get("/portfolio/extract/")
-def extract_existing_data(user_id):
-    conn = sqlite3.connect(DATABASE)
+async def receive_changes3(changes: Dict[str, float]):
+    return await run_strategy(3, changes)
+
+@app.post("/portfolio/strat4/")
+async def receive_changes4(changes: Dict[str, float], objective: str = "turnover", tolerance: float = DEFAULT_TOLERANCE):
+    # objective: "turnover" (fewest dollars traded) or "gain" (least realized gain)
+    # tolerance: allowed miss per asset class, in percentage points of portfolio value
+    if objective not in OBJECTIVES:
+        raise HTTPException(status_code=400, detail=f"Unknown objective: {objective}")
+    if tolerance < 0:
+        raise HTTPException(status_code=400, detail="tolerance must not be negative")
+    return await run_strategy(4, changes, objective=objective, tolerance=tolerance)
+
+def _extract(conn, user_id):
     cursor = conn.cursor()
     cursor.execute("SELECT symbol, quantity, avg_cost, sector, asset_class FROM portfolio WHERE user_id = ?", (user_id,))
     rows = cursor.fetchall()
-    conn.close()
     return [{'symbol': row[0], 'quantity': row[1], 'avg_cost': row[2], 'sector': row[3], 'asset_class': row[4]} for row in rows]
 
+@app.get("/portfolio/extract/")
+async def extract_existing_data(user_id):
+    return await run_db(_extract, user_id)
+
 @app.post("/portfolio/stratAI")
-def what_if_we_asked_ai(changes: Dict[str, float]):
-    user_id = changes['user_id']
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    cursor.execute(
-        """SELECT symbol, quantity, avg_cost, sector, asset_class, current FROM portfolio WHERE user_id = ?""",
-        (user_id,),
-    )
-    rows = cursor.fetchall()
-    conn.close()
-
-    portfolio_rows = [
-        {
-            "symbol": row[0],
-            "quantity": row[1],
-            "avg_cost": row[2],
-            "sector": row[3],
-            "asset_class": row[4],
-            "current": row[5],
-        }
-        for row in rows
-    ]
-
-    if not portfolio_rows:
-        return {"response": "No portfolio positions were found for this user."}
-
-    import pandas as pd
-
-    portfolio_df = pd.DataFrame(portfolio_rows)
-    portfolio_df["market_value"] = portfolio_df["quantity"] * portfolio_df["current"]
-
-    current_values = (
-        portfolio_df.groupby("asset_class")["market_value"].sum().to_dict()
-    )
-    desired_values = {}
-    for asset_class, current_value in current_values.items():
-        desired_values[asset_class] = current_value + float(changes.get(asset_class, 0))
-
-    for asset_class, change in changes.items():
-        if asset_class == "user_id" or change == 0:
-            continue
-        if asset_class not in desired_values:
-            desired_values[asset_class] = float(change)
-
-    total_desired_value = sum(desired_values.values())
-    if total_desired_value <= 0:
-        return {"response": "Unable to derive a target allocation from the supplied changes."}
-
-    desired_allocations = {
-        asset_class: round((value / total_desired_value) * 100.0, 2)
-        for asset_class, value in desired_values.items()
-    }
-
-    result = allocation_agent.run(
-        "Rebalance this portfolio to the desired allocation targets",
-        portfolio_df,
-        desired_allocations=desired_allocations,
-    )
-
-    if not result.get("trade_plan"):
-        return {"response": "No additional trades are required to reach the target allocation."}
-
-    lines = []
-    for trade in result["trade_plan"]:
-        ticker = trade.get("ticker") or trade.get("asset_class")
-        if trade.get("estimated_shares") is not None:
-            qty_text = f"{trade['estimated_shares']:.4f} shares"
-        else:
-            qty_text = "a new position"
-        lines.append(
-            f"{trade['action']} {qty_text} of {ticker} for about ${trade['amount_usd']:.2f}"
+async def what_if_we_asked_ai(changes: Dict[str, float]):
+    portfolio_df = await run_db(load_portfolio, changes['user_id'])
+    # A thread rather than the process pool: the plan is quick to compute, and
+    # shipping the portfolio to a worker cost more than it saved
+    return await asyncio.to_thread(ai_strategy, portfolio_df, changes, allocation_agent)
+
+@app.get("/portfolio/risk")
+async def get_portfolio_risk(user_id: int, window: int = WINDOW_DAYS, confidence: float = CONFIDENCE):
+    if not 2 <= window <= MAX_WINDOW_DAYS or not 0.5 <= confidence < 1:
+        raise HTTPException(
+            status_code=400, detail=f"window must be between 2 and {MAX_WINDOW_DAYS} and confidence in [0.5, 1)"
         )
-
-    return {"response": "Suggested trades:\n" + "\n".join(lines)}
\ No newline at end of file
+    portfolio_df = await run_db(load_portfolio, user_id)
+    # A thread rather than the process pool, so the covariance cache is shared with RiskAgent
+    metrics = await asyncio.to_thread(portfolio_risk, portfolio_df, window=window, confidence=confidence)
+    if metrics is None:
+        raise HTTPException(status_code=404, detail="Not enough price history for this portfolio")
+    return metrics
+
+@app.post("/portfolio/strategies")
+async def compute_strategies(request: StrategyRequest):
+    names = request.strategies or list(STRATEGY_NAMES)
+    unknown = [name for name in names if name not in STRATEGY_NAMES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown strategies: {', '.join(unknown)}")
+    return await run_strategies(request.changes, names, allocation_agent)
+
+@app.post("/advice/stream")
+async def stream_advice(request: AdviceRequest):
+    # Unsaved portfolios can be sent inline; otherwise use the user's saved positions
+    if request.positions is not None:
+        portfolio_df = pd.DataFrame([item.model_dump() for item in request.positions], columns=PORTFOLIO_COLUMNS)
+    else:
+        portfolio_df = await run_db(load_portfolio, request.user_id)
+    if portfolio_df.empty:
+        raise HTTPException(status_code=404, detail="No portfolio positions were found for this user.")
+
+    try:
+        supervisor = get_supervisor()
+    except RuntimeError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+
+    def events():
+        try:
+            for event in supervisor.stream(request.query, portfolio_df):
+                yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+        except Exception as exc:
+            yield f"event: error\ndata: {json.dumps({'type': 'error', 'message': str(exc)})}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
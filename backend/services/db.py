@@ -0,0 +1,78 @@
+import queue
+import sqlite3
+import threading
+
+
+DATABASE = "portfolio.db"
+
+# Connection tuning applied once when a pooled connection is opened. WAL lets
+# readers keep going while a writer commits, and NORMAL sync is safe under WAL.
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+
+def open_connection(database=DATABASE):
+    """Open a tuned SQLite connection that can be handed between worker threads."""
+    conn = sqlite3.connect(
+        database,
+        check_same_thread=False,
+        cached_statements=256,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """Keep a bounded set of long-lived SQLite connections for request handlers."""
+
+    def __init__(self, database=DATABASE, max_size=8):
+        self.database = database
+        self.max_size = max_size
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            opening = self._opened < self.max_size
+            if opening:
+                self._opened += 1
+
+        if not opening:
+            return self._idle.get()
+        try:
+            return open_connection(self.database)
+        except Exception:
+            # Give the slot back so a failed open doesn't shrink the pool for good
+            with self._lock:
+                self._opened -= 1
+            raise
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._opened -= 1
+
+
+pool = ConnectionPool()
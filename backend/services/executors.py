@@ -0,0 +1,72 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from backend.services.db import pool
+
+
+# One thread per pooled connection, so a database call never holds a thread
+# while it waits for a connection to free up.
+_db_executor = None
+
+# Strategy maths runs in worker processes so it can't hold the GIL the event
+# loop and the database threads need.
+CPU_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+_cpu_executor = None
+_cpu_lock = threading.Lock()
+_db_lock = threading.Lock()
+
+
+def _with_connection(fn, args, kwargs):
+    conn = pool.acquire()
+    try:
+        return fn(conn, *args, **kwargs)
+    finally:
+        pool.release(conn)
+
+
+def db_executor():
+    global _db_executor
+    with _db_lock:
+        if _db_executor is None:
+            _db_executor = ThreadPoolExecutor(max_workers=pool.max_size, thread_name_prefix="sqlite")
+        return _db_executor
+
+
+async def run_db(fn, *args, **kwargs):
+    """Run ``fn(conn, *args, **kwargs)`` with a pooled connection on the database executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor(), _with_connection, fn, args, kwargs)
+
+
+def cpu_executor():
+    global _cpu_executor
+    with _cpu_lock:
+        if _cpu_executor is None:
+            _cpu_executor = ProcessPoolExecutor(max_workers=CPU_WORKERS)
+        return _cpu_executor
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """Run a picklable ``fn`` in the worker process pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_executor(), partial(fn, *args, **kwargs))
+
+
+def shutdown_cpu_executor():
+    global _cpu_executor
+    with _cpu_lock:
+        executor, _cpu_executor = _cpu_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def shutdown_db_executor():
+    global _db_executor
+    with _db_lock:
+        executor, _db_executor = _db_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
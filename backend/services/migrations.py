@@ -0,0 +1,75 @@
+import sqlite3
+
+
+# Each entry moves the database from version N-1 to N. The applied version is
+# stored in SQLite's user_version header, so only newer migrations run.
+MIGRATIONS = [
+    (
+        1,
+        "Base schema",
+        [
+            """CREATE TABLE IF NOT EXISTS portfolio (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                symbol TEXT NOT NULL,
+                quantity INTEGER NOT NULL,
+                avg_cost REAL NOT NULL,
+                sector TEXT,
+                asset_class TEXT,
+                current REAL DEFAULT 0,
+                user_id INTEGER
+            )""",
+            """CREATE TABLE IF NOT EXISTS account (
+                id INTEGER PRIMARY KEY AUTOINCREMENT
+            )""",
+            """CREATE TABLE IF NOT EXISTS strategyAI (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                ticker TEXT NOT NULL,
+                quantity FLOAT NOT NULL,
+                action TEXT NOT NULL,
+                asset_class TEXT NOT NULL
+            )""",
+            """CREATE TABLE IF NOT EXISTS strategy (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                strategy INT NOT NULL,
+                version INT NOT NULL,
+                ticker TEXT NOT NULL,
+                quantity FLOAT NOT NULL,
+                action TEXT NOT NULL,
+                asset_class TEXT NOT NULL,
+                current FLOAT NOT NULL
+            )""",
+        ],
+    ),
+    (
+        2,
+        "Composite indexes for per-user portfolio and strategy lookups",
+        [
+            "CREATE INDEX IF NOT EXISTS idx_portfolio_user_asset_class ON portfolio (user_id, asset_class)",
+            "CREATE INDEX IF NOT EXISTS idx_strategy_user_strategy_version ON strategy (user_id, strategy, version)",
+            "ANALYZE",
+        ],
+    ),
+]
+
+
+def schema_version(conn: sqlite3.Connection):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection, target=None):
+    """Apply any migrations newer than the database's recorded schema version, up to ``target``."""
+    current = schema_version(conn)
+    for version, _description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        if target is not None and version > target:
+            break
+        with conn:
+            conn.execute("BEGIN")
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+        current = version
+    return current
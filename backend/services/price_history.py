@@ -0,0 +1,316 @@
+import json
+import os
+import re
+import threading
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+
+PRICE_HISTORY_DIR = "price_history"
+HISTORY_DAYS = 5 * 365
+# How often a ticker's open-ended history is asked for again
+RECHECK_SECONDS = 15 * 60
+
+_FILE_NAME = re.compile(r"[^A-Z0-9._-]")
+
+
+def _day(value):
+    return np.datetime64(value, "D")
+
+
+def _today():
+    return _day(date.today())
+
+
+class YahooHistoryProvider:
+    """Fetch adjusted daily closes for many tickers with one yfinance download."""
+
+    def fetch(self, symbols, start, end):
+        import yfinance as yf
+
+        data = yf.download(
+            symbols,
+            start=str(start),
+            end=str(end + np.timedelta64(1, "D")),
+            auto_adjust=True,
+            progress=False,
+            threads=True,
+        )
+        if data is None or data.empty:
+            return {}
+
+        closes = data["Close"]
+        if not hasattr(closes, "columns"):
+            closes = closes.to_frame(symbols[0])
+        dates = closes.index.to_numpy().astype("datetime64[D]")
+        history = {}
+        for symbol in closes.columns:
+            values = closes[symbol].to_numpy(dtype=float)
+            kept = ~np.isnan(values)
+            if kept.any():
+                history[str(symbol).upper()] = (dates[kept], values[kept])
+        return history
+
+
+class FileHistoryProvider:
+    """Serve daily closes from a local CSV with date, symbol and close columns, for offline use."""
+
+    def __init__(self, path):
+        frame = pd.read_csv(path, usecols=["date", "symbol", "close"])
+        frame["symbol"] = frame["symbol"].astype(str).str.strip().str.upper()
+        frame["date"] = pd.to_datetime(frame["date"]).to_numpy().astype("datetime64[D]")
+        frame = frame.dropna(subset=["close"]).sort_values(["symbol", "date"], kind="stable")
+        self.history = {
+            symbol: (group["date"].to_numpy().astype("datetime64[D]"), group["close"].to_numpy(dtype=float))
+            for symbol, group in frame.groupby("symbol", sort=False)
+        }
+
+    def fetch(self, symbols, start, end):
+        history = {}
+        for symbol in symbols:
+            if symbol not in self.history:
+                continue
+            dates, closes = self.history[symbol]
+            lo, hi = np.searchsorted(dates, [start, end + np.timedelta64(1, "D")])
+            if hi > lo:
+                history[symbol] = (dates[lo:hi], closes[lo:hi])
+        return history
+
+
+class PriceHistoryStore:
+    """Daily closes per ticker as a pair of memory-mapped ``.npy`` columns.
+
+    Each ticker keeps ``<SYMBOL>.dates.npy`` (``datetime64[D]``, ascending) and
+    ``<SYMBOL>.close.npy`` under ``path``. ``refresh`` asks the provider for
+    the newest stored day onwards, so a partial intraday bar is replaced by
+    the final close. ``checked.json`` records each ticker's last final bar,
+    the last day returned before the day it was fetched, so past ranges aren't
+    fetched again; ranges reaching today are re-checked at most every
+    ``recheck_seconds``. With ``path=None`` everything stays in memory.
+
+    The mappings never leave the store: reads return copies of the rows asked
+    for, so a refresh can replace the files even on Windows, which refuses to
+    replace a mapped file.
+    """
+
+    def __init__(self, provider, path=PRICE_HISTORY_DIR, history_days=HISTORY_DAYS, recheck_seconds=RECHECK_SECONDS):
+        self.provider = provider
+        self.path = path
+        self.history_days = history_days
+        self.recheck_seconds = recheck_seconds
+        self._columns = {}
+        self._checked = {}
+        self._recent = {}
+        self._fetching = {}
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(path, exist_ok=True)
+            checked_path = os.path.join(path, "checked.json")
+            if os.path.exists(checked_path):
+                with open(checked_path, "r") as f:
+                    self._checked = {symbol: _day(day) for symbol, day in json.load(f).items()}
+
+    def _file(self, symbol, column):
+        return os.path.join(self.path, f"{_FILE_NAME.sub('_', symbol)}.{column}.npy")
+
+    def _load(self, symbol):
+        if symbol not in self._columns and self.path and os.path.exists(self._file(symbol, "close")):
+            self._columns[symbol] = (
+                np.load(self._file(symbol, "dates"), mmap_mode="r"),
+                np.load(self._file(symbol, "close"), mmap_mode="r"),
+            )
+        return self._columns.get(symbol)
+
+    def _newest(self, symbol):
+        stored = self._load(symbol)
+        return stored[0][-1] if stored is not None and len(stored[0]) else None
+
+    def _write(self, symbol, dates, closes):
+        # Unmap the old files first; Windows can't replace a mapped file, so
+        # callers must not hold arrays or views from _load either
+        self._columns.pop(symbol, None)
+        if self.path:
+            for column, values in (("dates", dates), ("close", closes)):
+                final = self._file(symbol, column)
+                temporary = final + ".tmp.npy"
+                np.save(temporary, values)
+                os.replace(temporary, final)
+            self._load(symbol)
+        else:
+            self._columns[symbol] = (dates, closes)
+
+    def _save_checked(self):
+        if self.path:
+            temporary = os.path.join(self.path, "checked.json.tmp")
+            with open(temporary, "w") as f:
+                json.dump({symbol: str(day) for symbol, day in self._checked.items()}, f)
+            os.replace(temporary, os.path.join(self.path, "checked.json"))
+
+    def _merge(self, symbol, dates, closes, today):
+        """Store fetched bars for one ticker; returns the number of new bars."""
+        added = len(dates)
+        stored = self._load(symbol)
+        if stored is not None:
+            stored = (np.array(stored[0]), np.array(stored[1]))
+        if stored is not None and len(stored[0]):
+            # The newest stored bar may have been partial; the fetched one wins
+            kept = dates >= stored[0][-1]
+            dates, closes = dates[kept], closes[kept]
+            if not len(dates):
+                return 0
+            added = int((dates > stored[0][-1]).sum())
+            if not (len(dates) == 1 and dates[0] == stored[0][-1] and closes[0] == stored[1][-1]):
+                older = stored[0] < dates[0]
+                self._write(
+                    symbol,
+                    np.concatenate([stored[0][older], dates]),
+                    np.concatenate([stored[1][older], closes]),
+                )
+        elif len(dates):
+            self._write(symbol, dates, closes)
+
+        # A bar is final once it was fetched on a later day
+        final = dates[dates < today]
+        if len(final) and (symbol not in self._checked or final[-1] > self._checked[symbol]):
+            self._checked[symbol] = final[-1]
+        return added
+
+    def refresh(self, symbols, end=None):
+        """Fetch the days missing through ``end`` (default today), one provider call per start date.
+
+        Returns the number of new bars stored. The provider is called outside
+        the store lock, so reads aren't held up by the network; a ticker being
+        fetched by another caller isn't fetched again, but waited for, so
+        reads after ``refresh`` returns see its bars. Provider failures leave
+        the stored history as it was.
+        """
+        today = _today()
+        end = _day(end or today)
+        default_start = end - np.timedelta64(self.history_days, "D")
+        symbols = list(dict.fromkeys(str(symbol).strip().upper() for symbol in symbols))
+
+        with self._lock:
+            now = time.monotonic()
+            starts, waits = {}, set()
+            for symbol in symbols:
+                checked = self._checked.get(symbol)
+                if checked is not None and checked >= end:
+                    continue
+                fetching = self._fetching.get(symbol)
+                if fetching is not None and fetching[0] >= end:
+                    waits.add(fetching[1])
+                    continue
+                recent = self._recent.get(symbol)
+                if recent is not None and recent[1] >= end and now - recent[0] < self.recheck_seconds:
+                    continue
+                newest = self._newest(symbol)
+                start = newest if newest is not None else default_start
+                starts.setdefault(start, []).append(symbol)
+                self._recent[symbol] = (now, end)
+            batches = []
+            for start, batch in starts.items():
+                fetching = (end, threading.Event())
+                self._fetching.update(dict.fromkeys(batch, fetching))
+                batches.append((start, batch, fetching))
+
+        added = 0
+        for start, batch, fetching in batches:
+            try:
+                added += self._fetch(batch, start, end, today, now)
+            finally:
+                with self._lock:
+                    for symbol in batch:
+                        if self._fetching.get(symbol) is fetching:
+                            del self._fetching[symbol]
+                fetching[1].set()
+
+        for done in waits:
+            done.wait()
+        return added
+
+    def _fetch(self, batch, start, end, today, now):
+        """One provider call for ``batch``, merged under the lock; returns the number of new bars."""
+        try:
+            fetched = self.provider.fetch(batch, start, end)
+        except Exception:
+            with self._lock:
+                for symbol in batch:
+                    if self._recent.get(symbol) == (now, end):
+                        del self._recent[symbol]
+            return 0
+
+        added = 0
+        with self._lock:
+            checked = dict(self._checked)
+            for symbol in batch:
+                if symbol in fetched:
+                    added += self._merge(
+                        symbol,
+                        np.asarray(fetched[symbol][0], dtype="datetime64[D]"),
+                        np.asarray(fetched[symbol][1], dtype=float),
+                        today,
+                    )
+            if self._checked != checked:
+                self._save_checked()
+        return added
+
+    def history(self, symbol, start=None, end=None):
+        """Copies of the stored ``(dates, closes)`` for one ticker between ``start`` and ``end``, or empty arrays."""
+        with self._lock:
+            stored = self._load(str(symbol).strip().upper())
+            if stored is None:
+                return np.array([], dtype="datetime64[D]"), np.array([], dtype=float)
+            dates, closes = stored
+            lo = np.searchsorted(dates, _day(start)) if start is not None else 0
+            hi = np.searchsorted(dates, _day(end), side="right") if end is not None else len(dates)
+            return np.array(dates[lo:hi]), np.array(closes[lo:hi])
+
+    def matrix(self, symbols, start=None, end=None, refresh=False):
+        """Closes for ``symbols`` aligned on the union of their trading days.
+
+        Returns a DataFrame indexed by date with one column per requested
+        symbol. Gaps after a ticker's first bar are forward-filled; days before
+        it, and tickers with no history, are NaN.
+        """
+        symbols = [str(symbol).strip().upper() for symbol in symbols]
+        if refresh:
+            self.refresh(symbols, end=end)
+
+        columns = [self.history(symbol, start=start, end=end) for symbol in symbols]
+
+        nonempty = [dates for dates, _ in columns if len(dates)]
+        index = np.unique(np.concatenate(nonempty)) if nonempty else np.array([], dtype="datetime64[D]")
+        values = np.full((len(index), len(symbols)), np.nan)
+        for column, (dates, closes) in enumerate(columns):
+            if len(dates):
+                # Each day takes the latest bar on or before it
+                position = np.searchsorted(dates, index, side="right") - 1
+                known = position >= 0
+                values[known, column] = closes[position[known]]
+
+        return pd.DataFrame(values, index=pd.DatetimeIndex(index, name="date"), columns=symbols)
+
+
+_store = None
+_lock = threading.Lock()
+
+
+def set_price_history_store(store):
+    """Swap the store, e.g. for one backed by a fixture provider; returns the previous one."""
+    global _store
+    with _lock:
+        previous, _store = _store, store
+        return previous
+
+
+def price_history_store():
+    global _store
+    with _lock:
+        if _store is None:
+            fixture = os.getenv("PRICE_HISTORY_FIXTURE_FILE", "").strip()
+            provider = FileHistoryProvider(fixture) if fixture else YahooHistoryProvider()
+            _store = PriceHistoryStore(provider, path=os.getenv("PRICE_HISTORY_DIR", PRICE_HISTORY_DIR))
+        return _store
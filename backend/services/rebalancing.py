@@ -0,0 +1,451 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+
+from backend.services.executors import run_cpu, run_db
+
+
+PORTFOLIO_COLUMNS = ["symbol", "quantity", "avg_cost", "sector", "asset_class", "current"]
+PLAN_COLUMNS = ["ticker", "quantity", "action", "asset_class", "current"]
+
+
+def load_portfolio(conn, user_id):
+    """Read a user's positions once, in the order they were saved."""
+    rows = conn.execute(
+        "SELECT symbol, quantity, avg_cost, sector, asset_class, current FROM portfolio WHERE user_id = ? ORDER BY id",
+        (user_id,),
+    ).fetchall()
+    return pd.DataFrame(rows, columns=PORTFOLIO_COLUMNS)
+
+
+def _class_changes(changes):
+    return {asset_class: float(change) for asset_class, change in changes.items() if asset_class != "user_id"}
+
+
+def _positions(portfolio_df, changes, by_gain=False):
+    """Positions in the requested asset classes, grouped in request order.
+
+    With ``by_gain`` each class is ordered by current/avg_cost descending, with
+    undefined ratios last, matching the ORDER BY the SQL loops used.
+    """
+    order = {asset_class: index for index, asset_class in enumerate(changes)}
+    working = portfolio_df[portfolio_df["asset_class"].isin(order)].copy()
+    working["class_order"] = working["asset_class"].map(order)
+    working["change"] = working["asset_class"].map(changes).astype(float)
+    working["quantity"] = working["quantity"].astype(float)
+    working["current"] = working["current"].astype(float)
+    working["value"] = working["quantity"] * working["current"]
+
+    if by_gain:
+        working["gain"] = working["current"] / working["avg_cost"].astype(float).replace(0, np.nan)
+        return working.sort_values(
+            ["class_order", "gain"], ascending=[True, False], kind="stable", na_position="last"
+        )
+    return working.sort_values("class_order", kind="stable")
+
+
+def _running_totals(working, values):
+    """Inclusive and exclusive running sums of ``values`` within each asset class."""
+    cumulative = pd.Series(values).groupby(working["class_order"].to_numpy()).cumsum().to_numpy()
+    before = np.zeros_like(cumulative)
+    before[1:] = cumulative[:-1]
+    before[_class_starts(working)] = 0.0
+    return cumulative, before
+
+
+def _class_totals(working, values):
+    return pd.Series(values).groupby(working["class_order"].to_numpy()).transform("sum").to_numpy()
+
+
+def _class_starts(working):
+    return ~working["class_order"].duplicated(keep="first").to_numpy()
+
+
+def _class_ends(working):
+    return ~working["class_order"].duplicated(keep="last").to_numpy()
+
+
+def _plan(working, mask, quantity, action):
+    selected = working[mask]
+    return pd.DataFrame(
+        {
+            "ticker": selected["symbol"].to_numpy(),
+            "quantity": np.asarray(quantity, dtype=float)[mask],
+            "action": np.asarray(action, dtype=object)[mask],
+            "asset_class": selected["asset_class"].to_numpy(),
+            "current": selected["current"].to_numpy(dtype=float),
+        },
+        columns=PLAN_COLUMNS,
+    )
+
+
+def strategy_1(portfolio_df, changes):
+    """Buy the lowest-gain holding; sell highest-gain holdings until the change is met."""
+    working = _positions(portfolio_df, _class_changes(changes), by_gain=True)
+    change = working["change"].to_numpy()
+    quantity = working["quantity"].to_numpy()
+    price = working["current"].to_numpy()
+    need = -change
+    cumulative, before = _running_totals(working, working["value"].to_numpy())
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        buys = (change > 0) & _class_ends(working)
+        sells = (change < 0) & (before <= need)
+        shares = np.where(
+            buys,
+            change / price,
+            np.where(cumulative <= need, quantity, (need - before) / price),
+        )
+
+    return _plan(working, buys | sells, shares, np.where(buys, "Buy", "Sell"))
+
+
+def strategy_2(portfolio_df, changes):
+    """Scale every holding in a class by the same fraction of the class value."""
+    working = _positions(portfolio_df, _class_changes(changes))
+    working = working[working["change"] != 0]
+    change = working["change"].to_numpy()
+    class_value = _class_totals(working, working["value"].to_numpy())
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shares = working["quantity"].to_numpy() * np.abs(change / class_value)
+
+    return _plan(working, np.ones(len(working), dtype=bool), shares, np.where(change > 0, "Buy", "Sell"))
+
+
+def strategy_3(portfolio_df, changes):
+    """Sell up to half of the highest-gain holdings first, then fall back to strategy 2."""
+    working = _positions(portfolio_df, _class_changes(changes), by_gain=True)
+    change = working["change"].to_numpy()
+    quantity = working["quantity"].to_numpy()
+    price = working["current"].to_numpy()
+    need = -change
+
+    values = working["value"].to_numpy()
+    cumulative, before = _running_totals(working, values / 2)
+    half_total = _class_totals(working, values / 2)
+    class_value = _class_totals(working, values)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Halving positions covers the sale unless every holding was halved first
+        half_sold = (change < 0) & (before <= need)
+        half_shares = np.where(cumulative <= need, quantity / 2, (need - before) / price)
+        residual = np.where(change > 0, change, np.where((change < 0) & (half_total < need), half_total - need, 0.0))
+        adjustment = np.abs(residual / class_value)
+        shares = np.where(
+            half_sold,
+            half_shares + np.where(residual != 0, (quantity - half_shares) * adjustment, 0.0),
+            quantity * adjustment,
+        )
+
+    action = np.where(half_sold | (residual < 0), "Sell", "Buy")
+    return _plan(working, half_sold | (residual != 0), shares, action)
+
+
+OBJECTIVES = ("turnover", "gain")
+# Half-width of the band around each target, in percentage points of portfolio value
+DEFAULT_TOLERANCE = 0.5
+
+
+def _take_shares(price, quantity, shares, sold, target, high):
+    """Add whole shares in order until ``sold`` reaches ``target`` without passing ``high``.
+
+    Positions before the crossing point are taken whole (including any
+    fractional remainder); from there shares are added one position at a time.
+    ``shares`` is updated in place and the new total is returned.
+    """
+    if sold >= target or not len(price):
+        return sold
+    room = (quantity - shares) * price
+    cumulative = sold + np.cumsum(room)
+    crossing = int(np.searchsorted(cumulative, target))
+    shares[:crossing] = quantity[:crossing]
+    if crossing:
+        sold = float(cumulative[crossing - 1])
+
+    for index in range(crossing, len(price)):
+        left = quantity[index] - shares[index]
+        count = min(left, np.ceil((target - sold) / price[index]))
+        if sold + count * price[index] > high:
+            count = min(left, np.floor((high - sold) / price[index]))
+        shares[index] += count
+        sold += count * price[index]
+        if sold >= target:
+            break
+    return sold
+
+
+def _add_nearest_share(shares, price, left, total, change):
+    """Add the one share that brings ``total`` nearest ``change``, if that is nearer than adding none.
+
+    Called when whole shares can't reach the band: every further share then
+    passes its far edge, so one share (or the rest of a fractional position,
+    up to ``left``) is the only candidate worth checking. ``shares`` is
+    updated in place.
+    """
+    count = np.minimum(left, 1.0)
+    candidates = np.flatnonzero(count * price > 0)
+    if not len(candidates):
+        return
+    best = candidates[np.argmin(np.abs(total + count[candidates] * price[candidates] - change))]
+    if abs(total + count[best] * price[best] - change) < abs(total - change):
+        shares[best] += count[best]
+
+
+def _sell_shares(price, quantity, gain_rate, low, high, harvest, change):
+    """Whole shares to sell so proceeds land in [low, high] with the least realized gain.
+
+    Selling ``x`` dollars of a position realizes ``gain_rate * x``, so with a
+    single band on total proceeds the LP optimum takes positions in ascending
+    gain rate: losses up to ``high`` when ``harvest`` is set, then the smallest
+    gains until ``low`` is covered. If whole shares can't reach the band, the
+    proceeds nearest ``change`` are used instead.
+    """
+    order = np.argsort(gain_rate, kind="stable")
+    price, quantity = price[order], quantity[order]
+    shares = np.zeros(len(order))
+    sold = 0.0
+    if harvest:
+        losses = int(np.searchsorted(gain_rate[order], 0.0))
+        sold = _take_shares(price[:losses], quantity[:losses], shares[:losses], sold, high, high)
+    sold = _take_shares(price, quantity, shares, sold, low, high)
+    if sold < low:
+        _add_nearest_share(shares, price, quantity - shares, sold, change)
+
+    result = np.zeros(len(order))
+    result[order] = shares
+    return result
+
+
+def _buy_shares(price, value, target, low, high, change):
+    """Whole shares to buy for about ``target`` dollars, split by current value.
+
+    If whole shares can't reach ``low`` without passing ``high``, the spend
+    nearest ``change`` is used instead.
+    """
+    weights = value / value.sum() if value.sum() > 0 else np.full(len(value), 1 / len(value))
+    exact = target * weights / price
+    shares = np.floor(exact)
+    spent = float(shares @ price)
+    for index in np.argsort(shares - exact, kind="stable"):
+        if spent >= target:
+            break
+        if spent + price[index] <= high:
+            shares[index] += 1
+            spent += price[index]
+    if spent < low:
+        _add_nearest_share(shares, price, np.ones(len(price)), spent, change)
+    return shares
+
+
+def _band(portfolio_df, class_changes, tolerance):
+    """Half-width of each class's band in dollars: ``tolerance`` points of the target portfolio value."""
+    portfolio_value = float((portfolio_df["quantity"].astype(float) * portfolio_df["current"].astype(float)).sum())
+    target_total = portfolio_value + sum(class_changes.values())
+    return max(tolerance, 0.0) / 100 * max(target_total, 0.0)
+
+
+def strategy_4(portfolio_df, changes, objective="turnover", tolerance=DEFAULT_TOLERANCE):
+    """Fewest dollars traded, or least realized gain, that aims to land each class within its band.
+
+    Each class should end within ``tolerance`` percentage points of portfolio
+    value of its target. ``turnover`` trades only to the near edge of the band;
+    ``gain`` aims buys at the exact change and also sells losing positions up
+    to the far edge. Either way sells come from the lowest gain per dollar
+    first, using ``avg_cost`` as the cost basis, and all trades are in whole
+    shares unless a whole position is sold. When whole shares can't land a
+    class in its band, it gets the share count nearest its change instead;
+    ``class_bands`` reports which classes missed.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective {objective!r}; expected one of {', '.join(OBJECTIVES)}")
+
+    class_changes = _class_changes(changes)
+    working = _positions(portfolio_df, class_changes)
+    working = working[working["current"] > 0]
+    band = _band(portfolio_df, class_changes, tolerance)
+
+    shares = np.zeros(len(working))
+    class_order = working["class_order"].to_numpy()
+    price = working["current"].to_numpy()
+    quantity = working["quantity"].to_numpy()
+    value = working["value"].to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gain_rate = np.nan_to_num((price - working["avg_cost"].to_numpy(dtype=float)) / price, nan=1.0)
+
+    starts = np.flatnonzero(_class_starts(working))
+    for start, end in zip(starts, np.append(starts[1:], len(working))):
+        change = float(working["change"].iat[start])
+        low, high = max(abs(change) - band, 0.0), abs(change) + band
+        if change < 0:
+            harvest = objective == "gain"
+            if low > 0 or harvest:
+                shares[start:end] = _sell_shares(
+                    price[start:end], quantity[start:end], gain_rate[start:end], low, high, harvest, -change
+                )
+        elif change > 0 and low > 0:
+            target = low if objective == "turnover" else change
+            shares[start:end] = _buy_shares(price[start:end], value[start:end], target, low, high, change)
+
+    change = working["change"].to_numpy()
+    return _plan(working, shares > 0, shares, np.where(change > 0, "Buy", "Sell"))
+
+
+def class_bands(portfolio_df, changes, plan, tolerance=DEFAULT_TOLERANCE):
+    """How far a plan's trades in each requested class end from its change, and whether that is within the band.
+
+    ``traded`` is the plan's net buys minus sells in dollars and ``residual``
+    is ``traded - change``; a class is ``in_band`` when the residual is no
+    more than ``tolerance`` points of the target portfolio value.
+    """
+    class_changes = _class_changes(changes)
+    band = _band(portfolio_df, class_changes, tolerance)
+    signed = np.where(plan["action"] == "Buy", 1.0, -1.0) * plan["quantity"].astype(float) * plan["current"].astype(float)
+    traded = pd.Series(signed).groupby(plan["asset_class"].to_numpy()).sum().to_dict()
+
+    report = []
+    for asset_class, change in class_changes.items():
+        residual = traded.get(asset_class, 0.0) - change
+        report.append(
+            {
+                "asset_class": asset_class,
+                "change": round(change, 2),
+                "traded": round(traded.get(asset_class, 0.0), 2),
+                "residual": round(residual, 2),
+                # Slack for float sums that land exactly on an edge
+                "in_band": bool(abs(residual) <= band + 1e-6),
+            }
+        )
+    return report
+
+
+def ai_strategy(portfolio_df, changes, allocation_agent):
+    """Describe the AllocationAgent's trades toward the allocation implied by ``changes``."""
+    if portfolio_df.empty:
+        return {"response": "No portfolio positions were found for this user."}
+
+    portfolio_df = portfolio_df.copy()
+    portfolio_df["market_value"] = portfolio_df["quantity"] * portfolio_df["current"]
+
+    current_values = (
+        portfolio_df.groupby("asset_class")["market_value"].sum().to_dict()
+    )
+    desired_values = {}
+    for asset_class, current_value in current_values.items():
+        desired_values[asset_class] = current_value + float(changes.get(asset_class, 0))
+
+    for asset_class, change in changes.items():
+        if asset_class == "user_id" or change == 0:
+            continue
+        if asset_class not in desired_values:
+            desired_values[asset_class] = float(change)
+
+    total_desired_value = sum(desired_values.values())
+    if total_desired_value <= 0:
+        return {"response": "Unable to derive a target allocation from the supplied changes."}
+
+    desired_allocations = {
+        asset_class: round((value / total_desired_value) * 100.0, 2)
+        for asset_class, value in desired_values.items()
+    }
+
+    result = allocation_agent.run(
+        "Rebalance this portfolio to the desired allocation targets",
+        portfolio_df,
+        desired_allocations=desired_allocations,
+    )
+
+    if not result.get("trade_plan"):
+        return {"response": "No additional trades are required to reach the target allocation."}
+
+    lines = []
+    for trade in result["trade_plan"]:
+        ticker = trade.get("ticker") or trade.get("asset_class")
+        if trade.get("estimated_shares") is not None:
+            qty_text = f"{trade['estimated_shares']:.4f} shares"
+        else:
+            qty_text = "a new position"
+        lines.append(
+            f"{trade['action']} {qty_text} of {ticker} for about ${trade['amount_usd']:.2f}"
+        )
+
+    return {"response": "Suggested trades:\n" + "\n".join(lines)}
+
+
+STRATEGIES = {
+    1: strategy_1,
+    2: strategy_2,
+    3: strategy_3,
+    4: strategy_4,
+}
+
+# Names accepted by the combined endpoint, in the order results are returned
+STRATEGY_NAMES = ("1", "2", "3", "4", "ai")
+
+
+def save_strategy(conn, user_id, strategy, plan):
+    """Store a plan as the next version of a user's strategy and return its rows."""
+    with conn:
+        if user_id == 0:
+            conn.execute("DELETE FROM strategy WHERE user_id = 0 AND strategy = ?", (strategy,))
+        version = conn.execute(
+            "SELECT MAX(version) FROM strategy WHERE user_id = ? AND strategy = ?", (user_id, strategy)
+        ).fetchone()
+        version = version[0] + 1 if version and version[0] is not None else 0
+        conn.executemany(
+            """
+            INSERT INTO strategy (user_id, ticker, quantity, action, asset_class, current, strategy, version)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (user_id, ticker, float(quantity), action, asset_class, float(current), strategy, version)
+                for ticker, quantity, action, asset_class, current in plan.itertuples(index=False, name=None)
+            ],
+        )
+    return plan.to_dict(orient="records")
+
+
+def _strategy_result(strategy, trades, portfolio_df, changes, plan, tolerance=DEFAULT_TOLERANCE):
+    """The saved trades, plus each class's band check for strategy 4."""
+    if strategy != 4:
+        return trades
+    return {"trades": trades, "classes": class_bands(portfolio_df, changes, plan, tolerance)}
+
+
+async def run_strategy(strategy, changes, **options):
+    """Compute and persist one rule-based strategy for the user named in ``changes``."""
+    user_id = changes["user_id"]
+    portfolio_df = await run_db(load_portfolio, user_id)
+    plan = await run_cpu(STRATEGIES[strategy], portfolio_df, changes, **options)
+    trades = await run_db(save_strategy, user_id, strategy, plan)
+    return _strategy_result(strategy, trades, portfolio_df, changes, plan, options.get("tolerance", DEFAULT_TOLERANCE))
+
+
+def _save_strategies(conn, user_id, plans):
+    return {name: save_strategy(conn, user_id, int(name), plan) for name, plan in plans.items()}
+
+
+async def run_strategies(changes, names, allocation_agent):
+    """Compute several strategies concurrently over one portfolio snapshot.
+
+    Rule-based plans are computed in the worker processes and the AI plan on a
+    thread, then the rule-based ones are saved together on one pooled connection.
+    """
+    user_id = changes["user_id"]
+    portfolio_df = await run_db(load_portfolio, user_id)
+
+    jobs = []
+    for name in names:
+        if name == "ai":
+            jobs.append(asyncio.to_thread(ai_strategy, portfolio_df, changes, allocation_agent))
+        else:
+            jobs.append(run_cpu(STRATEGIES[int(name)], portfolio_df, changes))
+    results = dict(zip(names, await asyncio.gather(*jobs)))
+
+    plans = {name: results[name] for name in names if name != "ai"}
+    saved = await run_db(_save_strategies, user_id, plans)
+    results.update(
+        {name: _strategy_result(int(name), trades, portfolio_df, changes, plans[name]) for name, trades in saved.items()}
+    )
+    return results
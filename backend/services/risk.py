@@ -0,0 +1,293 @@
+import threading
+from collections import OrderedDict
+from datetime import date
+from statistics import NormalDist
+
+import numpy as np
+
+from backend.services.price_history import price_history_store
+
+
+WINDOW_DAYS = 252
+# About the five years of history the price store keeps
+MAX_WINDOW_DAYS = 5 * WINDOW_DAYS
+BENCHMARK = "SPY"
+CONFIDENCE = 0.95
+MIN_HISTORY_DAYS = 20
+CLUSTER_CORRELATION = 0.7
+COVARIANCE_CACHE_SIZE = 8
+# One 5,000-ticker covariance matrix is 200 MB
+COVARIANCE_CACHE_BYTES = 512 * 1024 * 1024
+TOP_CONTRIBUTORS = 10
+TOP_CLUSTERS = 5
+
+# Extra calendar days read before a window so forward-filled prices exist at its start
+_PADDING_DAYS = 14
+
+
+def _daily_returns(store, tickers, start, end):
+    """Dates, daily returns and a has-data mask for ``tickers`` between ``start`` and ``end``."""
+    closes = store.matrix(tickers, start=start, end=end, refresh=True)
+    prices = closes.to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = prices[1:] / prices[:-1] - 1
+    known = np.isfinite(returns)
+    dates = closes.index.to_numpy().astype("datetime64[D]")[1:]
+    return dates, np.where(known, returns, 0.0), known.any(axis=0)
+
+
+class _Window:
+    """The last ``window`` daily returns for a ticker set, with their column sums and covariance.
+
+    Only the covariance is kept as an n×n matrix; a slide turns it back into
+    the sum of outer products, applies the new and dropped days and turns it
+    into a covariance again.
+    """
+
+    def __init__(self, dates, returns, known, end):
+        self.dates = dates
+        self.returns = returns
+        self.known = known
+        self.end = end
+        self.sums = returns.sum(axis=0)
+        self.updates = 0
+        self.covariance = self._covariance(returns.T @ returns)
+
+    @property
+    def nbytes(self):
+        return self.covariance.nbytes + self.returns.nbytes + self.dates.nbytes + self.known.nbytes
+
+    def _covariance(self, cross):
+        """The sample covariance from ``cross``, the sum of outer products, computed in place."""
+        count = len(self.returns)
+        if count < 2:
+            return np.zeros_like(cross)
+        cross -= np.outer(self.sums / count, self.sums)
+        cross /= count - 1
+        return cross
+
+    def _cross(self):
+        """The sum of outer products, recovered from the covariance into a new matrix."""
+        count = len(self.returns)
+        if count < 2:
+            return self.returns.T @ self.returns
+        cross = self.covariance * (count - 1)
+        cross += np.outer(self.sums / count, self.sums)
+        return cross
+
+    def slide(self, dates, returns, known, end, window):
+        """Append new days and drop the oldest, updating the sums instead of recomputing them."""
+        dropped = self.returns[: max(len(self.returns) + len(returns) - window, 0)]
+        # A new matrix, so callers still holding the old covariance aren't affected
+        cross = self._cross()
+        # Adding the new days' outer products and removing the dropped ones is one product
+        cross += np.concatenate([returns, -dropped]).T @ np.concatenate([returns, dropped])
+        self.sums += returns.sum(axis=0) - dropped.sum(axis=0)
+        self.returns = np.concatenate([self.returns[len(dropped):], returns])
+        self.dates = np.concatenate([self.dates[len(dropped):], dates])
+        self.known = self.known | known
+        self.end = end
+        self.updates += 1
+        self.covariance = self._covariance(cross)
+
+
+class CovarianceCache:
+    """Covariance matrices per ticker set and window, slid forward as new days arrive.
+
+    A repeat request for the same end date is a lookup. A later end date only
+    reads the days since the cached window ended and applies them, and the
+    days falling out, as updates to the running sums and cross-products.
+    Every ``window`` updates the window is rebuilt from scratch so rounding
+    can't build up. Each entry holds one n×n float64 covariance, 8·n² bytes,
+    so the cache keeps at most ``max_entries`` entries and ``max_bytes`` in
+    total, evicting the least recently used; the newest entry is always kept.
+    """
+
+    def __init__(self, max_entries=COVARIANCE_CACHE_SIZE, max_bytes=COVARIANCE_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "updates": 0, "builds": 0}
+
+    def _build(self, store, tickers, window, end):
+        start = end - np.timedelta64(window * 7 // 5 + _PADDING_DAYS, "D")
+        dates, returns, known = _daily_returns(store, tickers, start, end)
+        return _Window(dates[-window:], returns[-window:], known, end)
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        total = sum(cached.nbytes for cached in self._entries.values())
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or total > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            total -= evicted.nbytes
+        return entry.returns, entry.covariance, entry.known
+
+    def get(self, store, tickers, window=WINDOW_DAYS, end=None):
+        """Daily returns, covariance and has-data mask for ``tickers`` over the window ending at ``end``.
+
+        Prices are read, and new windows built, outside the cache lock, so a
+        slow price refresh for one ticker set doesn't hold up the others. If
+        another caller moved the entry on meanwhile, the lookup starts over.
+        """
+        end = np.datetime64(end or date.today(), "D")
+        key = (tuple(tickers), window)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry.end == end:
+                    self.stats["hits"] += 1
+                    return self._store(key, entry)
+                updatable = entry is not None and entry.end < end and len(entry.dates) and entry.updates < window
+                planned_end = entry.end if entry is not None else None
+
+            if not updatable:
+                built = self._build(store, list(tickers), window, end)
+                with self._lock:
+                    self.stats["builds"] += 1
+                    return self._store(key, built)
+
+            last = entry.dates[-1]
+            dates, returns, known = _daily_returns(store, list(tickers), last - np.timedelta64(_PADDING_DAYS, "D"), end)
+            new = dates > last
+            if new.sum() >= window:
+                built = self._build(store, list(tickers), window, end)
+                with self._lock:
+                    self.stats["builds"] += 1
+                    return self._store(key, built)
+
+            with self._lock:
+                if self._entries.get(key) is not entry or entry.end != planned_end:
+                    continue
+                entry.slide(dates[new], returns[new], known, end, window)
+                self.stats["updates"] += 1
+                return self._store(key, entry)
+
+
+_covariances = CovarianceCache()
+
+
+def _correlation_clusters(correlation, symbols, weights, threshold):
+    """Greedy clusters: the heaviest unassigned holding plus every unassigned one correlated above ``threshold``.
+
+    Columns with zero weight are never assigned.
+    """
+    unassigned = weights > 0
+    clusters = []
+    for seed in np.argsort(-weights, kind="stable")[: int(unassigned.sum())]:
+        if not unassigned[seed]:
+            continue
+        members = np.flatnonzero(unassigned & (correlation[seed] >= threshold))
+        unassigned[members] = False
+        if len(members) > 1:
+            members = members[np.argsort(-weights[members], kind="stable")]
+            block = correlation[np.ix_(members, members)]
+            clusters.append(
+                {
+                    "tickers": [symbols[index] for index in members[:10]],
+                    "size": int(len(members)),
+                    "weight": round(float(weights[members].sum()), 4),
+                    "average_correlation": round(float((block.sum() - len(members)) / (len(members) * (len(members) - 1))), 4),
+                }
+            )
+    clusters.sort(key=lambda cluster: cluster["weight"], reverse=True)
+    return clusters[:TOP_CLUSTERS]
+
+
+def portfolio_risk(
+    portfolio_df,
+    window=WINDOW_DAYS,
+    confidence=CONFIDENCE,
+    benchmark=BENCHMARK,
+    store=None,
+    cache=None,
+    end=None,
+):
+    """Risk metrics for the holdings over the last ``window`` trading days.
+
+    Volatility, beta against ``benchmark``, one-day historical and parametric
+    VaR/CVaR at ``confidence``, maximum drawdown, each holding's share of
+    portfolio variance and clusters of highly correlated holdings. Returns and
+    weights are fractions; holdings without history are left out and the rest
+    re-weighted. Returns None when there isn't enough history.
+    """
+    store = store or price_history_store()
+    cache = cache or _covariances
+    values = (portfolio_df["quantity"].astype(float) * portfolio_df["current"].astype(float)).to_numpy()
+    symbols = portfolio_df["symbol"].astype(str).str.strip().str.upper().to_numpy()
+    held = values > 0
+    if not held.any():
+        return None
+
+    holdings, asset_classes = {}, {}
+    for symbol, value, asset_class in zip(symbols[held], values[held], portfolio_df["asset_class"].to_numpy()[held]):
+        holdings[symbol] = holdings.get(symbol, 0.0) + value
+        asset_classes.setdefault(symbol, asset_class)
+
+    tickers = sorted(set(holdings) | {benchmark})
+    returns, covariance, known = cache.get(store, tickers, window=window, end=end)
+    if len(returns) < MIN_HISTORY_DAYS:
+        return None
+
+    weights = np.array([holdings.get(ticker, 0.0) for ticker in tickers]) * known
+    if weights.sum() <= 0:
+        return None
+    coverage = weights.sum() / values[held].sum()
+    weights = weights / weights.sum()
+
+    exposure = covariance @ weights
+    variance = float(weights @ exposure)
+    sigma = np.sqrt(max(variance, 0.0))
+    portfolio_returns = returns @ weights
+    mean = float(portfolio_returns.mean())
+
+    cutoff = np.percentile(portfolio_returns, (1 - confidence) * 100)
+    z = NormalDist().inv_cdf(confidence)
+    wealth = np.cumprod(1 + portfolio_returns)
+    peaks = np.maximum(np.maximum.accumulate(wealth), 1.0)
+
+    benchmark_index = tickers.index(benchmark)
+    benchmark_variance = covariance[benchmark_index, benchmark_index]
+    beta = exposure[benchmark_index] / benchmark_variance if known[benchmark_index] and benchmark_variance > 0 else None
+
+    contributions = weights * exposure / variance if variance > 0 else np.zeros_like(weights)
+    held_columns = np.flatnonzero(weights > 0)
+    top = held_columns[np.argsort(-contributions[held_columns], kind="stable")[:TOP_CONTRIBUTORS]]
+    by_class = {}
+    for column in held_columns:
+        asset_class = asset_classes[tickers[column]]
+        by_class[asset_class] = by_class.get(asset_class, 0.0) + contributions[column]
+
+    deviations = np.sqrt(np.clip(np.diag(covariance), 0.0, None))
+    scale = np.divide(1.0, deviations, out=np.zeros_like(deviations), where=deviations > 0)
+    correlation = covariance * scale[:, None]
+    correlation *= scale
+
+    return {
+        "window_days": int(len(returns)),
+        "history_coverage": round(float(coverage), 4),
+        "confidence": confidence,
+        "volatility_daily": round(float(sigma), 4),
+        "volatility_annual": round(float(sigma * np.sqrt(252)), 4),
+        "benchmark": benchmark,
+        "beta": round(float(beta), 4) if beta is not None else None,
+        "var_historical": round(float(-cutoff), 4),
+        "cvar_historical": round(float(-portfolio_returns[portfolio_returns <= cutoff].mean()), 4),
+        "var_parametric": round(float(z * sigma - mean), 4),
+        "cvar_parametric": round(float(sigma * np.exp(-z * z / 2) / np.sqrt(2 * np.pi) / (1 - confidence) - mean), 4),
+        "max_drawdown": round(float((1 - wealth / peaks).max()), 4),
+        "risk_contributions": [
+            {
+                "symbol": tickers[column],
+                "weight": round(float(weights[column]), 4),
+                "risk_contribution": round(float(contributions[column]), 4),
+            }
+            for column in top
+        ],
+        "risk_by_asset_class": {
+            asset_class: round(float(share), 4)
+            for asset_class, share in sorted(by_class.items(), key=lambda item: item[1], reverse=True)
+        },
+        "correlation_clusters": _correlation_clusters(correlation, tickers, weights, CLUSTER_CORRELATION),
+    }
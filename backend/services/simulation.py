@@ -0,0 +1,185 @@
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import numpy as np
+
+from backend.services.price_history import price_history_store
+
+
+METHODS = ("bootstrap", "parametric")
+TRADING_DAYS = 252
+DEFAULT_PATHS = 100_000
+CHUNK_PATHS = 2_000
+BLOCK_DAYS = 5
+LOOKBACK_DAYS = 3 * 365
+MIN_HISTORY_DAYS = 20
+PERCENTILES = (5, 25, 50, 75, 95)
+
+_HORIZON = re.compile(r"(\d+(?:\.\d+)?)\s*-?\s*(day|week|month|year|yr)s?\b")
+_DAYS_PER_UNIT = {"day": 1, "week": 5, "month": 21, "year": TRADING_DAYS, "yr": TRADING_DAYS}
+
+
+def horizon_from_query(user_query, default=TRADING_DAYS, limit=10 * TRADING_DAYS):
+    """Trading days named in a question like "over the next 6 months", else ``default``."""
+    match = _HORIZON.search(user_query.lower())
+    if not match:
+        return default
+    days = int(round(float(match.group(1)) * _DAYS_PER_UNIT[match.group(2)]))
+    return min(max(days, 1), limit)
+
+
+def portfolio_daily_returns(portfolio_df, store=None, lookback_days=LOOKBACK_DAYS, end=None):
+    """Daily returns of the current holdings at fixed weights, and the share of value they cover.
+
+    Weights are current market values. On each day only holdings with history
+    count, re-weighted among themselves, so a short-lived ticker doesn't drag
+    the early days toward zero.
+    """
+    store = store or price_history_store()
+    values = (portfolio_df["quantity"].astype(float) * portfolio_df["current"].astype(float)).to_numpy()
+    symbols = portfolio_df["symbol"].astype(str).str.strip().str.upper().to_numpy()
+    held = values > 0
+    if not held.any():
+        return np.array([]), 0.0
+
+    weights = {}
+    for symbol, value in zip(symbols[held], values[held]):
+        weights[symbol] = weights.get(symbol, 0.0) + value
+
+    end = np.datetime64(end or date.today(), "D")
+    prices = store.matrix(list(weights), start=end - np.timedelta64(lookback_days, "D"), end=end, refresh=True)
+    closes = prices.to_numpy()
+    if len(closes) < 2:
+        return np.array([]), 0.0
+
+    weight = np.array([weights[symbol] for symbol in prices.columns])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = closes[1:] / closes[:-1] - 1
+    known = np.isfinite(returns)
+    covered = known.any(axis=0)
+    if not covered.any():
+        return np.array([]), 0.0
+
+    daily_weight = known @ weight
+    usable = daily_weight > 0
+    daily = np.where(known, returns, 0.0) @ weight
+    coverage = float(weight[covered].sum() / values[held].sum())
+    return daily[usable] / daily_weight[usable], coverage
+
+
+def _simulate_chunk(log_returns, paths, horizon, method, block_days, seed):
+    """Final returns and maximum drawdowns for one chunk of paths.
+
+    Paths run down the columns of a (horizon, paths) array of log returns, so
+    the running sums and peaks are computed over contiguous rows.
+    """
+    rng = np.random.default_rng(seed)
+    if method == "bootstrap":
+        # Resample blocks of consecutive days to keep short-run volatility clustering;
+        # the series wraps around so a block may start on any day
+        history = len(log_returns)
+        padded = np.concatenate([log_returns, log_returns[: block_days - 1]])
+        starts = rng.integers(0, history, size=(-(-horizon // block_days), 1, paths))
+        growth = padded[(starts + np.arange(block_days)[:, None]).reshape(-1, paths)[:horizon]]
+    else:
+        growth = rng.normal(log_returns.mean(), log_returns.std(ddof=1), size=(horizon, paths))
+
+    np.cumsum(growth, axis=0, out=growth)
+    peaks = np.maximum.accumulate(growth, axis=0)
+    np.maximum(peaks, 0.0, out=peaks)
+    np.subtract(growth, peaks, out=peaks)
+    return np.expm1(growth[-1]), -np.expm1(peaks.min(axis=0))
+
+
+def simulate_returns(
+    daily_returns,
+    horizon=TRADING_DAYS,
+    paths=DEFAULT_PATHS,
+    method="bootstrap",
+    block_days=BLOCK_DAYS,
+    chunk_paths=CHUNK_PATHS,
+    seed=None,
+    processes=1,
+):
+    """Simulate ``paths`` portfolio paths of ``horizon`` days from a daily return series.
+
+    ``bootstrap`` resamples blocks of ``block_days`` historical days;
+    ``parametric`` draws normal log returns with the history's mean and
+    volatility. Paths are generated ``chunk_paths`` at a time so memory stays
+    around ``chunk_paths * horizon`` floats. Every chunk gets its own child of
+    ``seed``, so a seeded run gives the same result for any ``processes``.
+    Returns the final return and maximum drawdown of every path.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method!r}; expected one of {', '.join(METHODS)}")
+    daily_returns = np.asarray(daily_returns, dtype=float)
+    if len(daily_returns) < 2:
+        raise ValueError("At least two daily returns are needed to simulate")
+    log_returns = np.log1p(daily_returns)
+
+    sizes = [min(chunk_paths, paths - start) for start in range(0, paths, chunk_paths)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(log_returns, size, horizon, method, max(1, block_days), child) for size, child in zip(sizes, seeds)]
+
+    if processes and processes > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(processes, len(jobs))) as executor:
+            results = list(executor.map(_simulate_chunk, *zip(*jobs)))
+    else:
+        results = [_simulate_chunk(*job) for job in jobs]
+
+    return np.concatenate([final for final, _ in results]), np.concatenate([drawdown for _, drawdown in results])
+
+
+def summarize_paths(final_returns, drawdowns, start_value=None):
+    """Distribution statistics for simulated final returns and drawdowns."""
+    percentiles = np.percentile(final_returns, PERCENTILES)
+    tail = final_returns[final_returns <= percentiles[0]]
+    stats = {
+        "expected_return": round(float(final_returns.mean()), 4),
+        "return_percentiles": {f"p{p}": round(float(value), 4) for p, value in zip(PERCENTILES, percentiles)},
+        "probability_of_loss": round(float((final_returns < 0).mean()), 4),
+        "value_at_risk_95": round(float(-percentiles[0]), 4),
+        "expected_shortfall_95": round(float(-tail.mean()), 4) if len(tail) else None,
+        "expected_max_drawdown": round(float(drawdowns.mean()), 4),
+        "max_drawdown_p95": round(float(np.percentile(drawdowns, 95)), 4),
+    }
+    if start_value is not None:
+        stats["start_value"] = round(float(start_value), 2)
+        stats["value_percentiles"] = {
+            f"p{p}": round(float(start_value * (1 + value)), 2) for p, value in zip(PERCENTILES, percentiles)
+        }
+    return stats
+
+
+def simulate_portfolio(
+    portfolio_df,
+    horizon=TRADING_DAYS,
+    paths=DEFAULT_PATHS,
+    method="bootstrap",
+    seed=0,
+    processes=1,
+    store=None,
+    lookback_days=LOOKBACK_DAYS,
+):
+    """Monte Carlo statistics for a portfolio over ``horizon`` trading days.
+
+    Returns None when fewer than ``MIN_HISTORY_DAYS`` days of price history
+    are available for the holdings.
+    """
+    daily_returns, coverage = portfolio_daily_returns(portfolio_df, store=store, lookback_days=lookback_days)
+    if len(daily_returns) < MIN_HISTORY_DAYS:
+        return None
+
+    final_returns, drawdowns = simulate_returns(
+        daily_returns, horizon=horizon, paths=paths, method=method, seed=seed, processes=processes
+    )
+    start_value = float((portfolio_df["quantity"].astype(float) * portfolio_df["current"].astype(float)).sum())
+    return {
+        "method": method,
+        "paths": paths,
+        "horizon_trading_days": horizon,
+        "history_days": len(daily_returns),
+        "history_coverage": round(coverage, 4),
+        **summarize_paths(final_returns, drawdowns, start_value),
+    }
@@ -0,0 +1,65 @@
+import os
+import threading
+
+import numpy as np
+
+
+TICKERS_FILE = "all_tickers.txt"
+
+# Sorts after every character a ticker can contain, closing prefix ranges
+_PREFIX_END = "\U0010ffff"
+
+
+class TickerIndex:
+    """Known ticker symbols as one sorted NumPy string array.
+
+    Membership and prefix queries are binary searches, so one index can be
+    shared read-only by every session and request in the process.
+    """
+
+    def __init__(self, symbols):
+        cleaned = {str(symbol).strip().upper() for symbol in symbols}
+        cleaned.discard("")
+        self.symbols = np.array(sorted(cleaned), dtype=str)
+
+    @classmethod
+    def from_file(cls, path=TICKERS_FILE):
+        with open(path, "r") as f:
+            return cls(f.read().split())
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        symbol = str(symbol).strip().upper()
+        position = int(np.searchsorted(self.symbols, symbol))
+        return position < len(self.symbols) and self.symbols[position] == symbol
+
+    def contains_many(self, symbols):
+        """A boolean array marking which of ``symbols`` are known."""
+        wanted = np.char.upper(np.char.strip(np.asarray(symbols, dtype=str)))
+        if not len(self.symbols) or not wanted.size:
+            return np.zeros(wanted.shape, dtype=bool)
+        positions = np.minimum(np.searchsorted(self.symbols, wanted), len(self.symbols) - 1)
+        return self.symbols[positions] == wanted
+
+    def prefix(self, prefix, limit=10):
+        """Up to ``limit`` known symbols starting with ``prefix``, in alphabetical order."""
+        prefix = str(prefix).strip().upper()
+        if not prefix:
+            return []
+        start, end = np.searchsorted(self.symbols, [prefix, prefix + _PREFIX_END])
+        return self.symbols[start:min(end, start + limit)].tolist()
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def ticker_index(path=TICKERS_FILE):
+    """The process-wide index for ``path``, read from disk on first use."""
+    key = os.path.abspath(path)
+    with _lock:
+        if key not in _indexes:
+            _indexes[key] = TickerIndex.from_file(path)
+        return _indexes[key]
@@ -1,9 +1,9 @@
-import streamlit as st
+from backend.services.tickers import ticker_index
 
 
 def valid(category, value):
     if category == "t":
-        if not value or value.upper() not in st.session_state.tickers:
+        if not value or value not in ticker_index():
             return False
     elif category == "q":
         try:
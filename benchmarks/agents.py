@@ -0,0 +1,240 @@
+"""Offline latency benchmark for the supervisor pipeline.
+
+Runs ``SupervisorAgent.run`` against the in-process fake LLM, search and price
+history backends across query mixes and portfolio sizes, and reports p50/p95
+latency, LLM calls and prompt bytes per question:
+
+    python -m benchmarks.agents --sizes 10 100 1000 --repeats 5
+
+``--suite parallel`` runs the multi-agent mix with specialists one at a time
+and then concurrently, to show what running them side by side saves.
+``--suite startup`` compares building a supervisor and client per question,
+as the advice page used to, with reusing the registry's warm one.
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from backend.agents.registry import get_supervisor, set_supervisor
+from backend.agents.research_agent import QUERY_MODES
+from backend.agents.supervisor import DEFAULT_MODEL, MAX_PARALLEL_AGENTS, SupervisorAgent
+from benchmarks.fixtures import FakeLLMTransport, fake_http_client, offline_backends, synthetic_portfolio
+
+
+QUERY_MIXES = {
+    "research": [
+        "What does the latest inflation news mean for my holdings?",
+        "How could fed policy and rates trends affect my sectors?",
+    ],
+    "risk": [
+        "How concentrated is my portfolio and what is my drawdown risk?",
+        "Am I diversified enough across asset classes?",
+    ],
+    "multi-agent": [
+        "Explain the risk if the market crashes and simulate a recession scenario.",
+        "Why is my volatility high, and what could happen if rates rise? Research the economic outlook.",
+    ],
+}
+SUITES = ("pipeline", "parallel", "startup")
+
+
+def run_benchmark(
+    sizes=(10, 100, 1000),
+    mixes=None,
+    repeats=5,
+    latency=0.3,
+    tokens_per_second=200.0,
+    prompt_tokens_per_second=5000.0,
+    search_latency=0.2,
+    model=DEFAULT_MODEL,
+    research_query_mode="auto",
+    max_parallel_agents=MAX_PARALLEL_AGENTS,
+):
+    """Return one result row per (query mix, portfolio size)."""
+    mixes = QUERY_MIXES if mixes is None else mixes
+    transport = FakeLLMTransport(
+        latency=latency,
+        tokens_per_second=tokens_per_second,
+        prompt_tokens_per_second=prompt_tokens_per_second,
+    )
+    supervisor = SupervisorAgent(
+        model=model,
+        cache_responses=False,
+        http_client=fake_http_client(transport),
+        api_key="offline",
+        research_query_mode=research_query_mode,
+        max_parallel_agents=max_parallel_agents,
+    )
+
+    rows = []
+    with offline_backends(search_latency):
+        for size in sizes:
+            portfolio_df = synthetic_portfolio(size)
+            for mix, queries in mixes.items():
+                timings, calls, prompt_bytes = [], [], []
+                for run in range(repeats):
+                    transport.reset()
+                    started = time.perf_counter()
+                    supervisor.run(queries[run % len(queries)], portfolio_df)
+                    timings.append(time.perf_counter() - started)
+                    stats = transport.stats()
+                    calls.append(stats["calls"])
+                    prompt_bytes.append(stats["prompt_bytes"])
+
+                rows.append(
+                    {
+                        "mix": mix,
+                        "parallel": max_parallel_agents,
+                        "positions": size,
+                        "runs": repeats,
+                        "p50_s": round(float(np.percentile(timings, 50)), 3),
+                        "p95_s": round(float(np.percentile(timings, 95)), 3),
+                        "llm_calls": round(float(np.mean(calls)), 2),
+                        "prompt_kb": round(float(np.mean(prompt_bytes)) / 1024, 1),
+                    }
+                )
+    return rows
+
+
+def run_parallel_benchmark(sizes=(10,), repeats=5, **options):
+    """Multi-agent questions with one specialist at a time, then with the default concurrency."""
+    mixes = {"multi-agent": QUERY_MIXES["multi-agent"]}
+    rows = []
+    for max_parallel_agents in (1, MAX_PARALLEL_AGENTS):
+        rows.extend(
+            run_benchmark(sizes=sizes, mixes=mixes, repeats=repeats, max_parallel_agents=max_parallel_agents, **options)
+        )
+    return rows
+
+
+def run_startup_benchmark(
+    repeats=5,
+    latency=0.3,
+    tokens_per_second=200.0,
+    prompt_tokens_per_second=5000.0,
+    search_latency=0.2,
+    connect_latency=0.1,
+    model=DEFAULT_MODEL,
+    research_query_mode="auto",
+):
+    """Construction cost and per-question latency with a fresh supervisor per question versus the registry's.
+
+    Every fresh supervisor gets its own fake transport, so it pays
+    ``connect_latency`` once like a new keep-alive pool would.
+    """
+    transport_options = {
+        "latency": latency,
+        "tokens_per_second": tokens_per_second,
+        "prompt_tokens_per_second": prompt_tokens_per_second,
+        "connect_latency": connect_latency,
+    }
+
+    def build():
+        return SupervisorAgent(
+            model=model,
+            cache_responses=False,
+            http_client=fake_http_client(**transport_options),
+            api_key="offline",
+            research_query_mode=research_query_mode,
+        )
+
+    builds, lookups, fresh, warm = [], [], [], []
+    previous = set_supervisor(model, build())
+    portfolio_df = synthetic_portfolio(10)
+    queries = QUERY_MIXES["risk"]
+    try:
+        with offline_backends(search_latency):
+            get_supervisor(model).run(queries[0], portfolio_df)
+            for run in range(repeats):
+                query = queries[run % len(queries)]
+
+                started = time.perf_counter()
+                supervisor = build()
+                builds.append(time.perf_counter() - started)
+                supervisor.run(query, portfolio_df)
+                fresh.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                supervisor = get_supervisor(model)
+                lookups.append(time.perf_counter() - started)
+                supervisor.run(query, portfolio_df)
+                warm.append(time.perf_counter() - started)
+    finally:
+        set_supervisor(model, previous)
+
+    return [
+        {
+            "mode": "fresh per question",
+            "runs": repeats,
+            "setup_ms": round(float(np.percentile(builds, 50)) * 1000, 3),
+            "p50_s": round(float(np.percentile(fresh, 50)), 3),
+            "p95_s": round(float(np.percentile(fresh, 95)), 3),
+        },
+        {
+            "mode": "registry",
+            "runs": repeats,
+            "setup_ms": round(float(np.percentile(lookups, 50)) * 1000, 3),
+            "p50_s": round(float(np.percentile(warm, 50)), 3),
+            "p95_s": round(float(np.percentile(warm, 95)), 3),
+        },
+    ]
+
+
+def format_startup_rows(rows):
+    header = f"{'mode':<20} {'runs':>5} {'setup ms':>9} {'p50 s':>7} {'p95 s':>7}"
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        lines.append(f"{row['mode']:<20} {row['runs']:>5} {row['setup_ms']:>9.3f} {row['p50_s']:>7.3f} {row['p95_s']:>7.3f}")
+    return "\n".join(lines)
+
+
+def format_rows(rows):
+    header = f"{'mix':<12} {'parallel':>8} {'positions':>9} {'runs':>5} {'p50 s':>7} {'p95 s':>7} {'calls':>6} {'prompt KB':>10}"
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        lines.append(
+            f"{row['mix']:<12} {row['parallel']:>8} {row['positions']:>9} {row['runs']:>5} {row['p50_s']:>7.3f} "
+            f"{row['p95_s']:>7.3f} {row['llm_calls']:>6.2f} {row['prompt_kb']:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the supervisor pipeline against fake LLM and search backends.")
+    parser.add_argument("--suite", choices=SUITES, default="pipeline", help="what to measure")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="portfolio sizes to test")
+    parser.add_argument("--mixes", nargs="+", choices=sorted(QUERY_MIXES), help="query mixes to run (default: all)")
+    parser.add_argument("--repeats", type=int, default=5, help="questions per mix and size")
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds before each fake LLM reply")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="fake LLM output rate")
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=5000.0, help="fake LLM prompt read rate")
+    parser.add_argument("--connect-latency", type=float, default=0.1, help="fake connection setup per new client (startup suite)")
+    parser.add_argument("--search-latency", type=float, default=0.2, help="seconds per fake web search")
+    parser.add_argument("--research-mode", choices=QUERY_MODES, default="auto", help="how research plans its search query")
+    parser.add_argument("--json", action="store_true", help="print rows as JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    options = {
+        "latency": args.latency,
+        "tokens_per_second": args.tokens_per_second,
+        "prompt_tokens_per_second": args.prompt_tokens_per_second,
+        "search_latency": args.search_latency,
+        "research_query_mode": args.research_mode,
+    }
+    if args.suite == "startup":
+        rows = run_startup_benchmark(repeats=args.repeats, connect_latency=args.connect_latency, **options)
+        print(json.dumps(rows, indent=2) if args.json else format_startup_rows(rows))
+        return
+    if args.suite == "parallel":
+        rows = run_parallel_benchmark(sizes=args.sizes, repeats=args.repeats, **options)
+    else:
+        mixes = {name: QUERY_MIXES[name] for name in args.mixes} if args.mixes else None
+        rows = run_benchmark(sizes=args.sizes, mixes=mixes, repeats=args.repeats, **options)
+    print(json.dumps(rows, indent=2) if args.json else format_rows(rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Benchmark for AllocationAgent trade planning against the previous row loop.
+
+Keeps the iterrows implementation that the vectorized planner replaced as
+``LoopAllocationAgent``, the reference for equivalence checks, and times
+both on synthetic portfolios toward a fixed five-class target:
+
+    python -m benchmarks.allocation --sizes 1000 10000 100000
+"""
+
+import argparse
+import time
+
+import pandas as pd
+
+from backend.agents.allocation_agent import AllocationAgent
+from backend.agents.tools import PortfolioSnapshot
+from benchmarks.fixtures import synthetic_portfolio
+
+
+TARGET_ALLOCATIONS = {"Equity": 45, "Bond": 30, "ETF": 10, "Cash": 5, "Real Estate": 10}
+FUZZ_CLASSES = ["Equity", "Bond", "ETF", "Cash", "Commodity"]
+
+
+class LoopAllocationAgent(AllocationAgent):
+    """The per-class filter, sort and iterrows planner that AllocationAgent used before vectorizing."""
+
+    def _portfolio_allocations(self, portfolio_df):
+        if isinstance(portfolio_df, PortfolioSnapshot):
+            portfolio_df = portfolio_df.frame
+        if portfolio_df is None or portfolio_df.empty:
+            return {}, 0.0, []
+
+        working = portfolio_df.copy()
+        if "market_value" not in working.columns:
+            working["market_value"] = working["quantity"] * working["current"]
+
+        total_value = float(working["market_value"].sum())
+        if total_value <= 0:
+            return {}, 0.0, []
+
+        allocations = (
+            working.groupby("asset_class")["market_value"].sum().div(total_value).mul(100).round(2).to_dict()
+        )
+        return allocations, total_value, working.to_dict(orient="records")
+
+    def run(self, user_query: str, portfolio_df: pd.DataFrame, desired_allocations=None):
+        allocations, total_value, positions = self._portfolio_allocations(portfolio_df)
+        target_allocations = self._parse_desired_allocations(user_query, desired_allocations)
+
+        if not target_allocations:
+            return {
+                "agent": self.name,
+                "message": "No target allocations were provided, so no rebalancing trades could be generated.",
+                "current_allocations": allocations,
+                "target_allocations": {},
+                "trade_plan": [],
+                "portfolio_value": round(total_value, 2),
+            }
+
+        trade_plan = []
+        positions_df = pd.DataFrame(positions)
+        if not positions_df.empty:
+            positions_df["market_value"] = positions_df["quantity"] * positions_df["current"]
+            positions_df["weight_in_class"] = positions_df.groupby("asset_class")["market_value"].transform(
+                lambda s: s / s.sum() if s.sum() else 0
+            )
+
+        for asset_class, target_pct in target_allocations.items():
+            current_pct = allocations.get(asset_class, 0.0)
+            gap = round(target_pct - current_pct, 2)
+            if gap == 0:
+                continue
+
+            class_positions = positions_df[positions_df["asset_class"] == asset_class] if not positions_df.empty else pd.DataFrame()
+            if gap < 0:
+                remaining_value = abs(gap) / 100 * total_value
+                for _, row in class_positions.sort_values("market_value", ascending=False).iterrows():
+                    if remaining_value <= 0:
+                        break
+                    sell_value = min(float(row["market_value"]), remaining_value)
+                    if sell_value <= 0:
+                        continue
+                    shares_to_sell = round(sell_value / float(row["current"]), 4)
+                    trade_plan.append(
+                        {
+                            "action": "Sell",
+                            "ticker": row["symbol"],
+                            "asset_class": asset_class,
+                            "amount_usd": round(sell_value, 2),
+                            "estimated_shares": shares_to_sell,
+                            "current_price": round(float(row["current"]), 2),
+                            "reason": f"Reduce {asset_class} exposure to move toward {target_pct:.2f}% target allocation",
+                        }
+                    )
+                    remaining_value -= sell_value
+            else:
+                target_value = (gap / 100) * total_value
+                if class_positions.empty:
+                    trade_plan.append(
+                        {
+                            "action": "Buy",
+                            "ticker": None,
+                            "asset_class": asset_class,
+                            "amount_usd": round(target_value, 2),
+                            "estimated_shares": None,
+                            "current_price": None,
+                            "reason": f"Open a new position in {asset_class} to reach the {target_pct:.2f}% target",
+                        }
+                    )
+                    continue
+
+                remaining_value = target_value
+                for _, row in class_positions.sort_values("market_value", ascending=False).iterrows():
+                    if remaining_value <= 0:
+                        break
+                    buy_value = min(remaining_value, float(row["market_value"]) * 0.5)
+                    if buy_value <= 0:
+                        continue
+                    shares_to_buy = round(buy_value / float(row["current"]), 4)
+                    trade_plan.append(
+                        {
+                            "action": "Buy",
+                            "ticker": row["symbol"],
+                            "asset_class": asset_class,
+                            "amount_usd": round(buy_value, 2),
+                            "estimated_shares": shares_to_buy,
+                            "current_price": round(float(row["current"]), 2),
+                            "reason": f"Increase {asset_class} exposure to move toward {target_pct:.2f}% target allocation",
+                        }
+                    )
+                    remaining_value -= buy_value
+
+        return {
+            "agent": self.name,
+            "portfolio_value": round(total_value, 2),
+            "current_allocations": {k: round(float(v), 2) for k, v in allocations.items()},
+            "target_allocations": {k: round(float(v), 2) for k, v in target_allocations.items()},
+            "trade_plan": trade_plan,
+        }
+
+
+def random_portfolio(rng, positions):
+    """A small portfolio with many tied market values, zero prices and some missing classes."""
+    return pd.DataFrame(
+        {
+            "symbol": [f"T{index}" for index in range(positions)],
+            "quantity": rng.integers(0, 4, positions),
+            "avg_cost": rng.integers(1, 5, positions).astype(float),
+            "sector": rng.choice(["Technology", "Energy"], positions),
+            "asset_class": rng.choice(FUZZ_CLASSES[: int(rng.integers(1, len(FUZZ_CLASSES) + 1))], positions),
+            "current": rng.choice([0.0, 1.0, 2.0, 2.5, 10.0], positions),
+        }
+    )
+
+
+def random_targets(rng):
+    classes = rng.choice(FUZZ_CLASSES, int(rng.integers(1, len(FUZZ_CLASSES) + 1)), replace=False)
+    return {str(asset_class): float(rng.integers(0, 60)) for asset_class in classes}
+
+
+def _timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, round((time.perf_counter() - started) * 1000, 1)
+
+
+def run_benchmark(sizes=(1_000, 10_000, 100_000), targets=None):
+    """Return loop and vectorized timings in milliseconds per portfolio size."""
+    targets = TARGET_ALLOCATIONS if targets is None else targets
+    query = "Rebalance this portfolio to the desired allocation targets"
+    rows = []
+    for size in sizes:
+        portfolio_df = synthetic_portfolio(size)
+        expected, loop_ms = _timed(LoopAllocationAgent().run, query, portfolio_df, desired_allocations=targets)
+        result, vectorized_ms = _timed(AllocationAgent().run, query, portfolio_df, desired_allocations=targets)
+        if repr(result) != repr(expected):
+            raise AssertionError(f"Vectorized plan differs from the loop at {size} positions")
+        rows.append(
+            {
+                "positions": size,
+                "trades": len(result["trade_plan"]),
+                "loop_ms": loop_ms,
+                "vectorized_ms": vectorized_ms,
+            }
+        )
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time AllocationAgent trade planning against the previous row loop.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="portfolio sizes to test")
+    args = parser.parse_args(argv)
+
+    print(f"{'positions':>9} {'trades':>7} {'loop ms':>9} {'vectorized ms':>14}")
+    for row in run_benchmark(args.sizes):
+        print(f"{row['positions']:>9} {row['trades']:>7} {row['loop_ms']:>9} {row['vectorized_ms']:>14}")
+
+
+if __name__ == "__main__":
+    main()
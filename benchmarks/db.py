@@ -0,0 +1,113 @@
+"""Throughput benchmark for the pooled SQLite connection layer.
+
+Seeds a temporary database, then runs the ``/portfolio/summary/`` query from
+several threads at once, first opening and closing a connection per request
+as the endpoints used to, then borrowing connections from ``ConnectionPool``:
+
+    python -m benchmarks.db --requests 5000 --threads 8
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from backend.backend import _summary
+from backend.services.db import ConnectionPool, open_connection
+from backend.services.migrations import migrate
+from benchmarks.fixtures import synthetic_portfolio
+
+
+def seed_database(database, users=50, positions=200):
+    """Create the schema and ``positions`` synthetic holdings for each of ``users`` users."""
+    conn = open_connection(database)
+    try:
+        migrate(conn)
+        with conn:
+            for user_id in range(1, users + 1):
+                portfolio_df = synthetic_portfolio(positions, seed=user_id)
+                portfolio_df["user_id"] = user_id
+                conn.executemany(
+                    """
+                    INSERT INTO portfolio (symbol, quantity, avg_cost, sector, asset_class, current, user_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    portfolio_df[["symbol", "quantity", "avg_cost", "sector", "asset_class", "current", "user_id"]]
+                    .astype(object)
+                    .itertuples(index=False, name=None),
+                )
+    finally:
+        conn.close()
+
+
+def _connect_per_request(database):
+    def request(user_id):
+        conn = sqlite3.connect(database)
+        try:
+            return _summary(conn, user_id)
+        finally:
+            conn.close()
+
+    return request, lambda: None
+
+
+def _pooled(database, threads):
+    pool = ConnectionPool(database, max_size=threads)
+
+    def request(user_id):
+        conn = pool.acquire()
+        try:
+            return _summary(conn, user_id)
+        finally:
+            pool.release(conn)
+
+    return request, pool.close
+
+
+def _throughput(request, user_ids, threads):
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        started = time.perf_counter()
+        for _ in executor.map(request, user_ids):
+            pass
+        elapsed = time.perf_counter() - started
+    return {"seconds": round(elapsed, 3), "requests_per_second": round(len(user_ids) / elapsed, 1)}
+
+
+def run_benchmark(requests=5000, threads=8, users=50, positions=200, seed=0):
+    """Return throughput for connect-per-request and for the pool over the same request mix."""
+    user_ids = np.random.default_rng(seed).integers(1, users + 1, requests).tolist()
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "benchmark.db")
+        seed_database(database, users=users, positions=positions)
+        results = {}
+        for name, (request, close) in (
+            ("connect per request", _connect_per_request(database)),
+            ("pooled", _pooled(database, threads)),
+        ):
+            try:
+                results[name] = _throughput(request, user_ids, threads)
+            finally:
+                close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare summary query throughput with and without the connection pool.")
+    parser.add_argument("--requests", type=int, default=5000, help="summary queries per run")
+    parser.add_argument("--threads", type=int, default=8, help="concurrent request threads (and pool size)")
+    parser.add_argument("--users", type=int, default=50, help="users in the seeded database")
+    parser.add_argument("--positions", type=int, default=200, help="positions per user")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.requests, args.threads, args.users, args.positions)
+    print(f"{'mode':<20} {'seconds':>8} {'req/s':>9}")
+    for name, row in results.items():
+        print(f"{name:<20} {row['seconds']:>8} {row['requests_per_second']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""Offline stand-ins for the LLM, web search and price history, and synthetic portfolios, for tests and benchmarks."""
+
+import json
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+import httpx
+import numpy as np
+import pandas as pd
+
+from backend.agents.tools import set_search_backend
+from backend.services.price_history import PriceHistoryStore, set_price_history_store
+
+
+CHARS_PER_TOKEN = 4
+SECTORS = ["Technology", "Healthcare", "Financials", "Energy", "Utilities", "Government"]
+ASSET_CLASSES = ["Equity", "Bond", "ETF", "Cash"]
+
+# Replies picked by a phrase from the request's system prompt; the planner gets
+# a plain search query so the research path behaves like it does live.
+DEFAULT_RESPONSES = {
+    "high-signal web-search query": "fed interest rate outlook sector impact",
+}
+DEFAULT_RESPONSE = (
+    "## Summary\n\n"
+    "- The portfolio leans toward its largest asset class, so a drawdown there dominates results.\n"
+    "- A 10% fall in that class moves the total by roughly $w \\times 10\\%$, where $w$ is its weight.\n"
+    "- Costs such as \\$5 commissions are small next to allocation effects.\n\n"
+    "This is educational context, not personalized financial advice."
+)
+
+
+class FakeLLMTransport(httpx.BaseTransport):
+    """OpenAI-compatible chat completions served in-process, for offline runs and benchmarks.
+
+    Pass it to a SupervisorAgent through ``fake_http_client`` and requests go
+    through aisuite and the OpenAI SDK as usual, but are answered here after
+    ``latency`` seconds plus the time to read the prompt and emit the reply at
+    the configured token rates. The first request also waits
+    ``connect_latency`` seconds, standing in for the TCP and TLS setup a new
+    client pays once. Calls and prompt bytes are counted.
+    """
+
+    def __init__(
+        self,
+        latency=0.3,
+        tokens_per_second=200.0,
+        prompt_tokens_per_second=None,
+        responses=None,
+        default_response=DEFAULT_RESPONSE,
+        connect_latency=0.0,
+    ):
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self._connected = False
+        self.tokens_per_second = tokens_per_second
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.responses = DEFAULT_RESPONSES if responses is None else responses
+        self.default_response = default_response
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_bytes = 0
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.prompt_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "prompt_bytes": self.prompt_bytes}
+
+    def _reply(self, messages):
+        prompt = "\n".join(str(message.get("content", "")) for message in messages)
+        for phrase, reply in self.responses.items():
+            if phrase in prompt:
+                return reply
+        return self.default_response
+
+    def _delay(self, messages):
+        delay = self.latency
+        if self.prompt_tokens_per_second:
+            prompt_chars = sum(len(str(message.get("content", ""))) for message in messages)
+            delay += prompt_chars / CHARS_PER_TOKEN / self.prompt_tokens_per_second
+        return delay
+
+    def handle_request(self, request):
+        if not request.url.path.endswith("/chat/completions"):
+            return httpx.Response(404, json={"error": {"message": f"Unsupported path {request.url.path}"}})
+
+        body = request.read()
+        payload = json.loads(body)
+        messages = payload.get("messages", [])
+        with self._lock:
+            self.calls += 1
+            self.prompt_bytes += len(body)
+            connecting, self._connected = not self._connected, True
+        if connecting and self.connect_latency:
+            time.sleep(self.connect_latency)
+
+        text = self._reply(messages)
+        time.sleep(self._delay(messages))
+        if payload.get("stream"):
+            return httpx.Response(
+                200,
+                headers={"content-type": "text/event-stream"},
+                stream=_EventStream(self._chunks(payload["model"], text)),
+            )
+
+        if self.tokens_per_second:
+            time.sleep(len(text) / CHARS_PER_TOKEN / self.tokens_per_second)
+        return httpx.Response(200, json=self._completion(payload["model"], messages, text))
+
+    @staticmethod
+    def _completion(model, messages, text):
+        prompt_tokens = sum(len(str(message.get("content", ""))) for message in messages) // CHARS_PER_TOKEN
+        completion_tokens = len(text) // CHARS_PER_TOKEN
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _chunks(self, model, text):
+        step = CHARS_PER_TOKEN * 4
+        for start in range(0, len(text), step):
+            piece = text[start:start + step]
+            if self.tokens_per_second:
+                time.sleep(len(piece) / CHARS_PER_TOKEN / self.tokens_per_second)
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"role": "assistant", "content": piece}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+        yield b"data: [DONE]\n\n"
+
+
+class _EventStream(httpx.SyncByteStream):
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __iter__(self):
+        yield from self.chunks
+
+
+def fake_http_client(transport=None, **kwargs):
+    """An httpx client answered by ``FakeLLMTransport``; extra kwargs configure a new transport."""
+    return httpx.Client(transport=transport or FakeLLMTransport(**kwargs))
+
+
+class FakeSearchBackend:
+    """Canned ``search_web`` results with a fixed delay, in place of DuckDuckGo."""
+
+    def __init__(self, results=None, latency=0.2):
+        self.latency = latency
+        self.results = results if results is not None else [
+            {
+                "title": f"Market update {index + 1}",
+                "url": f"https://example.com/markets/{index + 1}",
+                "snippet": "Rates, inflation and sector earnings shaped this week's moves.",
+            }
+            for index in range(5)
+        ]
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def search(self, query, max_results=5):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return [dict(result) for result in self.results[:max_results]]
+
+
+class FakeHistoryProvider:
+    """Seeded random-walk daily closes for any ticker, in place of Yahoo history.
+
+    Each ticker's walk starts at a fixed date and depends only on the seed and
+    the symbol, so incremental refreshes line up with earlier ones.
+    """
+
+    ANCHOR = np.datetime64("2000-01-03", "D")
+
+    def __init__(self, seed=0, drift=0.0003, volatility=0.012):
+        self.seed = seed
+        self.drift = drift
+        self.volatility = volatility
+
+    def fetch(self, symbols, start, end):
+        days = np.arange(self.ANCHOR, end + np.timedelta64(1, "D"), dtype="datetime64[D]")
+        days = days[np.is_busday(days)]
+        kept = days >= start
+        history = {}
+        for symbol in symbols:
+            rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode("utf-8"))])
+            closes = 100 * np.exp(np.cumsum(rng.normal(self.drift, self.volatility, len(days))))
+            history[symbol] = (days[kept], closes[kept])
+        return history
+
+
+def synthetic_portfolio(positions, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "symbol": [f"SYM{index:05d}" for index in range(positions)],
+            "quantity": rng.integers(1, 500, positions),
+            "avg_cost": np.round(rng.uniform(5, 400, positions), 2),
+            "sector": rng.choice(SECTORS, positions),
+            "asset_class": rng.choice(ASSET_CLASSES, positions),
+            "current": np.round(rng.uniform(5, 400, positions), 2),
+        }
+    )
+
+
+@contextmanager
+def offline_backends(search_latency=0.2):
+    """Point web search and price history at the fake backends for the duration."""
+    previous_backend = set_search_backend(FakeSearchBackend(latency=search_latency))
+    previous_store = set_price_history_store(PriceHistoryStore(FakeHistoryProvider(), path=None))
+    try:
+        yield
+    finally:
+        set_search_backend(previous_backend)
+        set_price_history_store(previous_store)
@@ -0,0 +1,100 @@
+"""Mixed-workload load test for a running backend.
+
+Seeds a synthetic portfolio for a spare user, then keeps light clients on
+``/portfolio/summary/`` and heavy clients on ``/portfolio/stratAI`` at the
+same time, and reports per-route latency percentiles:
+
+    python -m uvicorn backend.backend:app
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000 --positions 5000 --seconds 20
+
+The seeded positions are removed afterwards. stratAI does not save anything,
+so the test leaves the strategy tables untouched.
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+from benchmarks.fixtures import synthetic_portfolio
+
+
+LOADTEST_USER_ID = 990001
+
+
+async def _client_loop(client, method, path, deadline, timings, **kwargs):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.request(method, path, **kwargs)
+        response.raise_for_status()
+        timings.append(time.perf_counter() - started)
+
+
+def _percentiles(timings):
+    if not timings:
+        return {"requests": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    values = np.asarray(timings) * 1000
+    return {
+        "requests": len(values),
+        "p50_ms": round(float(np.percentile(values, 50)), 1),
+        "p95_ms": round(float(np.percentile(values, 95)), 1),
+        "p99_ms": round(float(np.percentile(values, 99)), 1),
+        "max_ms": round(float(values.max()), 1),
+    }
+
+
+async def run_load_test(url, positions=5000, seconds=20.0, light_clients=8, heavy_clients=2, user_id=LOADTEST_USER_ID):
+    """Return latency percentiles per route for a mixed light/heavy workload."""
+    portfolio_df = synthetic_portfolio(positions)
+    async with httpx.AsyncClient(base_url=url, timeout=300) as client:
+        response = await client.put(f"/portfolio/{user_id}", json=portfolio_df.to_dict(orient="records"))
+        response.raise_for_status()
+        try:
+            summary = (await client.get("/portfolio/summary/", params={"user_id": user_id})).json()
+            changes = {row["asset_class"]: row["cur_total_cost"] * (0.05 if index % 2 else -0.05) for index, row in enumerate(summary)}
+            changes["user_id"] = user_id
+
+            light, heavy = [], []
+            deadline = time.perf_counter() + seconds
+            loops = [
+                _client_loop(client, "GET", "/portfolio/summary/", deadline, light, params={"user_id": user_id})
+                for _ in range(light_clients)
+            ] + [
+                _client_loop(client, "POST", "/portfolio/stratAI", deadline, heavy, json=changes)
+                for _ in range(heavy_clients)
+            ]
+            await asyncio.gather(*loops)
+        finally:
+            await client.delete("/portfolio/", params={"user_id": user_id})
+
+    return {"/portfolio/summary/": _percentiles(light), "/portfolio/stratAI": _percentiles(heavy)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure tail latency of light requests alongside heavy strategy requests.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="backend base URL")
+    parser.add_argument("--positions", type=int, default=5000, help="size of the seeded portfolio")
+    parser.add_argument("--seconds", type=float, default=20.0, help="test duration")
+    parser.add_argument("--light-clients", type=int, default=8, help="concurrent /portfolio/summary/ clients")
+    parser.add_argument("--heavy-clients", type=int, default=2, help="concurrent /portfolio/stratAI clients")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(
+        run_load_test(
+            args.url,
+            positions=args.positions,
+            seconds=args.seconds,
+            light_clients=args.light_clients,
+            heavy_clients=args.heavy_clients,
+        )
+    )
+    print(f"{'route':<22} {'requests':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for route, stats in results.items():
+        cells = [stats[key] if stats[key] is not None else "-" for key in ("p50_ms", "p95_ms", "p99_ms", "max_ms")]
+        print(f"{route:<22} {stats['requests']:>8} " + " ".join(f"{cell:>8}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
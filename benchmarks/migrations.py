@@ -0,0 +1,137 @@
+"""Scaling benchmark for the composite-index migration.
+
+Builds a temporary database at schema version 1 (tables, no secondary
+indexes), loads synthetic portfolio and strategy rows, times the hot
+per-user lookups, applies the remaining migrations and times them again:
+
+    python -m benchmarks.migrations --portfolio-rows 1000000 --strategy-rows 10000000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from backend.backend import _summary
+from backend.services.db import open_connection
+from backend.services.migrations import migrate, schema_version
+from backend.services.rebalancing import load_portfolio
+
+
+ASSET_CLASSES = ["Equity", "Bond", "ETF", "Cash"]
+INSERT_BATCH_ROWS = 500_000
+
+
+def _insert(conn, sql, columns, rows):
+    for start in range(0, rows, INSERT_BATCH_ROWS):
+        stop = min(start + INSERT_BATCH_ROWS, rows)
+        with conn:
+            conn.executemany(sql, zip(*(column[start:stop].tolist() for column in columns)))
+
+
+def seed_database(conn, portfolio_rows, strategy_rows, users, seed=0):
+    """Load synthetic rows spread evenly over ``users`` users, several saved versions each."""
+    rng = np.random.default_rng(seed)
+    _insert(
+        conn,
+        """
+        INSERT INTO portfolio (symbol, quantity, avg_cost, sector, asset_class, current, user_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            np.char.add("SYM", (rng.integers(0, 10_000, portfolio_rows)).astype(str)),
+            rng.integers(1, 500, portfolio_rows),
+            np.round(rng.uniform(5, 400, portfolio_rows), 2),
+            np.full(portfolio_rows, "Technology"),
+            rng.choice(ASSET_CLASSES, portfolio_rows),
+            np.round(rng.uniform(5, 400, portfolio_rows), 2),
+            rng.integers(1, users + 1, portfolio_rows),
+        ],
+        portfolio_rows,
+    )
+    _insert(
+        conn,
+        """
+        INSERT INTO strategy (user_id, strategy, version, ticker, quantity, action, asset_class, current)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            rng.integers(1, users + 1, strategy_rows),
+            rng.integers(1, 5, strategy_rows),
+            rng.integers(0, 50, strategy_rows),
+            np.char.add("SYM", (rng.integers(0, 10_000, strategy_rows)).astype(str)),
+            rng.integers(1, 100, strategy_rows).astype(float),
+            rng.choice(["buy", "sell"], strategy_rows),
+            rng.choice(ASSET_CLASSES, strategy_rows),
+            np.round(rng.uniform(5, 400, strategy_rows), 2),
+        ],
+        strategy_rows,
+    )
+
+
+def _latest_version(conn, user_id, strategy):
+    return conn.execute("SELECT MAX(version) FROM strategy WHERE user_id = ? AND strategy = ?", (user_id, strategy)).fetchone()
+
+
+def _time_queries(conn, user_ids):
+    """Mean milliseconds per call for each hot query over ``user_ids``."""
+    queries = {
+        "portfolio load": lambda user_id: load_portfolio(conn, user_id),
+        "summary": lambda user_id: _summary(conn, user_id),
+        "max(version)": lambda user_id: _latest_version(conn, user_id, 1 + user_id % 4),
+    }
+    timings = {}
+    for name, query in queries.items():
+        started = time.perf_counter()
+        for user_id in user_ids:
+            query(user_id)
+        timings[name] = round((time.perf_counter() - started) * 1000 / len(user_ids), 3)
+    return timings
+
+
+def run_benchmark(portfolio_rows=1_000_000, strategy_rows=10_000_000, users=10_000, lookups=20, seed=0):
+    """Return load time, per-query timings before and after the migration, and the migration time."""
+    user_ids = np.random.default_rng(seed + 1).integers(1, users + 1, lookups).tolist()
+    with tempfile.TemporaryDirectory() as directory:
+        conn = open_connection(os.path.join(directory, "benchmark.db"))
+        try:
+            migrate(conn, target=1)
+            started = time.perf_counter()
+            seed_database(conn, portfolio_rows, strategy_rows, users, seed)
+            load_seconds = time.perf_counter() - started
+
+            before = _time_queries(conn, user_ids)
+            started = time.perf_counter()
+            version = migrate(conn)
+            migrate_seconds = time.perf_counter() - started
+            after = _time_queries(conn, user_ids)
+            assert schema_version(conn) == version
+        finally:
+            conn.close()
+    return {
+        "load_s": round(load_seconds, 1),
+        "migrate_s": round(migrate_seconds, 1),
+        "before_ms": before,
+        "after_ms": after,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time per-user lookups before and after the index migration.")
+    parser.add_argument("--portfolio-rows", type=int, default=1_000_000, help="rows loaded into portfolio")
+    parser.add_argument("--strategy-rows", type=int, default=10_000_000, help="rows loaded into strategy")
+    parser.add_argument("--users", type=int, default=10_000, help="users the rows are spread over")
+    parser.add_argument("--lookups", type=int, default=20, help="users looked up per query")
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args.portfolio_rows, args.strategy_rows, args.users, args.lookups)
+    print(f"loaded in {result['load_s']} s, migrated in {result['migrate_s']} s")
+    print(f"{'query':<16} {'before ms':>10} {'after ms':>10}")
+    for name, before in result["before_ms"].items():
+        print(f"{name:<16} {before:>10} {result['after_ms'][name]:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Timing benchmark for the risk metrics and their covariance cache.
+
+Builds synthetic portfolios over seeded random-walk price history, then times
+a cold build, a cache hit, a one-day incremental update and a full rebuild
+for the same day:
+
+    python -m benchmarks.risk --sizes 50 5000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from backend.services.price_history import PriceHistoryStore
+from backend.services.risk import BENCHMARK, CovarianceCache, portfolio_risk
+from benchmarks.fixtures import FakeHistoryProvider, synthetic_portfolio
+
+
+def _timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    fn(*args, **kwargs)
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def run_benchmark(sizes=(50, 5000), end="2025-06-02"):
+    """Return one row of timings in milliseconds per portfolio size."""
+    end = np.datetime64(end, "D")
+    next_day = np.busday_offset(end, 1, roll="forward")
+    rows = []
+    for size in sizes:
+        portfolio_df = synthetic_portfolio(size)
+        store = PriceHistoryStore(FakeHistoryProvider(), path=None)
+        store.refresh(list(portfolio_df["symbol"]) + [BENCHMARK], end=next_day)
+        cache = CovarianceCache()
+        rows.append(
+            {
+                "tickers": size,
+                "build_ms": _timed(portfolio_risk, portfolio_df, store=store, cache=cache, end=end),
+                "hit_ms": _timed(portfolio_risk, portfolio_df, store=store, cache=cache, end=end),
+                "update_ms": _timed(portfolio_risk, portfolio_df, store=store, cache=cache, end=next_day),
+                "rebuild_ms": _timed(portfolio_risk, portfolio_df, store=store, cache=CovarianceCache(), end=next_day),
+            }
+        )
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time risk metrics with and without the covariance cache.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 5000], help="tickers per portfolio")
+    args = parser.parse_args(argv)
+
+    print(f"{'tickers':>8} {'build ms':>9} {'hit ms':>8} {'update ms':>10} {'rebuild ms':>11}")
+    for row in run_benchmark(args.sizes):
+        print(f"{row['tickers']:>8} {row['build_ms']:>9} {row['hit_ms']:>8} {row['update_ms']:>10} {row['rebuild_ms']:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Microbenchmark for sanitize_streamlit_math on large LLM-style answers.
+
+Times the previous regex implementation (kept here as the reference for
+equivalence checks), the single-pass scanner, a repeated call on already
+sanitized text, and the same text fed to StreamingMathSanitizer in chunks:
+
+    python -m benchmarks.sanitize --sizes 20000 2000000
+"""
+
+import argparse
+import re
+import time
+
+import numpy as np
+
+from backend.agents.tools import StreamingMathSanitizer, sanitize_streamlit_math
+
+
+FUZZ_ALPHABET = list("$$$\\ab xyz12.,%=+-^_(){}\n")
+ANSWER_PIECES = [
+    "The portfolio is worth $125,000 today, and Equity is 60% of it. ",
+    "A 10% fall in that class moves the total by roughly $w \\times 10\\%$, where $w$ is its weight. ",
+    "Costs such as \\$5 commissions are small next to allocation effects. ",
+    "Expected return is $\\mu = \\sum_i w_i r_i$ and variance $\\sigma^2 = w^T \\Sigma w$. ",
+    "Rebalancing could sell $3,200 of bonds and buy $2,950 of equities for the $US account. ",
+    "Display math: $$E[R] = 0.07$$ for reference. ",
+    "- Cash: 5% of assets\n- Bonds: 25%\n\n",
+]
+
+
+def regex_sanitize(text):
+    """The regex pre-pass plus character loop that sanitize_streamlit_math replaced."""
+    if not isinstance(text, str):
+        return text
+
+    def is_math_like(inner):
+        value = inner.strip()
+        if not value:
+            return False
+
+        if re.fullmatch(r"[\d,\.\s%]+", value):
+            return False
+
+        if re.search(r"[=+\-*/^_\\()\[\]{}]", value):
+            return True
+
+        if re.search(r"\\[A-Za-z]+", value):
+            return True
+
+        if re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", value):
+            return False
+
+        return bool(re.search(r"[A-Za-z]", value))
+
+    if "$" not in text:
+        return text
+
+    text = re.sub(r"(?<!\\)\$(?=\s*\d)", r"\\$", text)
+
+    result = []
+    i = 0
+    while i < len(text):
+        if text[i] == "\\" and i + 1 < len(text) and text[i + 1] == "$":
+            result.extend(("\\", "$"))
+            i += 2
+            continue
+
+        if text[i] != "$":
+            result.append(text[i])
+            i += 1
+            continue
+
+        if i + 1 < len(text) and text[i + 1] == "$":
+            result.append("$$")
+            i += 2
+            continue
+
+        end = text.find("$", i + 1)
+        if end == -1:
+            result.append(r"\$")
+            i += 1
+            continue
+
+        inner = text[i + 1 : end]
+        if is_math_like(inner):
+            result.append(text[i : end + 1])
+        else:
+            result.append(r"\$")
+            result.append(inner)
+            result.append(r"\$")
+        i = end + 1
+
+    return "".join(result)
+
+
+def fuzz_text(rng, length):
+    """Random text dense in dollar signs, backslashes, digits and operators."""
+    return "".join(rng.choice(FUZZ_ALPHABET, length))
+
+
+def synthetic_answer(size, seed=0):
+    """About ``size`` characters of markdown mixing currency, inline math and escaped dollars."""
+    rng = np.random.default_rng(seed)
+    pieces, length = [], 0
+    while length < size:
+        piece = ANSWER_PIECES[rng.integers(len(ANSWER_PIECES))]
+        pieces.append(piece)
+        length += len(piece)
+    return "".join(pieces)
+
+
+def feed_in_chunks(text, chunk_size):
+    sanitizer = StreamingMathSanitizer()
+    pieces = [sanitizer.feed(text[start:start + chunk_size]) for start in range(0, len(text), chunk_size)]
+    pieces.append(sanitizer.flush())
+    return "".join(pieces)
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, round((time.perf_counter() - started) * 1000, 3)
+
+
+def run_benchmark(sizes=(20_000, 2_000_000), chunk_size=16):
+    """Return one row of timings in milliseconds per text size."""
+    rows = []
+    for size in sizes:
+        text = synthetic_answer(size)
+        expected, regex_ms = _timed(regex_sanitize, text)
+        scanned, scanner_ms = _timed(feed_in_chunks, text, len(text))
+        sanitized, first_call_ms = _timed(sanitize_streamlit_math, text)
+        _, repeat_ms = _timed(sanitize_streamlit_math, sanitized)
+        streamed, streamed_ms = _timed(feed_in_chunks, text, chunk_size)
+        if not expected == scanned == sanitized == streamed:
+            raise AssertionError(f"Sanitized output differs from the regex implementation at {size} characters")
+        rows.append(
+            {
+                "chars": len(text),
+                "regex_ms": regex_ms,
+                "scanner_ms": scanner_ms,
+                "first_call_ms": first_call_ms,
+                "repeat_ms": repeat_ms,
+                "streamed_ms": streamed_ms,
+            }
+        )
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time sanitize_streamlit_math against the previous regex implementation.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20_000, 2_000_000], help="answer sizes in characters")
+    parser.add_argument("--chunk-size", type=int, default=16, help="characters per streamed chunk")
+    args = parser.parse_args(argv)
+
+    columns = ["chars", "regex_ms", "scanner_ms", "first_call_ms", "repeat_ms", "streamed_ms"]
+    print(" ".join(f"{column:>13}" for column in columns))
+    for row in run_benchmark(args.sizes, args.chunk_size):
+        print(" ".join(f"{row[column]:>13}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,7 @@ import requests
 import streamlit as st
 
 from frontend.services.api import extract_portfolio
-from frontend.services.prices import get_price
+from frontend.services.prices import get_prices
 from frontend.services.state import initialize_state, portfolio_exists, reset_portfolio_state
 from frontend.views.advice import render_advice_page
 from frontend.views.allocation import render_allocation_page
@@ -27,7 +27,7 @@ if st.session_state.user_id != 0 and not st.session_state.has_data and not st.se
         added = pd.DataFrame(extract_portfolio(st.session_state.user_id))
 
         if not added.empty:
-            added["current"] = added["symbol"].apply(get_price)
+            added["current"] = added["symbol"].map(get_prices(added["symbol"]))
             st.session_state.df = pd.concat([st.session_state.df, added], ignore_index=True)
             st.session_state.has_data = True
             st.session_state.backend_has_data = True
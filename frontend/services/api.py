@@ -1,3 +1,5 @@
+import json
+
 import requests
 
 
@@ -10,31 +12,64 @@ def extract_portfolio(user_id):
     return response.json()
 
 
-def clear_portfolio(user_id):
-    response = requests.delete(f"{BASE_URL}/portfolio/?user_id={user_id}")
+def save_portfolio_item(item):
+    response = requests.post(f"{BASE_URL}/portfolio/", json=item)
     response.raise_for_status()
     return response
 
 
-def save_portfolio_item(item):
-    response = requests.post(f"{BASE_URL}/portfolio/", json=item)
+def replace_portfolio(user_id, items):
+    response = requests.put(f"{BASE_URL}/portfolio/{user_id}", json=items)
     response.raise_for_status()
-    return response
+    return response.json()
 
 
-def get_portfolio_summary(user_id):
-    response = requests.get(f"{BASE_URL}/portfolio/summary/?user_id={user_id}")
+def append_positions(user_id, items):
+    response = requests.post(f"{BASE_URL}/portfolio/{user_id}/positions", json=items)
     response.raise_for_status()
     return response.json()
 
 
-def get_strategy(strategy_number, changes):
-    response = requests.post(f"{BASE_URL}/portfolio/strat{strategy_number}/", json=changes)
+def get_portfolio_summary(user_id):
+    response = requests.get(f"{BASE_URL}/portfolio/summary/?user_id={user_id}")
     response.raise_for_status()
     return response.json()
 
 
-def get_ai_strategy(changes):
-    response = requests.post(f"{BASE_URL}/portfolio/stratAI/", json=changes)
+def get_strategies(changes, strategies=None):
+    response = requests.post(
+        f"{BASE_URL}/portfolio/strategies",
+        json={"changes": changes, "strategies": strategies},
+    )
     response.raise_for_status()
     return response.json()
+
+
+def _sse_events(lines):
+    """Decode server-sent event lines into the JSON payloads of their ``data`` fields."""
+    data = []
+    for line in lines:
+        if line.startswith("data:"):
+            data.append(line[len("data:"):].removeprefix(" "))
+        elif not line and data:
+            yield json.loads("\n".join(data))
+            data = []
+    if data:
+        yield json.loads("\n".join(data))
+
+
+def stream_advice(query, user_id=None, positions=None):
+    """Yield the supervisor's progress events from ``/advice/stream`` as the backend sends them.
+
+    Pass ``positions`` to ask about an unsaved portfolio, otherwise the
+    backend uses ``user_id``'s saved positions. An ``error`` event is raised
+    as a RuntimeError.
+    """
+    payload = {"query": query, "user_id": user_id, "positions": positions}
+    with requests.post(f"{BASE_URL}/advice/stream", json=payload, stream=True) as response:
+        response.raise_for_status()
+        response.encoding = "utf-8"
+        for event in _sse_events(response.iter_lines(decode_unicode=True)):
+            if event.get("type") == "error":
+                raise RuntimeError(event.get("message", "The advice stream failed."))
+            yield event
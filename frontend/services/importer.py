@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+
+from backend.services.tickers import ticker_index
+from frontend.services.prices import get_prices
+
+
+REQUIRED_COLUMNS = ["symbol", "quantity", "avg_cost", "sector", "asset_class"]
+IMPORT_CHUNK_ROWS = 20_000
+MAX_ERRORS = 200
+
+
+class ImportInterrupted(Exception):
+    """An import that failed part-way; ``result`` counts only the chunks already passed to the sink."""
+
+    def __init__(self, result):
+        super().__init__(f"Import stopped with {result['imported']:,} rows saved")
+        self.result = result
+
+
+def validate_chunk(chunk, tickers, lines, max_errors=MAX_ERRORS):
+    """Split a chunk into valid positions and row-level errors.
+
+    The same checks as the manual form, applied to whole columns: a known
+    ticker and numeric quantity and price. ``lines`` holds the CSV line each
+    row starts on. Returns the valid rows, up to ``max_errors`` error records
+    and the number of invalid rows.
+    """
+    symbol = chunk["symbol"].fillna("").astype(str).str.strip().str.upper()
+    quantity = pd.to_numeric(chunk["quantity"], errors="coerce").to_numpy(dtype=float)
+    avg_cost = pd.to_numeric(chunk["avg_cost"], errors="coerce").to_numpy(dtype=float)
+    missing = (symbol == "").to_numpy()
+
+    checks = [
+        ("symbol", missing, "missing ticker"),
+        ("symbol", ~missing & ~tickers.contains_many(symbol.to_numpy()), "unknown ticker"),
+        ("quantity", ~np.isfinite(quantity), "quantity is not a number"),
+        ("avg_cost", ~np.isfinite(avg_cost), "price is not a number"),
+    ]
+    invalid = np.logical_or.reduce([mask for _, mask, _ in checks])
+
+    errors = []
+    for column, mask, message in checks:
+        for row in np.flatnonzero(mask)[: max(max_errors - len(errors), 0)]:
+            value = chunk[column].iat[row]
+            errors.append(
+                {"line": int(lines[row]), "column": column, "value": "" if pd.isna(value) else str(value), "error": message}
+            )
+
+    valid = ~invalid
+    positions = pd.DataFrame(
+        {
+            "symbol": symbol.to_numpy()[valid],
+            "quantity": quantity[valid],
+            "avg_cost": avg_cost[valid],
+            "sector": chunk["sector"].fillna("").astype(str).str.strip().to_numpy()[valid],
+            "asset_class": chunk["asset_class"].fillna("").astype(str).str.strip().to_numpy()[valid],
+        }
+    )
+    return positions, errors, int(invalid.sum())
+
+
+def to_records(positions):
+    """``positions.to_dict(orient="records")``, built from column lists for speed."""
+    columns = list(positions.columns)
+    return [dict(zip(columns, row)) for row in zip(*(positions[column].tolist() for column in columns))]
+
+
+def _row_lines(chunk, first_line):
+    """The line each row of ``chunk`` starts on, and the line after the chunk.
+
+    Quoted fields can span lines, so every newline inside a row pushes the
+    rows after it down.
+    """
+    newlines = chunk.apply(lambda column: column.str.count("\n")).fillna(0).to_numpy(dtype=int).sum(axis=1)
+    after = np.cumsum(newlines)
+    lines = first_line + np.arange(len(chunk)) + after - newlines
+    return lines, int(first_line + len(chunk) + (after[-1] if len(after) else 0))
+
+
+def import_csv(
+    source, sink, tickers=None, prices=get_prices, chunk_rows=IMPORT_CHUNK_ROWS, max_errors=MAX_ERRORS, skip_rows=0
+):
+    """Stream a positions CSV through validation and pricing, ``chunk_rows`` rows at a time.
+
+    Each chunk's valid rows get a ``current`` price, with one batched lookup
+    for the symbols not priced by an earlier chunk, and are passed to
+    ``sink``; nothing else is kept, so memory stays bounded by the chunk size
+    and the ticker universe. Blank lines are ignored and the first
+    ``skip_rows`` rows are only counted, so an interrupted import can carry on
+    where it stopped. Returns counts and up to ``max_errors`` row-level
+    errors, or the missing columns if the header is incomplete. If pricing or
+    ``sink`` fails, raises ImportInterrupted with the counts so far.
+    """
+    tickers = ticker_index() if tickers is None else tickers
+    result = {"rows": 0, "skipped": 0, "imported": 0, "invalid": 0, "errors": [], "missing_columns": []}
+    known_prices = {}
+    line = None
+
+    # keep_default_na=False so tickers like NA and NAN stay tickers; blank lines
+    # are kept as empty rows so they can be counted
+    for chunk in pd.read_csv(
+        source, chunksize=chunk_rows, dtype=str, keep_default_na=False, skipinitialspace=True, skip_blank_lines=False
+    ):
+        chunk.columns = chunk.columns.str.strip()
+        if line is None:
+            result["missing_columns"] = [column for column in REQUIRED_COLUMNS if column not in chunk.columns]
+            if result["missing_columns"]:
+                return result
+            # Line 1 is the header
+            line = 2
+
+        lines, line = _row_lines(chunk, line)
+        filled = ~(chunk.fillna("") == "").all(axis=1).to_numpy()
+        skipped = filled & (np.cumsum(filled) <= skip_rows - result["skipped"])
+        result["skipped"] += int(skipped.sum())
+        kept = filled & ~skipped
+        chunk, lines = chunk[kept], lines[kept]
+        if chunk.empty:
+            continue
+
+        positions, errors, invalid = validate_chunk(chunk, tickers, lines, max_errors - len(result["errors"]))
+        if not positions.empty:
+            try:
+                unpriced = [symbol for symbol in positions["symbol"].unique().tolist() if symbol not in known_prices]
+                if unpriced:
+                    known_prices.update(prices(unpriced))
+                positions["current"] = positions["symbol"].map(known_prices)
+                sink(positions)
+            except Exception as exc:
+                raise ImportInterrupted(result) from exc
+
+        # Counted only once the chunk is saved, so the counts match what the sink holds
+        result["rows"] += len(chunk)
+        result["invalid"] += invalid
+        result["errors"].extend(errors)
+        result["imported"] += len(positions)
+    return result
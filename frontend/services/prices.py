@@ -1,15 +1,196 @@
+import csv
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
 import yfinance as yf
 
+from backend.services.tickers import TICKERS_FILE, ticker_index
+
+
+PRICE_CACHE_DB = "price_cache.db"
+PRICE_TTL_SECONDS = 15 * 60
+MISSING_TTL_SECONDS = 60
+PRICE_CACHE_SIZE = 10000
+
+
+def load_tickers(path=TICKERS_FILE):
+    """The shared ticker index; every session gets the same instance."""
+    return ticker_index(path)
+
+
+class YahooPriceProvider:
+    """Fetch the latest close for many tickers with one yfinance download."""
+
+    def fetch(self, symbols):
+        data = yf.download(symbols, period="5d", progress=False, threads=True)
+        if data is None or data.empty:
+            return {}
+
+        closes = data["Close"]
+        if not hasattr(closes, "columns"):
+            closes = closes.to_frame(symbols[0])
+        latest = closes.ffill().iloc[-1]
+        return {str(symbol).upper(): float(price) for symbol, price in latest.items() if not math.isnan(price)}
+
+
+class FilePriceProvider:
+    """Serve prices from a local CSV with symbol and price columns, for offline use."""
+
+    def __init__(self, path):
+        with open(path, "r", newline="") as f:
+            self.prices = {
+                row["symbol"].strip().upper(): float(row["price"])
+                for row in csv.DictReader(f)
+            }
+
+    def fetch(self, symbols):
+        return {symbol: self.prices[symbol] for symbol in symbols if symbol in self.prices}
+
+
+class PriceCache:
+    """TTL price cache with an in-memory LRU in front of a small SQLite table.
+
+    Symbols the provider had no price for are remembered in memory for
+    ``missing_ttl`` seconds, so repeated lookups of an unknown ticker don't
+    go back to the provider each time.
+    """
+
+    def __init__(self, path=PRICE_CACHE_DB, ttl=PRICE_TTL_SECONDS, max_entries=PRICE_CACHE_SIZE, missing_ttl=MISSING_TTL_SECONDS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.missing_ttl = missing_ttl
+        self._memory = OrderedDict()
+        self._missing = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS prices (symbol TEXT PRIMARY KEY, price REAL NOT NULL, fetched_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def get_many(self, symbols):
+        now = time.time()
+        found = {}
+        with self._lock:
+            for symbol in symbols:
+                entry = self._memory.get(symbol)
+                if entry and now - entry[1] < self.ttl:
+                    self._memory.move_to_end(symbol)
+                    found[symbol] = entry[0]
+
+            missing = [symbol for symbol in symbols if symbol not in found]
+            if missing and self._conn is not None:
+                placeholders = ",".join("?" * len(missing))
+                rows = self._conn.execute(
+                    f"SELECT symbol, price, fetched_at FROM prices WHERE symbol IN ({placeholders}) AND fetched_at > ?",
+                    (*missing, now - self.ttl),
+                ).fetchall()
+                for symbol, price, fetched_at in rows:
+                    found[symbol] = price
+                    self._remember(symbol, price, fetched_at)
+        return found
+
+    def recently_missing(self, symbols):
+        """The subset of ``symbols`` the provider had no price for within ``missing_ttl``."""
+        now = time.time()
+        with self._lock:
+            return {symbol for symbol in symbols if now - self._missing.get(symbol, -math.inf) < self.missing_ttl}
+
+    def put_missing(self, symbols):
+        now = time.time()
+        with self._lock:
+            for symbol in symbols:
+                self._missing[symbol] = now
+                self._missing.move_to_end(symbol)
+            while len(self._missing) > self.max_entries:
+                self._missing.popitem(last=False)
+
+    def put_many(self, prices):
+        now = time.time()
+        with self._lock:
+            for symbol, price in prices.items():
+                self._remember(symbol, price, now)
+                self._missing.pop(symbol, None)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO prices (symbol, price, fetched_at) VALUES (?, ?, ?)",
+                        [(symbol, price, now) for symbol, price in prices.items()],
+                    )
+                    self._conn.execute("DELETE FROM prices WHERE fetched_at <= ?", (now - self.ttl,))
+
+    def _remember(self, symbol, price, fetched_at):
+        self._memory[symbol] = (price, fetched_at)
+        self._memory.move_to_end(symbol)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+
+_provider = None
+_cache = None
+_lock = threading.Lock()
+
+
+def set_price_provider(provider, cache=None):
+    """Swap the provider (and optionally the cache), e.g. for fixture-backed tests.
+
+    A provider without a cache gets a fresh in-memory one. ``None`` restores
+    the defaults, which are created again on next use.
+    """
+    global _provider, _cache
+    with _lock:
+        _provider = provider
+        if cache is None and provider is not None:
+            cache = PriceCache(path=None)
+        _cache = cache
+
+
+def _price_service():
+    global _provider, _cache
+    with _lock:
+        if _provider is None:
+            fixture = os.getenv("PRICE_FIXTURE_FILE", "").strip()
+            _provider = FilePriceProvider(fixture) if fixture else YahooPriceProvider()
+        if _cache is None:
+            _cache = PriceCache()
+        return _provider, _cache
+
+
+def get_prices(symbols):
+    """Return the latest price for each symbol, fetching all cache misses in one request.
+
+    Unknown tickers or provider failures map to 0.0, like ``get_price`` always has.
+    Tickers the provider answered without a price are not asked for again
+    until the short miss TTL runs out; failed requests are retried next time.
+    """
+    provider, cache = _price_service()
+    requested = {symbol: str(symbol).strip().upper() for symbol in symbols}
+    wanted = list(dict.fromkeys(requested.values()))
+
+    prices = cache.get_many(wanted)
+    missing = [symbol for symbol in wanted if symbol not in prices]
+    if missing:
+        known_missing = cache.recently_missing(missing)
+        missing = [symbol for symbol in missing if symbol not in known_missing]
+    if missing:
+        try:
+            fetched = provider.fetch(missing)
+        except Exception:
+            fetched = None
+        if fetched:
+            cache.put_many(fetched)
+            prices.update(fetched)
+        if fetched is not None:
+            cache.put_missing([symbol for symbol in missing if symbol not in fetched])
 
-def load_tickers(path="all_tickers.txt"):
-    with open(path, "r") as f:
-        return set(line.strip().upper() for line in f.readlines())
+    return {symbol: float(prices.get(normalized, 0.0)) for symbol, normalized in requested.items()}
 
 
 def get_price(ticker):
-    try:
-        stock = yf.Ticker(ticker)
-        price = stock.history(period="1d")["Close"].iloc[-1]
-        return float(price) if price is not None else 0.0
-    except Exception:
-        return 0.0
+    return get_prices([ticker])[ticker]
@@ -14,6 +14,8 @@ def initialize_state():
         "summary_data": [{}],
         "backend_has_data": False,
         "summary_has_data": False,
+        "portfolio_truncated": False,
+        "import_progress": None,
     }
 
     for key, value in defaults.items():
@@ -33,6 +35,8 @@ def reset_portfolio_state():
     st.session_state.pop("summary_data", None)
     st.session_state.pop("backend_has_data", None)
     st.session_state.pop("summary_has_data", None)
+    st.session_state.pop("portfolio_truncated", None)
+    st.session_state.pop("import_progress", None)
     initialize_state()
 
 
@@ -1,7 +1,17 @@
 import streamlit as st
 
-from backend.agents.supervisor import DEFAULT_MODEL, SupervisorAgent
-from backend.agents.tools import sanitize_streamlit_math
+from frontend.services.api import stream_advice
+
+
+POSITION_COLUMNS = ["symbol", "quantity", "avg_cost", "sector", "asset_class", "current"]
+
+
+def _advice_request():
+    """The user's saved portfolio when the table only holds part of it, otherwise the table itself."""
+    if st.session_state.portfolio_truncated:
+        return {"user_id": st.session_state.user_id}
+    positions = st.session_state.df.reindex(columns=POSITION_COLUMNS).fillna({"current": 0.0, "sector": "", "asset_class": ""})
+    return {"positions": positions.to_dict(orient="records")}
 
 
 def render_advice_page():
@@ -21,20 +31,30 @@ def render_advice_page():
             return
 
         try:
-            with st.spinner("The supervisor is consulting the selected specialist agents..."):
-                supervisor = SupervisorAgent(model=DEFAULT_MODEL)
-                result = supervisor.run(user_query, st.session_state.df)
+            progress = st.empty()
+            progress.caption("The supervisor is consulting the selected specialist agents...")
 
             st.subheader("Answer")
-            st.write(sanitize_streamlit_math(result["final_answer"]))
+            answer_box = st.empty()
+            answer = ""
+            result = None
+            for event in stream_advice(user_query, **_advice_request()):
+                if event["type"] == "specialist":
+                    progress.caption(f"{event['result']['agent']} finished.")
+                elif event["type"] == "token":
+                    answer += event["text"]
+                    answer_box.write(answer)
+                elif event["type"] == "done":
+                    result = event
+            progress.empty()
+            if result is None:
+                raise RuntimeError("The advice stream ended before the answer was complete.")
 
             with st.expander("Specialist output"):
                 for specialist_result in result["specialist_results"]:
                     st.markdown(f"**{specialist_result['agent']}**")
-                    st.write(sanitize_streamlit_math(specialist_result["answer"]))
+                    st.write(specialist_result["answer"])
                     st.json(specialist_result["portfolio_summary"])
 
-        except ModuleNotFoundError:
-            st.error("The aisuite package is not installed yet. Install it before using Portfolio Advice.")
         except Exception as e:
             st.error(f"Portfolio advice failed: {e}")
@@ -4,7 +4,7 @@ import requests
 import streamlit as st
 
 from backend.agents.tools import build_desired_allocation_plan
-from frontend.services.api import get_ai_strategy, get_portfolio_summary, get_strategy
+from frontend.services.api import get_portfolio_summary, get_strategies
 
 
 def render_allocation_page():
@@ -109,15 +109,26 @@ def render_allocation_page():
                 st.write("STRATEGY 3:")
                 st.write("Buy: Same strategy as strategy 2")
                 st.write("Sell: Similar to strategy 1 except it only sells half of avaliable shares for top stocks until satisfied, if this is not possible then it follows strategy 2")
+                st.write("STRATEGY 4:")
+                st.write("Buy: Purchase whole shares in proportion to each stock's value, only as much as needed to land within 0.5% of the target")
+                st.write("Sell: Sell the stocks with the smallest gain per dollar over their average cost first, only as much as needed to land within 0.5% of the target")
 
+            strategies = get_strategies(asset_amount_changes)
             for strategy_number in (1, 2, 3):
-                strategy_data = get_strategy(strategy_number, asset_amount_changes)
                 st.subheader(f"Suggested Strategy {strategy_number}")
-                st.dataframe(strategy_data)
+                st.dataframe(strategies[str(strategy_number)])
+
+            st.subheader("Suggested Strategy 4")
+            st.dataframe(strategies["4"]["trades"])
+            for band in strategies["4"]["classes"]:
+                if not band["in_band"]:
+                    st.warning(
+                        f"Whole shares can't bring {band['asset_class']} within 0.5% of its target; "
+                        f"this plan misses by \\${abs(band['residual']):,.2f}."
+                    )
 
-            strategy_data = get_ai_strategy(asset_amount_changes)
             st.subheader("Suggested Strategy AI")
-            ai_response = strategy_data["response"].replace("$", "\\$")
+            ai_response = strategies["ai"]["response"].replace("$", "\\$")
             st.text(ai_response.replace("\n", "\n"))
 
         except ValueError:
@@ -2,11 +2,77 @@ import pandas as pd
 import requests
 import streamlit as st
 
-from frontend.services.api import clear_portfolio, save_portfolio_item
+from frontend.services.api import append_positions, replace_portfolio, save_portfolio_item
+from frontend.services.importer import ImportInterrupted, import_csv, to_records
 from frontend.services.prices import get_price
 from frontend.services.validation import valid
 
 
+PREVIEW_ROWS = 100
+# Imported rows beyond this are saved to the backend but not kept in the session table
+TABLE_ROWS_LIMIT = 10_000
+
+
+def _import_file(uploaded_file):
+    """Stream an uploaded CSV into the backend and keep the first rows for the table.
+
+    Chunks are saved as they go, so a failure part-way leaves the earlier
+    ones in the backend. The table is updated to match, and uploading the
+    same file again carries on after the rows already saved.
+    """
+    user_id = st.session_state.user_id
+    source = (uploaded_file.name, uploaded_file.size)
+    progress = st.session_state.import_progress
+    resumed = progress["rows"] if progress and progress["source"] == source else 0
+    if not st.session_state.portfolio_truncated:
+        # Persist the table first so the imported chunks are appended after it;
+        # it already holds the rows of an interrupted import of this file
+        replace_portfolio(user_id, st.session_state.df.to_dict(orient="records"))
+
+    kept = [st.session_state.df]
+    room = TABLE_ROWS_LIMIT - len(st.session_state.df)
+
+    def send(positions):
+        nonlocal room
+        append_positions(user_id, to_records(positions))
+        if room > 0:
+            kept.append(positions.head(room))
+        room -= len(positions)
+
+    failure = None
+    try:
+        result = import_csv(uploaded_file, send, skip_rows=resumed)
+    except ImportInterrupted as exc:
+        result, failure = exc.result, exc.__cause__
+    if result["missing_columns"]:
+        st.error(f"The file is missing required columns: {', '.join(result['missing_columns'])}")
+        return
+
+    st.session_state.df = pd.concat(kept, ignore_index=True)
+    st.session_state.has_data = not st.session_state.df.empty
+    st.session_state.backend_has_data = True
+    st.session_state.summary_has_data = False
+    st.session_state.portfolio_truncated = st.session_state.portfolio_truncated or room < 0
+
+    done = result["skipped"] + result["rows"]
+    if failure is not None:
+        st.session_state.import_progress = {"source": source, "rows": done}
+        st.error(
+            f"The import stopped: {failure}. The first {done:,} rows of the file are saved; "
+            "upload the same file again to continue after them."
+        )
+    else:
+        st.session_state.import_progress = None
+        st.success(f"Imported {result['imported']:,} of {result['rows']:,} rows")
+    if resumed:
+        st.write(f"Continued after the {result['skipped']:,} rows saved by the earlier attempt")
+    if result["invalid"]:
+        st.warning(f"Skipped {result['invalid']:,} invalid rows")
+        st.dataframe(pd.DataFrame(result["errors"]))
+        if result["invalid"] > len(result["errors"]):
+            st.write(f"Showing the first {len(result['errors'])} errors")
+
+
 def render_portfolio_page():
     st.subheader("Input Stock Data:")
     symbol, quantity, price, sector, asset = st.columns(5)
@@ -42,23 +108,34 @@ def render_portfolio_page():
                 "current": get_price(box1.upper()),
             }
 
+            if st.session_state.portfolio_truncated:
+                # The table only holds part of the portfolio, so save the row directly
+                save_portfolio_item({**new_row, "user_id": st.session_state.user_id})
+
             st.session_state.data.append(new_row)
             st.session_state.df = pd.concat(
                 [st.session_state.df, pd.DataFrame([new_row])],
                 ignore_index=True,
             )
             st.session_state.has_data = True
-            st.session_state.backend_has_data = False
+            st.session_state.backend_has_data = st.session_state.portfolio_truncated
 
+        except requests.exceptions.RequestException as e:
+            st.error(f"Error saving position: {e}")
         except ValueError:
             st.write("One or more fields contained an invalid value")
+            if box1 and box1 not in st.session_state.tickers:
+                suggestions = st.session_state.tickers.prefix(box1)
+                if suggestions:
+                    st.write(f"Unknown ticker {box1.upper()}. Did you mean: {', '.join(suggestions)}?")
 
     st.subheader("Upload Stock Data")
     uploaded_file = st.file_uploader("Upload a CSV file", type="csv", key="portfolio_upload")
     added = None
 
     if uploaded_file is not None:
-        added = pd.read_csv(uploaded_file)
+        added = pd.read_csv(uploaded_file, nrows=PREVIEW_ROWS)
+        uploaded_file.seek(0)
         st.write("Preview of uploaded file:")
         st.dataframe(added)
 
@@ -66,10 +143,10 @@ def render_portfolio_page():
         if uploaded_file is None:
             st.write("Please upload a file first")
         else:
-            added["current"] = added["symbol"].apply(get_price)
-            st.session_state.df = pd.concat([st.session_state.df, added], ignore_index=True)
-            st.session_state.has_data = True
-            st.session_state.backend_has_data = False
+            try:
+                _import_file(uploaded_file)
+            except requests.exceptions.RequestException as e:
+                st.error(f"Error importing portfolio: {e}")
 
     if st.session_state.has_data:
         st.title("Current Portfolio")
@@ -80,18 +157,21 @@ def render_portfolio_page():
             st.session_state.summary_data = [{}]
             st.session_state.summary_has_data = False
             st.session_state.backend_has_data = False
+            st.session_state.portfolio_truncated = False
+            st.session_state.import_progress = None
             st.session_state.logged_in = True
             st.rerun()
 
         st.dataframe(st.session_state.df)
 
-        if st.button("Save Portfolio", key="portfolio_save"):
+        if st.session_state.portfolio_truncated:
+            st.caption(f"The imported portfolio is saved; only its first {TABLE_ROWS_LIMIT:,} rows are shown here.")
+        elif st.button("Save Portfolio", key="portfolio_save"):
             try:
-                clear_portfolio(st.session_state.user_id)
-                for _, row in st.session_state.df.iterrows():
-                    data_to_send = row.to_dict()
-                    data_to_send["user_id"] = st.session_state.user_id
-                    save_portfolio_item(data_to_send)
+                replace_portfolio(
+                    st.session_state.user_id,
+                    st.session_state.df.to_dict(orient="records"),
+                )
 
                 st.success("Portfolio submitted to backend")
                 st.session_state.backend_has_data = True
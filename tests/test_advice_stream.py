@@ -0,0 +1,32 @@
+from fastapi.testclient import TestClient
+
+from backend.agents.registry import set_supervisor
+from backend.agents.supervisor import DEFAULT_MODEL, SupervisorAgent
+from backend.backend import app
+from benchmarks.fixtures import fake_http_client, offline_backends, synthetic_portfolio
+from frontend.services.api import _sse_events
+
+
+def test_advice_stream_events_decode_on_the_frontend():
+    supervisor = SupervisorAgent(
+        cache_responses=False,
+        http_client=fake_http_client(latency=0.0, tokens_per_second=None),
+        api_key="offline",
+    )
+    previous = set_supervisor(DEFAULT_MODEL, supervisor)
+    positions = synthetic_portfolio(5).to_dict(orient="records")
+    try:
+        with offline_backends(search_latency=0.0):
+            response = TestClient(app).post(
+                "/advice/stream", json={"query": "How should I rebalance my allocation?", "positions": positions}
+            )
+    finally:
+        set_supervisor(DEFAULT_MODEL, previous)
+
+    assert response.status_code == 200
+    events = list(_sse_events(response.text.splitlines()))
+    assert events[0]["type"] == "specialist"
+    assert events[-1]["type"] == "done"
+    tokens = "".join(event["text"] for event in events if event["type"] == "token")
+    assert tokens == events[-1]["final_answer"]
+    assert tokens.startswith("## Summary")
@@ -0,0 +1,26 @@
+import numpy as np
+
+from backend.agents.allocation_agent import AllocationAgent
+from benchmarks.allocation import LoopAllocationAgent, random_portfolio, random_targets
+from benchmarks.fixtures import synthetic_portfolio
+
+
+def test_matches_the_row_loop_on_seeded_portfolios():
+    rng = np.random.default_rng(19)
+    vectorized, loop = AllocationAgent(), LoopAllocationAgent()
+    for _ in range(500):
+        portfolio_df = random_portfolio(rng, int(rng.integers(1, 25)))
+        targets = random_targets(rng)
+        if rng.random() < 0.2:
+            portfolio_df["market_value"] = portfolio_df["quantity"] * portfolio_df["current"]
+        query = "Move to 60% equities" if rng.random() < 0.1 else "Rebalance"
+        desired = None if query != "Rebalance" else targets
+        assert repr(vectorized.run(query, portfolio_df, desired)) == repr(loop.run(query, portfolio_df, desired))
+
+
+def test_matches_the_row_loop_on_a_large_portfolio():
+    portfolio_df = synthetic_portfolio(20_000, seed=4)
+    targets = {"Equity": 40, "Bond": 40, "ETF": 10, "Gold": 10}
+    expected = LoopAllocationAgent().run("Rebalance", portfolio_df, targets)
+    assert expected["trade_plan"]
+    assert repr(AllocationAgent().run("Rebalance", portfolio_df, targets)) == repr(expected)
@@ -0,0 +1,15 @@
+from fastapi.testclient import TestClient
+
+from backend.backend import StrategyRequest, app
+from backend.services.risk import MAX_WINDOW_DAYS
+
+
+def test_strategy_request_drops_repeated_names():
+    request = StrategyRequest(changes={"user_id": 1}, strategies=["1", "ai", "1", "ai", "3"])
+    assert request.strategies == ["1", "ai", "3"]
+    assert StrategyRequest(changes={"user_id": 1}).strategies is None
+
+
+def test_risk_window_is_capped():
+    response = TestClient(app).get("/portfolio/risk", params={"user_id": 1, "window": MAX_WINDOW_DAYS + 1})
+    assert response.status_code == 400
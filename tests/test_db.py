@@ -0,0 +1,17 @@
+from unittest import mock
+
+import pytest
+
+from backend.services import db
+
+
+def test_failed_open_returns_the_pool_slot():
+    pool = db.ConnectionPool(":memory:", max_size=1)
+    with mock.patch.object(db, "open_connection", side_effect=OSError("disk unavailable")):
+        with pytest.raises(OSError):
+            pool.acquire()
+
+    conn = pool.acquire()
+    assert conn.execute("SELECT 1").fetchone() == (1,)
+    pool.release(conn)
+    pool.close()
@@ -0,0 +1,105 @@
+import io
+from functools import partial
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from backend.services.tickers import TickerIndex
+from frontend.services.importer import ImportInterrupted, import_csv
+from frontend.views import portfolio
+
+
+TICKERS = TickerIndex(["AAPL", "MSFT", "GOOG"])
+CSV = (
+    "symbol,quantity,avg_cost,sector,asset_class\n"
+    'AAPL,1,2,"Tech\nnology",Equity\n'
+    "\n"
+    "MSFT,x,3,Tech,Equity\n"
+    'GOOG,1,2,Tech,"Eq\r\nuity"\n'
+    "NOPE,1,1,Tech,Equity\n"
+    "MSFT,2,3,Tech,Equity\n"
+)
+
+
+def _prices(symbols):
+    return {symbol: 1.0 for symbol in symbols}
+
+
+def _import(text, sink, **kwargs):
+    return import_csv(io.StringIO(text), sink, tickers=TICKERS, prices=_prices, chunk_rows=2, **kwargs)
+
+
+def test_errors_point_at_the_line_each_row_starts_on():
+    result = _import(CSV, lambda positions: None)
+    assert [(error["line"], error["value"]) for error in result["errors"]] == [(5, "x"), (8, "NOPE")]
+    assert (result["rows"], result["imported"], result["invalid"]) == (5, 3, 2)
+
+
+def test_an_interrupted_import_reports_saved_rows_and_resumes_after_them():
+    saved = []
+
+    def failing(positions):
+        if len(saved) == 2:
+            raise OSError("backend down")
+        saved.append(positions)
+
+    with pytest.raises(ImportInterrupted) as interrupted:
+        _import(CSV, failing)
+    result = interrupted.value.result
+    assert sum(len(positions) for positions in saved) == result["imported"] == 2
+    assert isinstance(interrupted.value.__cause__, OSError)
+
+    resumed = _import(CSV, saved.append, skip_rows=result["rows"])
+    assert resumed["skipped"] == result["rows"]
+    assert pd.concat(saved)["symbol"].tolist() == ["AAPL", "GOOG", "MSFT"]
+
+
+class Upload(io.StringIO):
+    """Stands in for Streamlit's UploadedFile."""
+
+    name = "positions.csv"
+
+    def __init__(self, text):
+        super().__init__(text)
+        self.size = len(text)
+
+
+def test_retrying_a_failed_upload_does_not_append_rows_twice(monkeypatch):
+    backend, calls, messages = [], [], []
+
+    def append_positions(user_id, records):
+        calls.append(len(records))
+        if len(calls) == 2:
+            raise OSError("backend down")
+        backend.extend(record["symbol"] for record in records)
+
+    session = SimpleNamespace(
+        user_id=1,
+        df=pd.DataFrame(),
+        has_data=False,
+        backend_has_data=True,
+        summary_has_data=False,
+        portfolio_truncated=True,
+        import_progress=None,
+    )
+    fake_st = SimpleNamespace(
+        session_state=session,
+        error=messages.append,
+        success=messages.append,
+        write=messages.append,
+        warning=messages.append,
+        dataframe=lambda frame: None,
+    )
+    monkeypatch.setattr(portfolio, "st", fake_st)
+    monkeypatch.setattr(portfolio, "append_positions", append_positions)
+    monkeypatch.setattr(portfolio, "import_csv", partial(import_csv, tickers=TICKERS, prices=_prices, chunk_rows=2))
+
+    portfolio._import_file(Upload(CSV))
+    assert backend == ["AAPL"] == session.df["symbol"].tolist()
+    assert session.import_progress == {"source": ("positions.csv", len(CSV)), "rows": 1}
+    assert "backend down" in messages[0]
+
+    portfolio._import_file(Upload(CSV))
+    assert backend == ["AAPL", "GOOG", "MSFT"] == session.df["symbol"].tolist()
+    assert session.import_progress is None
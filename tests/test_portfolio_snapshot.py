@@ -0,0 +1,26 @@
+import json
+
+import pandas as pd
+
+from backend.agents.tools import PortfolioSnapshot
+
+
+def test_summary_keeps_integer_columns_as_integers():
+    portfolio_df = pd.DataFrame(
+        {
+            "symbol": ["AAPL", "BND"],
+            "quantity": [10, 4],
+            "avg_cost": [180, 72],
+            "sector": ["Technology", "Government"],
+            "asset_class": ["Equity", "Bond"],
+            "current": [200, 70],
+        }
+    )
+    summary = PortfolioSnapshot(portfolio_df).summary
+    text = json.dumps(summary)
+
+    assert summary["stocks_purchased"][0]["quantity"] == 10
+    assert '"avg_cost": 180,' in text
+    assert '"current": 200,' in text and '"market_value": 2000,' in text
+    assert summary["largest_positions"][0]["market_value"] == 2000
+    assert isinstance(summary["largest_positions"][0]["market_value"], int)
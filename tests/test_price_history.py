@@ -0,0 +1,152 @@
+import os
+import threading
+import weakref
+
+import numpy as np
+
+from backend.services import price_history
+from backend.services.price_history import PriceHistoryStore
+
+
+def _days(*values):
+    return np.array(values, dtype="datetime64[D]")
+
+
+class ScriptedProvider:
+    """Serves ``bars`` (date -> close) per symbol, recording each request."""
+
+    def __init__(self, bars):
+        self.bars = bars
+        self.requests = []
+
+    def fetch(self, symbols, start, end):
+        self.requests.append((list(symbols), str(start), str(end)))
+        history = {}
+        for symbol in symbols:
+            days = sorted(day for day in self.bars.get(symbol, {}) if start <= np.datetime64(day, "D") <= end)
+            if days:
+                history[symbol] = (_days(*days), np.array([self.bars[symbol][day] for day in days]))
+        return history
+
+
+def test_partial_bar_is_replaced_by_the_final_close(monkeypatch, tmp_path):
+    monkeypatch.setattr(price_history, "_today", lambda: np.datetime64("2025-06-04", "D"))
+    provider = ScriptedProvider({"AAA": {"2025-06-03": 10.0, "2025-06-04": 11.0}})
+    store = PriceHistoryStore(provider, path=str(tmp_path), history_days=5, recheck_seconds=0)
+    assert store.refresh(["AAA"]) == 2
+    assert store._checked["AAA"] == np.datetime64("2025-06-03", "D")
+
+    monkeypatch.setattr(price_history, "_today", lambda: np.datetime64("2025-06-05", "D"))
+    provider.bars["AAA"].update({"2025-06-04": 11.5, "2025-06-05": 12.0})
+    assert store.refresh(["AAA"]) == 1
+    assert provider.requests[-1] == (["AAA"], "2025-06-04", "2025-06-05")
+    dates, closes = store.history("AAA")
+    assert dates.tolist() == _days("2025-06-03", "2025-06-04", "2025-06-05").tolist()
+    assert closes.tolist() == [10.0, 11.5, 12.0]
+
+    # 06-04 is final now, so a range ending there isn't fetched again
+    reopened = PriceHistoryStore(provider, path=str(tmp_path), history_days=5, recheck_seconds=0)
+    assert reopened._checked["AAA"] == np.datetime64("2025-06-04", "D")
+    assert reopened.refresh(["AAA"], end="2025-06-04") == 0
+    assert len(provider.requests) == 2
+
+
+def test_days_the_provider_was_late_with_are_fetched_later(monkeypatch):
+    monkeypatch.setattr(price_history, "_today", lambda: np.datetime64("2025-06-04", "D"))
+    provider = ScriptedProvider({"AAA": {"2025-06-02": 10.0}})
+    store = PriceHistoryStore(provider, path=None, history_days=5, recheck_seconds=0)
+    store.refresh(["AAA"])
+    assert store._checked["AAA"] == np.datetime64("2025-06-02", "D")
+
+    monkeypatch.setattr(price_history, "_today", lambda: np.datetime64("2025-06-05", "D"))
+    provider.bars["AAA"].update({"2025-06-03": 10.5, "2025-06-04": 11.0})
+    assert store.refresh(["AAA"], end="2025-06-03") == 1
+    assert store.history("AAA")[0].tolist() == _days("2025-06-02", "2025-06-03").tolist()
+
+
+def test_open_ended_ranges_are_rechecked_after_the_interval(monkeypatch):
+    monkeypatch.setattr(price_history, "_today", lambda: np.datetime64("2025-06-04", "D"))
+    provider = ScriptedProvider({"AAA": {"2025-06-03": 10.0}})
+    store = PriceHistoryStore(provider, path=None, history_days=5)
+
+    store.refresh(["AAA"])
+    store.refresh(["AAA", "NOPE"])
+    assert [symbols for symbols, _, _ in provider.requests] == [["AAA"], ["NOPE"]]
+
+    store.recheck_seconds = 0
+    store.refresh(["AAA"])
+    assert provider.requests[-1] == (["AAA"], "2025-06-03", "2025-06-04")
+
+
+def test_the_provider_is_called_outside_the_store_lock(monkeypatch):
+    monkeypatch.setattr(price_history, "_today", lambda: np.datetime64("2025-06-04", "D"))
+    store = None
+
+    class ReadingProvider(ScriptedProvider):
+        def fetch(self, symbols, start, end):
+            assert not store._lock.locked()
+            return super().fetch(symbols, start, end)
+
+    store = PriceHistoryStore(ReadingProvider({"AAA": {"2025-06-03": 10.0}}), path=None, history_days=5)
+    assert store.refresh(["AAA"]) == 1
+
+
+def test_files_are_not_mapped_when_they_are_replaced(monkeypatch, tmp_path):
+    # Windows refuses to replace a mapped file; emulate that check here
+    mappings = {}
+    load, replace = np.load, price_history.os.replace
+
+    def tracking_load(file, *args, **kwargs):
+        array = load(file, *args, **kwargs)
+        if isinstance(array, np.memmap):
+            mappings.setdefault(os.path.abspath(file), []).append(weakref.ref(array._mmap))
+        return array
+
+    def checking_replace(source, destination):
+        assert all(mapping() is None for mapping in mappings.get(os.path.abspath(destination), []))
+        replace(source, destination)
+
+    monkeypatch.setattr(np, "load", tracking_load)
+    monkeypatch.setattr(price_history.os, "replace", checking_replace)
+    monkeypatch.setattr(price_history, "_today", lambda: np.datetime64("2025-06-04", "D"))
+    provider = ScriptedProvider({"AAA": {"2025-06-02": 10.0, "2025-06-03": 10.5}})
+    store = PriceHistoryStore(provider, path=str(tmp_path), history_days=5, recheck_seconds=0)
+    store.refresh(["AAA"])
+    held = store.history("AAA")
+    frame = store.matrix(["AAA"])
+
+    monkeypatch.setattr(price_history, "_today", lambda: np.datetime64("2025-06-05", "D"))
+    provider.bars["AAA"]["2025-06-04"] = 11.0
+    assert store.refresh(["AAA"]) == 1
+    assert mappings
+    assert held[1].tolist() == [10.0, 10.5] and frame["AAA"].tolist() == [10.0, 10.5]
+    assert store.history("AAA")[1].tolist() == [10.0, 10.5, 11.0]
+
+
+def test_concurrent_refreshes_wait_for_a_fetch_in_flight(monkeypatch):
+    monkeypatch.setattr(price_history, "_today", lambda: np.datetime64("2025-06-04", "D"))
+    started, release = threading.Event(), threading.Event()
+
+    class SlowProvider(ScriptedProvider):
+        def fetch(self, symbols, start, end):
+            started.set()
+            release.wait(5)
+            return super().fetch(symbols, start, end)
+
+    provider = SlowProvider({"AAA": {"2025-06-03": 10.0}})
+    store = PriceHistoryStore(provider, path=None, history_days=5)
+    first = threading.Thread(target=store.refresh, args=(["AAA"],))
+    first.start()
+    assert started.wait(5)
+
+    read = []
+    second = threading.Thread(target=lambda: read.append(store.matrix(["AAA"], refresh=True)))
+    second.start()
+    second.join(0.2)
+    assert second.is_alive()
+
+    release.set()
+    first.join(5)
+    second.join(5)
+    assert read[0]["AAA"].tolist() == [10.0]
+    assert len(provider.requests) == 1
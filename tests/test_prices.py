@@ -0,0 +1,39 @@
+from frontend.services import prices
+
+
+class CountingProvider:
+    def __init__(self, prices_by_symbol):
+        self.prices = prices_by_symbol
+        self.requests = []
+
+    def fetch(self, symbols):
+        self.requests.append(list(symbols))
+        return {symbol: self.prices[symbol] for symbol in symbols if symbol in self.prices}
+
+
+def test_unknown_tickers_are_not_fetched_again_within_the_miss_ttl():
+    provider = CountingProvider({"AAPL": 190.0})
+    prices.set_price_provider(provider)
+    try:
+        assert prices.get_prices(["aapl", "NOPE"]) == {"aapl": 190.0, "NOPE": 0.0}
+        assert prices.get_prices(["NOPE", "AAPL"]) == {"NOPE": 0.0, "AAPL": 190.0}
+        assert provider.requests == [["AAPL", "NOPE"]]
+    finally:
+        prices.set_price_provider(None)
+
+
+def test_misses_expire():
+    provider = CountingProvider({})
+    prices.set_price_provider(provider, cache=prices.PriceCache(path=None, missing_ttl=0))
+    try:
+        prices.get_prices(["NOPE"])
+        prices.get_prices(["NOPE"])
+        assert provider.requests == [["NOPE"], ["NOPE"]]
+    finally:
+        prices.set_price_provider(None)
+
+
+def test_clearing_the_provider_restores_the_default_cache():
+    prices.set_price_provider(CountingProvider({}))
+    prices.set_price_provider(None)
+    assert prices._provider is None and prices._cache is None
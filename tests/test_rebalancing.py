@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from backend.services.rebalancing import class_bands, strategy_4
+from benchmarks.fixtures import synthetic_portfolio
+
+
+def _portfolio():
+    return pd.DataFrame(
+        {
+            "symbol": ["AAA", "BBB", "CCC"],
+            "quantity": [10, 10, 100],
+            "avg_cost": [200.0, 300.0, 10.0],
+            "sector": ["Technology", "Energy", "Government"],
+            "asset_class": ["Equity", "Commodity", "Bond"],
+            "current": [250.80, 318.86, 10.0],
+        }
+    )
+
+
+def test_infeasible_band_takes_the_nearest_share_count_and_is_reported():
+    portfolio_df = _portfolio()
+    changes = {"user_id": 1, "Equity": 183.0, "Commodity": -901.0, "Bond": 718.0}
+    # A band of $27.50 around every class's change
+    tolerance = 27.5 / float((portfolio_df["quantity"] * portfolio_df["current"]).sum()) * 100
+
+    plan = strategy_4(portfolio_df, changes, tolerance=tolerance)
+    shares = dict(zip(plan["ticker"], plan["quantity"]))
+    assert shares["AAA"] == 1  # $67.80 over beats $183 under
+    assert shares["BBB"] == 3  # $55.58 over beats $263.28 under
+
+    bands = {band["asset_class"]: band for band in class_bands(portfolio_df, changes, plan, tolerance)}
+    assert not bands["Equity"]["in_band"] and bands["Equity"]["residual"] == 67.8
+    assert not bands["Commodity"]["in_band"] and bands["Commodity"]["residual"] == -55.58
+    assert bands["Bond"]["in_band"]
+
+
+def test_zero_shares_when_that_is_nearest():
+    portfolio_df = _portfolio()
+    changes = {"user_id": 1, "Equity": 100.0}
+    tolerance = 27.5 / float((portfolio_df["quantity"] * portfolio_df["current"]).sum() + 100.0) * 100
+
+    plan = strategy_4(portfolio_df, changes, tolerance=tolerance)
+    assert plan.empty
+    (band,) = class_bands(portfolio_df, changes, plan, tolerance)
+    assert band == {"asset_class": "Equity", "change": 100.0, "traded": 0.0, "residual": -100.0, "in_band": False}
+
+
+def test_feasible_bands_are_met_in_whole_shares():
+    rng = np.random.default_rng(20)
+    for seed in range(40):
+        portfolio_df = synthetic_portfolio(int(rng.integers(20, 200)), seed=seed)
+        values = (portfolio_df["quantity"] * portfolio_df["current"]).groupby(portfolio_df["asset_class"]).sum()
+        changes = {"user_id": 1, **{asset_class: float(value * rng.uniform(-0.2, 0.2)) for asset_class, value in values.items()}}
+        for objective in ("turnover", "gain"):
+            plan = strategy_4(portfolio_df, changes, objective=objective, tolerance=0.5)
+            assert all(band["in_band"] for band in class_bands(portfolio_df, changes, plan, 0.5))
+            held = portfolio_df.set_index("symbol")["quantity"]
+            partial = plan["quantity"] != held[plan["ticker"]].to_numpy()
+            assert (plan["quantity"][partial] % 1 == 0).all()
@@ -0,0 +1,14 @@
+from backend.agents.supervisor import SupervisorAgent
+from benchmarks.fixtures import fake_http_client
+
+
+def test_every_research_agent_uses_the_supervisor_query_mode():
+    supervisor = SupervisorAgent(
+        cache_responses=False, http_client=fake_http_client(), api_key="offline", research_query_mode="local"
+    )
+    agents = [
+        supervisor.research_agent,
+        supervisor.simulation_agent.research_agent,
+        supervisor.explanation_agent.research_agent,
+    ]
+    assert [agent.query_mode for agent in agents] == ["local", "local", "local"]
@@ -0,0 +1,56 @@
+import numpy as np
+
+from backend.services.price_history import PriceHistoryStore
+from backend.services.risk import CovarianceCache
+from benchmarks.fixtures import FakeHistoryProvider
+
+
+class LockCheckingStore(PriceHistoryStore):
+    """Fails if prices are read while the covariance cache lock is held."""
+
+    def __init__(self, cache):
+        super().__init__(FakeHistoryProvider(), path=None)
+        self.cache = cache
+
+    def matrix(self, *args, **kwargs):
+        assert not self.cache._lock.locked()
+        return super().matrix(*args, **kwargs)
+
+
+def test_prices_are_read_outside_the_cache_lock_and_updates_match_a_rebuild():
+    tickers = ["AAA", "BBB", "SPY"]
+    cache = CovarianceCache()
+    store = LockCheckingStore(cache)
+    store.refresh(tickers, end="2025-06-10")
+
+    cache.get(store, tickers, window=60, end="2025-06-02")
+    cache.get(store, tickers, window=60, end="2025-06-02")
+    returns, covariance, known = cache.get(store, tickers, window=60, end="2025-06-09")
+    assert cache.stats == {"hits": 1, "updates": 1, "builds": 1}
+
+    expected_returns, expected_covariance, expected_known = CovarianceCache().get(store, tickers, window=60, end="2025-06-09")
+    np.testing.assert_allclose(returns, expected_returns)
+    np.testing.assert_allclose(covariance, expected_covariance)
+    assert known.tolist() == expected_known.tolist()
+
+
+def test_the_cache_is_bounded_by_bytes_and_keeps_the_newest_entry():
+    store = PriceHistoryStore(FakeHistoryProvider(), path=None)
+    cache = CovarianceCache(max_bytes=1)
+    for tickers in (["AAA", "SPY"], ["BBB", "SPY"]):
+        cache.get(store, tickers, window=60, end="2025-06-02")
+    assert list(cache._entries) == [(("BBB", "SPY"), 60)]
+
+
+def test_repeated_slides_match_a_rebuild():
+    tickers = ["AAA", "BBB", "CCC", "SPY"]
+    store = PriceHistoryStore(FakeHistoryProvider(), path=None)
+    cache = CovarianceCache()
+    days = np.busday_offset("2025-03-03", np.arange(40), roll="forward")
+    for day in days:
+        cache.get(store, tickers, window=60, end=day)
+    assert cache.stats["updates"] == len(days) - 1
+
+    _, covariance, _ = cache.get(store, tickers, window=60, end=days[-1])
+    _, expected, _ = CovarianceCache().get(store, tickers, window=60, end=days[-1])
+    np.testing.assert_allclose(covariance, expected, rtol=1e-9)
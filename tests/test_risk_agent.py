@@ -0,0 +1,23 @@
+import logging
+
+import pandas as pd
+
+from backend.agents import risk_agent
+from backend.agents.risk_agent import RiskAgent
+from backend.agents.tools import PortfolioSnapshot
+
+
+def test_risk_metric_failures_are_logged(monkeypatch, caplog):
+    def broken(*args, **kwargs):
+        raise ValueError("engine bug")
+
+    monkeypatch.setattr(risk_agent, "portfolio_risk", broken)
+    agent = RiskAgent(client=None, model="offline")
+    snapshot = PortfolioSnapshot.of(
+        pd.DataFrame(
+            [{"symbol": "AAA", "quantity": 1, "avg_cost": 10.0, "sector": "Tech", "asset_class": "Equity", "current": 12.0}]
+        )
+    )
+    with caplog.at_level(logging.ERROR, logger=risk_agent.__name__):
+        assert agent._risk_metrics(snapshot) is None
+    assert "engine bug" in caplog.text
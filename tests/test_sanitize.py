@@ -0,0 +1,27 @@
+import numpy as np
+
+from backend.agents.tools import StreamingMathSanitizer, sanitize_streamlit_math
+from benchmarks.sanitize import feed_in_chunks, fuzz_text, regex_sanitize, synthetic_answer
+
+
+def test_matches_the_regex_implementation_on_fuzzed_text():
+    rng = np.random.default_rng(12)
+    for _ in range(3000):
+        text = fuzz_text(rng, int(rng.integers(0, 40)))
+        expected = regex_sanitize(text)
+        assert sanitize_streamlit_math(text) == expected, text
+        assert feed_in_chunks(text, int(rng.integers(1, 8))) == expected, text
+
+
+def test_matches_on_llm_style_answers():
+    text = synthetic_answer(50_000, seed=3)
+    assert sanitize_streamlit_math(text) == regex_sanitize(text)
+
+
+def test_idempotent():
+    rng = np.random.default_rng(5)
+    for _ in range(1000):
+        once = regex_sanitize(fuzz_text(rng, 30))
+        sanitizer = StreamingMathSanitizer()
+        assert sanitizer.feed(once) + sanitizer.flush() == once
+        assert sanitize_streamlit_math(once) == once
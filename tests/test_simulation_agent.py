@@ -0,0 +1,23 @@
+import logging
+
+import pandas as pd
+
+from backend.agents import simulation_agent
+from backend.agents.simulation_agent import SimulationAgent
+from backend.agents.tools import PortfolioSnapshot
+
+
+def test_simulation_failures_are_logged(monkeypatch, caplog):
+    def broken(*args, **kwargs):
+        raise ValueError("engine bug")
+
+    monkeypatch.setattr(simulation_agent, "simulate_portfolio", broken)
+    agent = SimulationAgent(client=None, model="offline")
+    snapshot = PortfolioSnapshot.of(
+        pd.DataFrame(
+            [{"symbol": "AAA", "quantity": 1, "avg_cost": 10.0, "sector": "Tech", "asset_class": "Equity", "current": 12.0}]
+        )
+    )
+    with caplog.at_level(logging.ERROR, logger=simulation_agent.__name__):
+        assert agent._simulate("next year", snapshot) is None
+    assert "engine bug" in caplog.text